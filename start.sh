@@ -26,4 +26,15 @@ source venv/bin/activate
 
 # Запуск бота из папки workspace
 cd workspace
-python ../system/bot.py
+
+# Демон для быстрого запуска скриптов из workspace/scripts
+python ../system/toolsd.py &
+TOOLSD_PID=$!
+trap 'kill $TOOLSD_PID 2>/dev/null || true' EXIT
+
+# Бот в фоне, чтобы SIGTERM от systemd дошёл до него: при остановке он оставляет
+# запущенные запросы Claude работать, а после перезапуска дочитывает их вывод
+python ../system/bot.py &
+BOT_PID=$!
+trap 'kill -TERM $BOT_PID 2>/dev/null || true' TERM INT
+wait $BOT_PID || wait $BOT_PID
@@ -14,4 +14,7 @@ fi
 # Остановка процесса
 kill $PID 2>/dev/null || true
 
+# Остановка демона скриптов
+pkill -f "python.*toolsd.py" 2>/dev/null || true
+
 echo "✅ Бот остановлен (PID: $PID)"
@@ -0,0 +1,182 @@
+"""Telegram attachments saved into the workspace for Claude.
+
+Documents, photos, voice messages, audio and video are streamed from
+Telegram in chunks into workspace/inbox/<user_id>/ and the message sent
+to Claude references the saved path. Files are remembered by Telegram's
+file_unique_id, so the same file sent again is not downloaded twice.
+
+A .torrent file doesn't need Claude at all: it is added to qBittorrent
+right away with scripts/qbt-add-torrent.py and its progress is reported
+by system/torrent_watch.py.
+"""
+
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from aiogram import Bot, types
+
+from config import (
+    ATTACHMENT_CACHE_FILE,
+    ATTACHMENT_CHUNK_SIZE,
+    ATTACHMENT_DOWNLOAD_TIMEOUT,
+    ATTACHMENT_MAX_MB,
+    INBOX_DIR,
+    SESSIONS_DIR,
+    WORKSPACE_DIR,
+)
+from fastpath import run_script
+from spool import chat_env
+
+logger = logging.getLogger(__name__)
+
+# Torrent names that look like a season or an episode go to "TV Shows"
+TV_SHOW_RE = re.compile(r"\bS\d{1,2}(E\d{1,3})?\b|season|сезон|сериал", re.IGNORECASE)
+
+
+class AttachmentError(Exception):
+    """Attachment can't be saved, message is shown to the user."""
+
+
+class Attachment(NamedTuple):
+    """File attached to a Telegram message."""
+    kind: str
+    file_id: str
+    file_unique_id: str
+    file_name: str
+    file_size: Optional[int]
+    mime_type: Optional[str]
+
+
+def get_attachment(message: types.Message) -> Optional[Attachment]:
+    """Attachment of the message, None for plain text."""
+    if message.document:
+        doc = message.document
+        name = doc.file_name or f"document_{doc.file_unique_id}"
+        return Attachment("document", doc.file_id, doc.file_unique_id, name, doc.file_size, doc.mime_type)
+
+    if message.photo:
+        # Sizes go from smallest to largest
+        photo = message.photo[-1]
+        return Attachment("photo", photo.file_id, photo.file_unique_id, f"photo_{photo.file_unique_id}.jpg",
+                          photo.file_size, "image/jpeg")
+
+    if message.voice:
+        voice = message.voice
+        return Attachment("voice", voice.file_id, voice.file_unique_id, f"voice_{voice.file_unique_id}.ogg",
+                          voice.file_size, voice.mime_type)
+
+    if message.audio:
+        audio = message.audio
+        name = audio.file_name or f"audio_{audio.file_unique_id}.mp3"
+        return Attachment("audio", audio.file_id, audio.file_unique_id, name, audio.file_size, audio.mime_type)
+
+    if message.video:
+        video = message.video
+        name = video.file_name or f"video_{video.file_unique_id}.mp4"
+        return Attachment("video", video.file_id, video.file_unique_id, name, video.file_size, video.mime_type)
+
+    return None
+
+
+def safe_name(name: str) -> str:
+    """File name without path separators and control characters."""
+    name = re.sub(r"[\x00-\x1f/\\]", "_", name).strip(". ")
+    return name[:200] or "file"
+
+
+def load_cache() -> Dict[str, str]:
+    """Saved attachments: "<user_id>/<file_unique_id>" -> path relative to workspace."""
+    try:
+        with open(ATTACHMENT_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return {}
+
+
+def save_cache(cache: Dict[str, str]) -> None:
+    """Write attachment cache."""
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(ATTACHMENT_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+
+
+async def save_attachment(bot: Bot, user_id: int, attachment: Attachment) -> Path:
+    """
+    Download attachment into the user's inbox, streaming it to disk.
+
+    Returns:
+        Path relative to the workspace (Claude's working directory)
+
+    Raises:
+        AttachmentError: file is larger than ATTACHMENT_MAX_MB or download failed
+    """
+    cache_key = f"{user_id}/{attachment.file_unique_id}"
+    cache = load_cache()
+    cached = cache.get(cache_key)
+    if cached and (WORKSPACE_DIR / cached).exists():
+        logger.info(f"[USER {user_id}] Attachment {attachment.file_unique_id} already saved: {cached}")
+        return Path(cached)
+
+    if attachment.file_size and attachment.file_size > ATTACHMENT_MAX_MB * 1024 * 1024:
+        raise AttachmentError(f"Файл больше {ATTACHMENT_MAX_MB} MB, бот не может его скачать")
+
+    inbox = INBOX_DIR / str(user_id)
+    inbox.mkdir(parents=True, exist_ok=True)
+
+    path = inbox / safe_name(attachment.file_name)
+    if path.exists():
+        # Another file with the same name: keep both
+        path = path.with_name(f"{path.stem}_{attachment.file_unique_id}{path.suffix}")
+
+    # Partial file never has the final name, so a failed download isn't used later
+    part_path = path.with_name(path.name + ".part")
+    try:
+        await bot.download(
+            attachment.file_id,
+            destination=part_path,
+            timeout=ATTACHMENT_DOWNLOAD_TIMEOUT,
+            chunk_size=ATTACHMENT_CHUNK_SIZE
+        )
+        part_path.rename(path)
+    except Exception as e:
+        part_path.unlink(missing_ok=True)
+        logger.error(f"[USER {user_id}] Failed to download {attachment.file_name}: {type(e).__name__}: {e}")
+        raise AttachmentError(f"Не удалось скачать файл: {e}")
+
+    relative = path.relative_to(WORKSPACE_DIR)
+    cache[cache_key] = str(relative)
+    save_cache(cache)
+    logger.info(f"[USER {user_id}] Attachment saved: {relative} ({attachment.file_size} bytes)")
+    return relative
+
+
+def is_torrent(attachment: Attachment) -> bool:
+    """Attachment is a .torrent file."""
+    return attachment.kind == "document" and (
+        attachment.file_name.lower().endswith(".torrent") or attachment.mime_type == "application/x-bittorrent"
+    )
+
+
+def guess_category(name: str, caption: Optional[str]) -> str:
+    """qBittorrent category for a torrent: caption wins over the file name."""
+    for text in (caption, name):
+        if text and TV_SHOW_RE.search(text):
+            return "TV Shows"
+    return "Movies"
+
+
+async def add_torrent_file(path: Path, caption: Optional[str], chat_id: int, thread_id: Optional[int]) -> str:
+    """Add saved .torrent to qBittorrent, progress is reported to the chat. Returns reply text."""
+    name = path.stem
+    category = guess_category(name, caption)
+    return await run_script("qbt-add-torrent.py", [name, str(path), category], chat_env(chat_id, thread_id))
+
+
+def describe_attachment(attachment: Attachment, path: Path) -> str:
+    """Line for the prompt telling Claude where the file is."""
+    size = f", {attachment.file_size / 1024 / 1024:.1f} MB" if attachment.file_size else ""
+    mime = f", {attachment.mime_type}" if attachment.mime_type else ""
+    return f"Пользователь прислал файл ({attachment.kind}{mime}{size}): {path}"
@@ -2,17 +2,38 @@
 
 import asyncio
 import logging
-import os
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, Optional, Set
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.enums import ParseMode
+from aiogram.filters import Command, CommandObject
 
-from config import TG_BOT_TOKEN, ALLOWED_USERS, WORKSPACE_DIR
-from sessions import get_session, save_session, delete_session
-from parser import parse_line, extract_message_content
-from claude import run_claude
+from config import (
+    TG_BOT_TOKEN, ALLOWED_USERS, CLAUDE_MODELS, MAX_CONCURRENT_TURNS, JELLYFIN_AUTO_REFRESH, WORKSPACE_DIR
+)
+from sessions import SessionKey, get_session, save_session, delete_session, record_session_use, unlock_sessions
+from parser import (
+    parse_line, extract_message_content, extract_text_delta, extract_tool_names,
+    extract_context_tokens, extract_written_files
+)
+from claude import run_claude, stop_claude, detach_turns, is_detaching, TurnAborted
+from spool import TurnSpool, create_spool, list_spools
+from outbox import Outbox
+from turnlog import TurnLog
+from uploads import collect_turn_files, output_dir, plan_uploads, too_large_note
+from attachments import (
+    AttachmentError, get_attachment, save_attachment, is_torrent, add_torrent_file, describe_attachment
+)
+from budget import TurnBudget
+from isolation import detect_isolation
+from prompt import write_system_prompt
+from knowledge import retrieve
+from fastpath import FAST_COMMANDS, run_fast_command
+from routing import AUTO, choose_model, record_turn, format_stats
+from compaction import needs_rotation, rotate_session, with_summary
+from session_gc import gc_loop
+from torrent_watch import TorrentWatcher, refresh_jellyfin
+from streaming import LiveMessage, TurnStatus
 
 # Configure logging
 logging.basicConfig(
@@ -25,211 +46,483 @@ logger = logging.getLogger(__name__)
 bot = Bot(token=TG_BOT_TOKEN)
 dp = Dispatcher()
 
-# Active processes by user_id
-processes: Dict[int, asyncio.Task] = {}
-
-
-def generate_file_tree(directory: str, prefix: str = "", max_depth: int = 5, current_depth: int = 0) -> str:
-    """Generate compact file tree for workspace."""
-    if current_depth >= max_depth:
-        return ""
-
-    lines = []
-    try:
-        items = sorted(os.listdir(directory))
-        # Filter out hidden files and common ignored items
-        items = [item for item in items if not item.startswith('.') and item not in ['__pycache__', 'node_modules', 'venv']]
-
-        for i, item in enumerate(items):
-            path = os.path.join(directory, item)
-            is_last = i == len(items) - 1
-            current_prefix = "└── " if is_last else "├── "
+# Messages of Claude turns go through the outbox: persisted first, retried until delivered
+outbox = Outbox(bot)
 
-            if os.path.isdir(path):
-                lines.append(f"{prefix}{current_prefix}{item}/")
-                extension = "    " if is_last else "│   "
-                subtree = generate_file_tree(path, prefix + extension, max_depth, current_depth + 1)
-                if subtree:
-                    lines.append(subtree)
-            else:
-                lines.append(f"{prefix}{current_prefix}{item}")
-    except PermissionError:
-        pass
+# Active processes by conversation (user, chat, topic)
+processes: Dict[SessionKey, asyncio.Task] = {}
 
-    return "\n".join(lines)
+# Conversations whose turn is being prepared (status reply, prompt): claimed before
+# the first await, so two quick messages can't both start a turn on one session
+claimed: Set[SessionKey] = set()
 
+# Claude turns running at once across all conversations
+turn_slots = asyncio.Semaphore(MAX_CONCURRENT_TURNS)
 
-def format_user_prompt(message: types.Message) -> str:
-    """Format user message with metadata for Claude."""
-    user = message.from_user
 
-    # Get absolute working directory path
-    workspace_path = os.path.abspath(WORKSPACE_DIR)
+def session_key(message: types.Message) -> SessionKey:
+    """Conversation of the message: user, chat and forum topic."""
+    thread_id = message.message_thread_id if message.is_topic_message else None
+    return message.from_user.id, message.chat.id, thread_id
 
-    # Generate file tree
-    file_tree = generate_file_tree(workspace_path)
 
-    user_info = f"""Твоя рабочая директория: {workspace_path}
+def session_tag(key: SessionKey) -> str:
+    """Conversation label for logs."""
+    user_id, chat_id, thread_id = key
+    if chat_id == user_id and thread_id is None:
+        return f"USER {user_id}"
+    return f"USER {user_id} CHAT {chat_id}" + (f" TOPIC {thread_id}" if thread_id is not None else "")
 
-Структура файлов:
-{file_tree}
 
-Информация о пользователе:
-- ID: {user.id}
-- Username: @{user.username if user.username else 'none'}
-- Имя: {user.full_name}
-- Язык: {user.language_code if user.language_code else 'unknown'}
+def message_text(message: types.Message) -> str:
+    """Text of the message or caption of its attachment."""
+    return message.text or message.caption or ""
 
-Сообщение:
-{message.text}"""
 
-    return user_info
+def format_user_prompt(message: types.Message, files_dir: Path, attachment_note: Optional[str] = None) -> str:
+    """
+    Format user message for Claude.
+    Workspace layout and user profile are in the system prompt (see prompt.py),
+    so only the message itself, saved attachment path, the conversation's
+    output directory and matching knowledge snippets are sent per turn.
+    """
+    text = message_text(message)
+    if attachment_note:
+        text = f"{text}\n\n{attachment_note}" if text else attachment_note
 
+    # Per conversation, so files don't go to another chat of the same user
+    files_note = f"(Файлы для отправки в этот чат сохраняй в {files_dir.relative_to(WORKSPACE_DIR)}/)"
+    text = f"{text}\n\n{files_note}" if text else files_note
 
-async def process_claude_stream(user_id: int, chat_id: int, prompt: str):
-    """Process Claude Code stream and send messages to Telegram."""
-    logger.info(f"[USER {user_id}] Starting Claude stream processing")
-
-    session = get_session(user_id)
+    try:
+        snippets = retrieve(message_text(message))
+    except Exception as e:
+        logger.error(f"Knowledge retrieval failed: {type(e).__name__}: {e}")
+        snippets = ""
+
+    if not snippets:
+        return text
+
+    return f"""{text}
+
+---
+Фрагменты из knowledge/, подобранные к сообщению (полные файлы там же):
+
+{snippets}"""
+
+
+async def process_claude_stream(
+    key: SessionKey,
+    prompt: str,
+    status_message: types.Message,
+    system_prompt_file: Path,
+    model: str,
+    model_reason: str,
+    spool: Optional[TurnSpool] = None
+):
+    """
+    Process Claude Code stream and send messages to Telegram.
+    With spool, continue a turn started by the previous bot process.
+    """
+    user_id, chat_id, thread_id = key
+    tag = session_tag(key)
+    logger.info(f"[{tag}] Starting Claude stream processing")
+
+    session = get_session(key)
     session_id = session.get("claude_session_id")
-    logger.info(f"[USER {user_id}] Existing session_id: {session_id}")
+    logger.info(f"[{tag}] Existing session_id: {session_id}")
+    logger.info(f"[{tag}] Model: {model} ({model_reason})")
 
     # Lock session
     session["locked"] = True
-    save_session(user_id, session)
-    logger.info(f"[USER {user_id}] Session locked")
+    save_session(key, session)
+    logger.info(f"[{tag}] Session locked")
+
+    # First turn after rotation carries the previous session summary
+    prompt = with_summary(prompt, session)
 
     current_session_id = None
-    message_buffer = []
-    last_message = None
+    rotate = False
+    live = LiveMessage(bot, chat_id, thread_id)
+    status = TurnStatus(bot, status_message, thread_id)
+    status.start()
+    completed = False
+    slot_acquired = False
+    budget = TurnBudget(model)
+    stream = None
+    turn_log = None
+    written_files = []
 
     try:
-        logger.info(f"[USER {user_id}] Starting subprocess for Claude")
-        async for line in run_claude(user_id, prompt, session_id):
+        # Wait for a free slot if too many turns are running
+        if turn_slots.locked():
+            logger.info(f"[{tag}] Waiting for a free turn slot")
+            status.queued()
+        await turn_slots.acquire()
+        slot_acquired = True
+        status.running()
+
+        resumed = spool is not None
+        if not resumed:
+            logger.info(f"[{tag}] Starting subprocess for Claude")
+            spool = create_spool(
+                key=list(key), model=model, model_reason=model_reason, system_prompt_file=str(system_prompt_file)
+            )
+        else:
+            logger.info(f"[{tag}] Reattaching to turn {spool.id} at offset {spool.position}")
+        written_files = list(spool.meta.get("written", []))
+        turn_log = TurnLog(key, spool.id, model=model, reason=model_reason, resumed=resumed)
+        # Preview messages are kept in the spool, so the next bot process can delete them
+        live.on_preview = lambda message_ids: spool.update(preview=message_ids)
+
+        stream = run_claude(user_id, prompt, session_id, system_prompt_file, model, spool)
+        async for line in stream:
             if not line:
                 continue
 
-            logger.debug(f"[USER {user_id}] Received line from Claude: {line[:100]}...")
+            logger.debug(f"[{tag}] Received line from Claude: {line[:100]}...")
+            turn_log.add(line)
 
             data = parse_line(line)
             if not data:
-                logger.debug(f"[USER {user_id}] Failed to parse line")
+                logger.debug(f"[{tag}] Failed to parse line")
+                continue
+
+            # Partial text: show in live message, complete message comes later
+            delta = extract_text_delta(data)
+            if delta:
+                live.append(delta)
+                status.writing()
                 continue
 
             msg_type = data.get("type")
-            logger.info(f"[USER {user_id}] Parsed message type: {msg_type}")
+            logger.info(f"[{tag}] Parsed message type: {msg_type}")
+
+            # Stop runaway turns, closing the stream kills Claude. A finished turn
+            # (result event) is always delivered, even if its final totals end over budget
+            budget.add(data)
+            reason = budget.exceeded() if msg_type != "result" else None
+            if reason:
+                raise TurnAborted(reason)
+
+            for tool_name in extract_tool_names(data):
+                status.tool_started(tool_name)
+            written = extract_written_files(data)
+            if written:
+                # Kept in the spool: a replayed turn doesn't see events it already delivered
+                written_files.extend(written)
+                spool.update(written=written_files)
 
             # Extract session_id from system messages
             if msg_type == "system" and data.get("subtype") == "init":
                 current_session_id = data.get("session_id")
                 if current_session_id:
-                    logger.info(f"[USER {user_id}] Saved Claude session: {current_session_id}")
+                    logger.info(f"[{tag}] Saved Claude session: {current_session_id}")
                     session["claude_session_id"] = current_session_id
-                    save_session(user_id, session)
+                    session.pop("summary", None)
+                    save_session(key, session)
+                    record_session_use(user_id, current_session_id)
+
+            context_tokens = extract_context_tokens(data)
+            if context_tokens:
+                session["context_tokens"] = context_tokens
 
             # Extract and send content
+            preview = []
+            if msg_type == "assistant" and live.active and not data.get("parent_tool_use_id"):
+                # Streamed text was only a preview: the outbox sends the final text and then deletes it
+                preview = await live.close()
             content = extract_message_content(data)
             if content:
                 content_len = len(content)
-                logger.info(f"[USER {user_id}] Extracted content ({content_len} chars)")
-                logger.debug(f"[USER {user_id}] Content preview: {content[:200]}...")
-
-                # Send message to Telegram
-                try:
-                    logger.info(f"[USER {user_id}] Attempting to send message to Telegram...")
-                    last_message = await bot.send_message(
-                        chat_id,
-                        content,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    logger.info(f"[USER {user_id}] Message sent successfully (msg_id={last_message.message_id})")
-                except Exception as e:
-                    logger.error(f"[USER {user_id}] Failed to send with markdown: {type(e).__name__}: {e}")
-                    # Try without markdown if it fails
-                    try:
-                        logger.info(f"[USER {user_id}] Retrying without markdown...")
-                        last_message = await bot.send_message(chat_id, content)
-                        logger.info(f"[USER {user_id}] Message sent without markdown (msg_id={last_message.message_id})")
-                    except Exception as e2:
-                        logger.error(f"[USER {user_id}] Failed to send message completely: {type(e2).__name__}: {e2}")
-                        logger.error(f"[USER {user_id}] Content length was: {len(content)} chars")
-                        logger.error(f"[USER {user_id}] First 500 chars: {content[:500]}")
+                logger.info(f"[{tag}] Extracted content ({content_len} chars)")
+                logger.debug(f"[{tag}] Content preview: {content[:200]}...")
+
+                # Send message to Telegram, keyed by its place in the spool so a replay doesn't repeat it
+                await outbox.send(
+                    chat_id, thread_id, content, idempotency_key=f"{spool.id}:{spool.position}", preview=preview
+                )
+            if preview:
+                # The outbox row owns the preview now
+                spool.update(preview=[])
 
             # Check if result received (unlock session)
             if data.get("type") == "result":
-                session["locked"] = False
-                save_session(user_id, session)
-
+                completed = not data.get("is_error")
+                record_turn(model, model_reason, data.get("duration_ms"), data.get("total_cost_usd"))
+                logger.info(
+                    f"[{tag}] Turn stats: model={model} "
+                    f"duration_ms={data.get('duration_ms')} cost_usd={data.get('total_cost_usd')}"
+                )
+                # Keep the lock while the session is being rotated
+                rotate = needs_rotation(session)
+                session["locked"] = rotate
+                save_session(key, session)
+
+            # Delivered or queued in the outbox: not replayed if the bot restarts
+            spool.mark_delivered()
+
+        # Send files Claude made for the user, no need to ask for them in another turn
+        # Collected once and kept in the spool, so a replay queues the same batches under the same keys
+        uploads = spool.meta.get("uploads")
+        if uploads is None:
+            uploads = [str(path) for path in collect_turn_files(key, written_files, spool.meta["started"])]
+            spool.update(uploads=uploads)
+        batches, too_large = plan_uploads([Path(name) for name in uploads if Path(name).is_file()])
+        if batches or too_large:
+            await live.finish()
+        for number, batch in enumerate(batches):
+            await outbox.send_files(chat_id, thread_id, batch, idempotency_key=f"{spool.id}:files:{number}")
+        if too_large:
+            await outbox.send(
+                chat_id, thread_id, too_large_note(too_large), idempotency_key=f"{spool.id}:files:large", markdown=False
+            )
+
+        if rotate:
+            # Answer is complete for the user, summary runs behind the finished status
+            await live.finish()
+            await status.finish(completed)
+            await rotate_session(key, session, system_prompt_file)
+
+    except TurnAborted as e:
+        logger.warning(f"[{tag}] Turn aborted: {e}")
+        try:
+            await outbox.send(chat_id, thread_id, f"⛔ Запрос остановлен: {e}", markdown=False)
+        except Exception:
+            pass
     except Exception as e:
         logger.error(f"Error processing Claude stream: {e}")
         try:
-            await bot.send_message(chat_id, f"❌ Ошибка: {str(e)}")
+            await outbox.send(chat_id, thread_id, f"❌ Ошибка: {str(e)}", markdown=False)
         except:
             pass
     finally:
-        # Ensure session is unlocked
-        session = get_session(user_id)
-        session["locked"] = False
-        save_session(user_id, session)
+        # Stop Claude if the stream was left early (abort, error, /start)
+        if stream:
+            await stream.aclose()
+
+        if slot_acquired:
+            turn_slots.release()
+
+        if turn_log:
+            turn_log.close(session_id=session.get("claude_session_id"), completed=completed)
+
+        if is_detaching() and spool is not None:
+            # Bot is restarting: Claude keeps running, the next bot process delivers the rest
+            logger.info(f"[{tag}] Leaving turn {spool.id} running for the next bot process")
+        else:
+            # Show text left after an error or interrupted stream
+            try:
+                await live.finish()
+            except Exception as e:
+                logger.error(f"[{tag}] Failed to finish live message: {e}")
+
+            await status.finish(completed)
+
+            if is_detaching():
+                # Turn was still waiting for a slot, Claude never started: persisted notice, the
+                # next bot process delivers it if this one can't
+                outbox.enqueue(
+                    chat_id, thread_id,
+                    "🔄 Бот перезапускался, запрос не был начат. Отправьте его ещё раз.",
+                    markdown=False
+                )
+
+            # Ensure session is unlocked
+            session = get_session(key)
+            session["locked"] = False
+            save_session(key, session)
+
+            if spool:
+                spool.remove()
 
         # Remove from active processes
-        if user_id in processes:
-            del processes[user_id]
+        if key in processes:
+            del processes[key]
 
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
-    """Handle /start command - reset session."""
+    """Handle /start command - reset session of this chat (or forum topic)."""
     user_id = message.from_user.id
 
     # Check if user is allowed
     if user_id not in ALLOWED_USERS:
         return
 
+    key = session_key(message)
+
     # Kill active process if exists
-    if user_id in processes:
-        task = processes[user_id]
+    if key in processes:
+        task = processes[key]
         if not task.done():
             task.cancel()
-        del processes[user_id]
+        del processes[key]
 
     # Delete session file
-    delete_session(user_id)
+    delete_session(key)
 
     await message.reply("🔄 Сессия очищена. Можете начать новый диалог.")
 
 
+@dp.message(Command("model"))
+async def cmd_model(message: types.Message, command: CommandObject):
+    """Handle /model command - show or pin Claude model."""
+    user_id = message.from_user.id
+
+    # Check if user is allowed
+    if user_id not in ALLOWED_USERS:
+        return
+
+    choices = [AUTO] + CLAUDE_MODELS
+    choice = (command.args or "").strip().lower()
+    key = session_key(message)
+    session = get_session(key)
+
+    if not choice:
+        current = session.get("model", AUTO)
+        stats = format_stats()
+        text = f"🧠 Модель: {current}\nВарианты: /model {' | '.join(choices)}"
+        if stats:
+            text += f"\n\n📊 Статистика:\n{stats}"
+        await message.reply(text)
+        return
+
+    if choice not in choices:
+        await message.reply(f"❌ Неизвестная модель. Варианты: {', '.join(choices)}")
+        return
+
+    session["model"] = choice
+    save_session(key, session)
+    await message.reply(f"✅ Модель: {choice}")
+
+
+@dp.message(Command(*FAST_COMMANDS))
+async def cmd_fast(message: types.Message, command: CommandObject):
+    """Handle read-only commands (/downloads, /search, ...) with scripts, without Claude."""
+    user_id = message.from_user.id
+
+    # Check if user is allowed
+    if user_id not in ALLOWED_USERS:
+        return
+
+    logger.info(f"[USER {user_id}] Fast command /{command.command} {command.args or ''}")
+    try:
+        reply = await run_fast_command(command.command, command.args)
+    except Exception as e:
+        logger.error(f"[USER {user_id}] Fast command failed: {type(e).__name__}: {e}")
+        reply = f"❌ Ошибка: {e}"
+
+    await message.reply(reply)
+
+
 @dp.message()
 async def handle_message(message: types.Message):
-    """Handle all text messages."""
+    """Handle text messages and attachments."""
     user_id = message.from_user.id
 
     # Check if user is allowed
     if user_id not in ALLOWED_USERS:
         return
 
+    attachment = get_attachment(message)
+    if attachment is None and not message.text:
+        return
+
+    # .torrent goes straight to qBittorrent, no Claude turn and no lock needed
+    if attachment and is_torrent(attachment):
+        try:
+            path = await save_attachment(bot, user_id, attachment)
+            _, chat_id, thread_id = session_key(message)
+            reply = await add_torrent_file(path, message.caption, chat_id, thread_id)
+        except AttachmentError as e:
+            reply = f"❌ {e}"
+        await message.reply(reply or "✅ Готово")
+        return
+
+    # Sessions and locks are per conversation: other chats and topics run in parallel
+    key = session_key(message)
+
     # Check if session is locked
-    session = get_session(user_id)
+    session = get_session(key)
     if session.get("locked", False):
         await message.reply("⏳ Дождитесь завершения предыдущего запроса.")
         return
 
-    # Check if there's an active process (shouldn't happen with proper locking)
-    if user_id in processes and not processes[user_id].done():
+    # Check if there's an active process or a turn being prepared
+    if key in claimed or (key in processes and not processes[key].done()):
         await message.reply("⏳ Дождитесь завершения предыдущего запроса.")
         return
 
-    # Format prompt
-    prompt = format_user_prompt(message)
+    # Claim the conversation before anything is awaited, the session is locked only when the turn starts
+    claimed.add(key)
+
+    try:
+        # Attachment is saved into the workspace (a download of up to seconds), Claude gets its path
+        attachment_note = None
+        if attachment:
+            try:
+                path = await save_attachment(bot, user_id, attachment)
+            except AttachmentError as e:
+                await message.reply(f"❌ {e}")
+                return
+            attachment_note = describe_attachment(attachment, path)
+
+        # Format prompt, static context goes to the system prompt
+        files_dir = output_dir(key)
+        files_dir.mkdir(parents=True, exist_ok=True)
+        prompt = format_user_prompt(message, files_dir, attachment_note)
+        user = message.from_user
+        system_prompt_file = write_system_prompt(user.id, user.username, user.full_name, user.language_code)
+        model, model_reason = choose_model(message_text(message), session)
+
+        # Status line, updated while the turn runs
+        status_message = await message.reply("🤖 Обрабатываю запрос...")
+
+        # Start processing in background
+        task = asyncio.create_task(
+            process_claude_stream(key, prompt, status_message, system_prompt_file, model, model_reason)
+        )
+        processes[key] = task
+    finally:
+        # Released on every exit, a started turn is kept busy by processes[key]
+        claimed.discard(key)
 
-    # Start processing in background
-    task = asyncio.create_task(
-        process_claude_stream(user_id, message.chat.id, prompt)
-    )
-    processes[user_id] = task
 
-    # Send initial message
-    await message.reply("🤖 Обрабатываю запрос...")
+async def reattach_turns() -> None:
+    """Continue delivery of turns left running (or finished undelivered) by the previous bot process."""
+    for spool in list_spools():
+        if not spool.meta.get("key"):
+            # Temporary run like a session summary, nobody waits for it
+            await stop_claude(spool)
+            spool.remove()
+            continue
+
+        key = tuple(spool.meta["key"])
+        user_id, chat_id, thread_id = key
+        logger.info(f"[{session_tag(key)}] Reattaching to turn {spool.id} (running: {spool.is_running()})")
+
+        try:
+            status_message = await bot.send_message(
+                chat_id, "🔄 Бот перезапущен, продолжаю обработку запроса...", message_thread_id=thread_id
+            )
+        except Exception as e:
+            # Spool is kept for the next restart
+            logger.error(f"[{session_tag(key)}] Failed to reattach to turn {spool.id}: {type(e).__name__}: {e}")
+            continue
+
+        # Text streamed by the previous process: the replay streams it again or sends it complete
+        for message_id in spool.meta.get("preview", []):
+            try:
+                await bot.delete_message(chat_id, message_id)
+            except Exception as e:
+                logger.warning(f"[{session_tag(key)}] Preview {message_id} not deleted: {type(e).__name__}: {e}")
+        spool.update(preview=[])
+
+        processes[key] = asyncio.create_task(process_claude_stream(
+            key, "", status_message, Path(spool.meta["system_prompt_file"]),
+            spool.meta["model"], spool.meta["model_reason"], spool
+        ))
 
 
 async def main():
@@ -246,6 +539,24 @@ async def main():
     else:
         logger.info(f"Allowed users: {ALLOWED_USERS}")
 
+    # Probe cgroup limits once, falling back when systemd or the cgroup root is unusable
+    await asyncio.to_thread(detect_isolation)
+
+    # Deliver messages left pending by the previous bot process before turns add new ones
+    await outbox.drain()
+    outbox_task = asyncio.create_task(outbox.run())
+
+    # Finish turns of the previous bot process, locks of other conversations are stale
+    await reattach_turns()
+    unlock_sessions(set(processes))
+
+    # Archive transcripts of forgotten sessions in background
+    gc_task = asyncio.create_task(gc_loop())
+
+    # Progress and "done" messages for torrents added from chats, optional Jellyfin rescan of downloads
+    hooks = [refresh_jellyfin] if JELLYFIN_AUTO_REFRESH else []
+    watch_task = asyncio.create_task(TorrentWatcher(bot, outbox, hooks).run())
+
     # Start polling
     try:
         await dp.start_polling(bot)
@@ -254,10 +565,16 @@ async def main():
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
-        # Cancel all active tasks
-        for task in processes.values():
-            if not task.done():
-                task.cancel()
+        gc_task.cancel()
+        watch_task.cancel()
+        outbox_task.cancel()
+
+        # Cancel all active tasks, their Claude processes keep running for the next bot process
+        detach_turns()
+        tasks = [task for task in processes.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
         await bot.session.close()
 
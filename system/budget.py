@@ -0,0 +1,80 @@
+"""Per-turn token and cost budgets for tg2claude bot.
+
+The CLI reports cost only in the final result event, so runaway turns are
+caught from assistant message usage while they run: tokens are summed per
+API call and priced with MODEL_PRICES. One API call is reported by several
+assistant events (one per content block) whose output_tokens grow, so the
+latest usage of each call is kept and only the growth is added. The result
+event's totals, when larger, replace the estimate.
+"""
+
+from typing import Any, Dict, Optional
+
+from config import MODEL_PRICES, TURN_MAX_COST_USD, TURN_MAX_TOKENS
+
+
+USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+
+
+class TurnBudget:
+    """Token and cost accounting for one turn."""
+
+    def __init__(self, model: str):
+        self.prices = MODEL_PRICES.get(model, MODEL_PRICES["sonnet"])
+        self.tokens = 0
+        self.cost_usd = 0.0
+        # Latest usage counted for each API call (message id)
+        self.counted: Dict[str, Dict[str, int]] = {}
+
+    def add(self, data: Dict[str, Any]) -> None:
+        """Account usage of an assistant event (main agent and subagents) or the final result."""
+        if data.get("type") == "result":
+            self.add_result(data)
+            return
+        if data.get("type") != "assistant":
+            return
+
+        message = data.get("message", {})
+        usage = message.get("usage")
+        if not usage:
+            return
+
+        # Usage of a call only grows between its events, count the difference
+        current = {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+        message_id = message.get("id")
+        if message_id:
+            previous = self.counted.get(message_id, {})
+            current = {field: max(value, previous.get(field, 0)) for field, value in current.items()}
+            self.counted[message_id] = current
+            delta = {field: value - previous.get(field, 0) for field, value in current.items()}
+        else:
+            delta = current
+
+        input_tokens = delta["input_tokens"]
+        cache_write = delta["cache_creation_input_tokens"]
+        cache_read = delta["cache_read_input_tokens"]
+        output_tokens = delta["output_tokens"]
+
+        # Cache reads are cheap and repeat the whole context on every call, so not counted as tokens
+        self.tokens += input_tokens + cache_write + output_tokens
+        self.cost_usd += (
+            input_tokens * self.prices["input"]
+            + cache_write * self.prices["cache_write"]
+            + cache_read * self.prices["cache_read"]
+            + output_tokens * self.prices["output"]
+        ) / 1_000_000
+
+    def add_result(self, data: Dict[str, Any]) -> None:
+        """Reconcile with the totals the CLI reports at the end of the turn."""
+        usage = data.get("usage") or {}
+        tokens = sum(usage.get(field) or 0 for field in USAGE_FIELDS if field != "cache_read_input_tokens")
+        self.tokens = max(self.tokens, tokens)
+        self.cost_usd = max(self.cost_usd, data.get("total_cost_usd") or 0.0)
+
+    def exceeded(self) -> Optional[str]:
+        """Reason for the user if a budget is exceeded."""
+        if self.tokens > TURN_MAX_TOKENS:
+            return f"превышен лимит токенов на ход ({self.tokens:,} > {TURN_MAX_TOKENS:,})"
+        if self.cost_usd > TURN_MAX_COST_USD:
+            return f"превышен лимит стоимости хода (${self.cost_usd:.2f} > ${TURN_MAX_COST_USD:.2f})"
+        return None
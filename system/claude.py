@@ -1,13 +1,56 @@
 """Claude Code interaction module."""
 
 import asyncio
+import logging
 import os
+import signal
 import subprocess
+import time
+from pathlib import Path
 from typing import AsyncGenerator, Optional
-from config import WORKSPACE_DIR, CLAUDE_BASE_CMD
+from config import (
+    WORKSPACE_DIR, CLAUDE_BASE_CMD, CLAUDE_MODEL, PROMPT_FILE, TURN_STALL_TIMEOUT, TURN_MAX_SECONDS,
+    TURN_POLL_INTERVAL
+)
+from isolation import TurnScope
+from routing import record_resources
+from spool import TURN_ENV, TurnSpool, chat_env, create_spool
 
+logger = logging.getLogger(__name__)
 
-async def run_claude(user_id: int, prompt: str, session_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+# Seconds between SIGTERM and SIGKILL when stopping a turn
+STOP_GRACE_SECONDS = 5
+
+# Stderr lines logged for an aborted turn
+STDERR_TAIL_LINES = 20
+
+# Set on shutdown: running turns are left alone for the next bot process to reattach
+detaching = False
+
+
+class TurnAborted(Exception):
+    """Turn stopped by watchdog or budget, message is the reason for the user."""
+
+
+def detach_turns() -> None:
+    """Keep Claude processes running when their streams are closed (bot restart)."""
+    global detaching
+    detaching = True
+
+
+def is_detaching() -> bool:
+    """Bot is shutting down and leaves running turns to the next process."""
+    return detaching
+
+
+async def run_claude(
+    user_id: int,
+    prompt: str,
+    session_id: Optional[str] = None,
+    system_prompt_file: Optional[Path] = None,
+    model: str = CLAUDE_MODEL,
+    spool: Optional[TurnSpool] = None
+) -> AsyncGenerator[str, None]:
     """
     Run Claude Code subprocess and yield output lines.
 
@@ -15,12 +58,48 @@ async def run_claude(user_id: int, prompt: str, session_id: Optional[str] = None
         user_id: Telegram user ID
         prompt: User message
         session_id: Optional Claude session ID for resuming
+        system_prompt_file: Generated system prompt (base PROMPT.md if not set)
+        model: Claude model for this turn
+        spool: Spool to run in; if its Claude is already started (reattach
+            after restart), output is followed from the delivered offset.
+            Without a spool a temporary one is used and removed afterwards.
 
     Yields:
         Lines from Claude Code stdout
+
+    Raises:
+        TurnAborted: no output for TURN_STALL_TIMEOUT or turn longer than TURN_MAX_SECONDS
     """
+    own_spool = spool is None
+    if own_spool:
+        spool = create_spool(user_id=user_id, model=model)
+
+    if not spool.meta.get("pid"):
+        start_claude(spool, user_id, prompt, session_id, system_prompt_file, model)
+
+    stream = follow_claude(spool, user_id, model)
+    try:
+        async for line in stream:
+            yield line
+    finally:
+        await stream.aclose()
+        if own_spool and not detaching:
+            spool.remove()
+
+
+def start_claude(
+    spool: TurnSpool,
+    user_id: int,
+    prompt: str,
+    session_id: Optional[str],
+    system_prompt_file: Optional[Path],
+    model: str
+) -> None:
+    """Start Claude detached from the bot, writing its stream into the spool."""
     # Build command
     cmd = CLAUDE_BASE_CMD.copy()
+    cmd.extend(["--model", model])
+    cmd.extend(["--system-prompt-file", str(system_prompt_file or PROMPT_FILE)])
 
     if session_id:
         # Resume existing session
@@ -29,35 +108,122 @@ async def run_claude(user_id: int, prompt: str, session_id: Optional[str] = None
     # Add prompt
     cmd.extend(["-p", prompt])
 
+    # Optional cgroup limits for the whole process tree
+    scope = TurnScope(user_id)
+    scope.create()
+    cmd = scope.command(cmd)
+
     # Start subprocess in workspace directory
-    # Set limit to 10MB to handle large JSON lines from Claude Code
     # Pass environment variables to ensure Claude Code can find MCP config
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        cwd=WORKSPACE_DIR,
-        env=os.environ.copy(),  # Pass current environment including HOME
-        limit=10 * 1024 * 1024  # 10 MB buffer for large tool results
+    # Own session so tools and MCP servers are stopped together with Claude,
+    # and a bot restart doesn't kill the turn
+    env = os.environ.copy()  # Pass current environment including HOME
+    env[TURN_ENV] = spool.id
+    if spool.meta.get("key"):
+        _, chat_id, thread_id = spool.meta["key"]
+        env.update(chat_env(chat_id, thread_id))
+    try:
+        with open(spool.stdout_path, "wb") as stdout, open(spool.stderr_path, "wb") as stderr:
+            spool.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=WORKSPACE_DIR,
+                env=env,
+                start_new_session=True
+            )
+    except Exception:
+        scope.close()
+        raise
+
+    spool.update(
+        pid=spool.process.pid,
+        started=time.time(),
+        cgroup=str(scope.cgroup) if scope.cgroup else None
     )
 
-    # Read stdout line by line
-    while True:
-        line = await process.stdout.readline()
-        if not line:
-            break
 
-        # Decode and yield line
-        yield line.decode("utf-8", errors="ignore").rstrip()
+async def follow_claude(spool: TurnSpool, user_id: int, model: str) -> AsyncGenerator[str, None]:
+    """
+    Yield lines of the spooled stream from spool.position until Claude exits.
+    spool.position is advanced past each yielded line.
+    """
+    deadline = spool.meta.get("started", time.time()) + TURN_MAX_SECONDS
+    last_output = time.time()
+    # Before Claude is reaped, so getrusage accounts it when there is no cgroup
+    scope = TurnScope(user_id, spool.meta.get("cgroup"))
+
+    try:
+        with open(spool.stdout_path, "rb") as stdout:
+            stdout.seek(spool.position)
+
+            # Watchdog kills silent or overlong turns
+            while True:
+                line = stdout.readline()
+                if line.endswith(b"\n"):
+                    spool.position = stdout.tell()
+                    last_output = time.time()
+                    # Decode and yield line
+                    yield line.decode("utf-8", errors="ignore").rstrip()
+                    continue
 
-    # Wait for process to complete
-    await process.wait()
+                # Partial or no line: wait for more output
+                stdout.seek(spool.position)
+                if not spool.is_running():
+                    # Output written before exit is complete now
+                    rest = stdout.read()
+                    spool.position += len(rest)
+                    for tail_line in rest.decode("utf-8", errors="ignore").splitlines():
+                        yield tail_line.rstrip()
+                    break
 
+                now = time.time()
+                if now >= deadline:
+                    raise TurnAborted(f"ход длится дольше {TURN_MAX_SECONDS // 60} мин")
+                if now - last_output >= TURN_STALL_TIMEOUT:
+                    raise TurnAborted(f"нет событий от Claude {TURN_STALL_TIMEOUT} с")
 
-def kill_process(process: asyncio.subprocess.Process) -> None:
-    """Kill a subprocess if it exists and is running."""
-    if process and process.returncode is None:
+                await asyncio.sleep(TURN_POLL_INTERVAL)
+    except TurnAborted:
+        stderr_tail = read_tail(spool.stderr_path, STDERR_TAIL_LINES)
+        if stderr_tail:
+            logger.warning(f"[USER {user_id}] Claude stderr before abort:\n{stderr_tail}")
+        raise
+    finally:
+        if not detaching:
+            # Stream closed early (abort, budget, /start) - don't leave Claude running
+            await stop_claude(spool)
+
+            # Without a cgroup only our own children are accounted, not a reattached turn
+            if spool.process or scope.cgroup:
+                usage = scope.usage()
+                logger.info(f"[USER {user_id}] Turn resources: {usage}")
+                record_resources(model, usage)
+            scope.close()
+
+
+async def stop_claude(spool: TurnSpool) -> None:
+    """Stop Claude and its process group: SIGTERM, then SIGKILL after a grace period."""
+    pid = spool.meta.get("pid")
+
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        if not spool.is_running():
+            return
         try:
-            process.terminate()
-        except:
-            pass
\ No newline at end of file
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            return
+
+        deadline = time.monotonic() + STOP_GRACE_SECONDS
+        while spool.is_running() and time.monotonic() < deadline:
+            await asyncio.sleep(TURN_POLL_INTERVAL)
+
+
+def read_tail(path: Path, lines: int) -> str:
+    """Last lines of a text file, empty if missing."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return "\n".join(f.read().splitlines()[-lines:])
+    except IOError:
+        return ""
@@ -0,0 +1,77 @@
+"""Session rotation for tg2claude bot.
+
+Sessions are resumed with --resume until /start, so context keeps
+growing and every turn gets slower and more expensive. The bot tracks
+context size from assistant message usage; once it passes
+CONTEXT_ROTATE_TOKENS, the old session is asked for a summary and the
+next turn starts a fresh session seeded with it.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from claude import run_claude
+from config import CLAUDE_FAST_MODEL, CONTEXT_ROTATE_TOKENS
+from parser import parse_line
+from sessions import SessionKey, save_session
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Разговор стал слишком длинным и будет продолжен в новой сессии без истории.
+Перескажи всё, что понадобится для продолжения: о чём просил пользователь, что уже сделано \
+(какие торренты добавлены, их hash, что включено/выключено), что осталось сделать, договорённости \
+и предпочтения пользователя. Только факты, кратко, списком. Не используй инструменты."""
+
+
+def needs_rotation(session: Dict[str, Any]) -> bool:
+    """Session context passed the rotation threshold."""
+    return bool(session.get("claude_session_id")) and session.get("context_tokens", 0) >= CONTEXT_ROTATE_TOKENS
+
+
+async def summarize(user_id: int, session_id: str, system_prompt_file: Path) -> Optional[str]:
+    """Ask the old session for a summary, None if it failed."""
+    summary = None
+
+    async for line in run_claude(user_id, SUMMARY_PROMPT, session_id, system_prompt_file, CLAUDE_FAST_MODEL):
+        data = parse_line(line)
+        if data and data.get("type") == "result" and not data.get("is_error"):
+            summary = data.get("result")
+
+    return summary.strip() if summary else None
+
+
+async def rotate_session(key: SessionKey, session: Dict[str, Any], system_prompt_file: Path) -> bool:
+    """
+    Replace Claude session with a summary for the next turn.
+    On failure the session is kept and rotation is retried after the next turn.
+    """
+    user_id = key[0]
+    old_session_id = session["claude_session_id"]
+    logger.info(f"[USER {user_id}] Rotating session {old_session_id} ({session.get('context_tokens')} tokens)")
+
+    summary = await summarize(user_id, old_session_id, system_prompt_file)
+    if not summary:
+        logger.error(f"[USER {user_id}] Session summary failed, keeping {old_session_id}")
+        return False
+
+    session["claude_session_id"] = None
+    session["context_tokens"] = 0
+    session["summary"] = summary
+    save_session(key, session)
+
+    logger.info(f"[USER {user_id}] Session rotated, summary {len(summary)} chars")
+    return True
+
+
+def with_summary(prompt: str, session: Dict[str, Any]) -> str:
+    """Prefix first prompt of a rotated session with the previous session summary."""
+    summary = session.get("summary")
+    if not summary or session.get("claude_session_id"):
+        return prompt
+
+    return f"""Краткое содержание предыдущего разговора (история сессии была сжата):
+{summary}
+
+---
+{prompt}"""
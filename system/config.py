@@ -12,6 +12,7 @@ BASE_DIR = Path(__file__).parent.parent  # tg2claude/
 WORKSPACE_DIR = BASE_DIR / "workspace"
 SESSIONS_DIR = BASE_DIR / "sessions"
 PROMPT_FILE = BASE_DIR / "system" / "PROMPT.md"
+PROMPTS_DIR = SESSIONS_DIR / "prompts"  # Generated per-user system prompts
 
 # Telegram configuration
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN", "")
@@ -21,12 +22,107 @@ allowed_users_str = os.getenv("ALLOWED_USERS", "")
 ALLOWED_USERS = {int(uid.strip()) for uid in allowed_users_str.split(",") if uid.strip()}
 
 # Claude command configuration
-CLAUDE_MODEL = "sonnet"
+CLAUDE_MODEL = "sonnet"  # Default model
+CLAUDE_FAST_MODEL = "haiku"  # Short device commands (system/routing.py)
+CLAUDE_MODELS = ["haiku", "sonnet", "opus"]  # Allowed in /model
+MODEL_STATS_FILE = SESSIONS_DIR / "model_stats.json"
 CLAUDE_BASE_CMD = [
     "/home/dev/.local/bin/claude",
     "--dangerously-skip-permissions",
     "--verbose",
-    "--model", CLAUDE_MODEL,
     "--output-format", "stream-json",
-    "--system-prompt-file", "../system/PROMPT.md"
-]
\ No newline at end of file
+    "--include-partial-messages",  # Text deltas for live messages
+]
+
+# Turn watchdog and budgets (system/claude.py, system/budget.py)
+TURN_STALL_TIMEOUT = 5 * 60  # Kill turn after this many seconds without stream events
+TURN_MAX_SECONDS = 30 * 60  # Wall-clock limit per turn
+TURN_MAX_TOKENS = 2_000_000  # Input, cache-write and output tokens per turn (cache reads excluded)
+TURN_MAX_COST_USD = 3.0  # Estimated cost per turn
+# USD per million tokens, used to estimate cost while the turn runs
+MODEL_PRICES = {
+    "haiku": {"input": 1.0, "output": 5.0, "cache_write": 1.25, "cache_read": 0.10},
+    "sonnet": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "opus": {"input": 5.0, "output": 25.0, "cache_write": 6.25, "cache_read": 0.50},
+}
+
+# Claude runs detached from the bot with output spooled to files (system/spool.py)
+TURNS_DIR = SESSIONS_DIR / "turns"
+TURN_POLL_INTERVAL = 0.1  # Seconds between checks for new output
+
+# Durable outbox for Telegram messages (system/outbox.py)
+OUTBOX_FILE = SESSIONS_DIR / "outbox.db"
+OUTBOX_RETRY_BASE = 2  # Seconds before the first retry, doubled on every failure
+OUTBOX_RETRY_MAX = 5 * 60  # Longest delay between retries
+OUTBOX_MAX_ATTEMPTS = 30  # Give up on a message after this many failed sends
+OUTBOX_KEEP_SENT = 24 * 60 * 60  # Keep sent messages (and their idempotency keys) this long
+
+# Compressed raw stream log per conversation (system/turnlog.py)
+TURN_LOG_DIR = SESSIONS_DIR / "turnlog"
+TURN_LOG_SEGMENT_MB = 16  # Start a new segment above this size
+TURN_LOG_RETENTION_DAYS = 30  # Delete segments older than this
+
+# Per-turn cgroup v2 limits (system/isolation.py)
+TURN_ISOLATION = os.getenv("TURN_ISOLATION", "")  # "systemd", "cgroupfs" or empty to disable
+TURN_CGROUP_ROOT = Path(os.getenv("TURN_CGROUP_ROOT", "/sys/fs/cgroup/tg2claude"))  # Delegated subtree for cgroupfs
+TURN_CPU_WEIGHT = int(os.getenv("TURN_CPU_WEIGHT", "50"))  # Relative to 100 of the bot itself
+TURN_MEMORY_MAX = os.getenv("TURN_MEMORY_MAX", "2G")
+TURN_PIDS_MAX = int(os.getenv("TURN_PIDS_MAX", "512"))
+
+# Parallel turns across all conversations (sessions keyed by user, chat and topic)
+MAX_CONCURRENT_TURNS = 4
+
+# Session rotation (system/compaction.py)
+CONTEXT_ROTATE_TOKENS = 120_000  # Summarize and start a fresh session above this context size
+
+# Transcript GC (system/session_gc.py)
+CLAUDE_PROJECTS_DIR = Path(os.getenv("CLAUDE_CONFIG_DIR") or Path.home() / ".claude") / "projects"
+SESSION_HISTORY_FILE = SESSIONS_DIR / "history.json"  # Every session ID the bot has used
+GC_ARCHIVE_DIR = SESSIONS_DIR / "archive"
+GC_RETENTION_DAYS = 30  # Archive transcripts not used for this long
+GC_SIZE_BUDGET_MB = 500  # Archive oldest transcripts while total is above this
+GC_MIN_AGE_HOURS = 24  # Never touch transcripts modified more recently
+GC_ARCHIVE_DAYS = 180  # Delete archives older than this
+GC_INTERVAL = 24 * 60 * 60  # Run GC once a day
+
+# Knowledge retrieval (system/knowledge.py)
+KNOWLEDGE_DIR = WORKSPACE_DIR / "knowledge"
+KNOWLEDGE_SNIPPETS_BUDGET = 3000  # Max characters of snippets added to a message
+KNOWLEDGE_SECTION_CHARS = 1500  # Max characters per section
+KNOWLEDGE_MAX_SECTIONS = 3
+KNOWLEDGE_MIN_SCORE = 3.0  # Sections scoring lower are considered unrelated
+
+# Live streaming of assistant text (system/streaming.py)
+STREAM_EDIT_INTERVAL = 1.0  # Minimum seconds between edits of a live message
+STATUS_INTERVAL = 4.0  # Typing action and status line refresh, seconds (typing expires after 5)
+
+# Attachments (system/attachments.py)
+INBOX_DIR = WORKSPACE_DIR / "inbox"  # Files from users, inbox/<user_id>/
+ATTACHMENT_CACHE_FILE = SESSIONS_DIR / "attachments.json"  # file_unique_id -> saved path
+ATTACHMENT_MAX_MB = 20  # Bot API can't download larger files
+ATTACHMENT_CHUNK_SIZE = 256 * 1024  # Download is streamed to disk in chunks of this size
+ATTACHMENT_DOWNLOAD_TIMEOUT = 120  # Seconds
+
+# Upload of files produced by Claude (system/uploads.py)
+OUTPUT_DIR = WORKSPACE_DIR / "output"  # Files for users, output/<session file stem>/ per conversation
+UPLOAD_MAX_FILES = 10  # Per turn
+UPLOAD_MAX_MB = 50  # Bot API upload limit
+UPLOAD_PHOTO_MAX_MB = 10  # Larger images are sent as documents
+UPLOAD_CHUNK_SIZE = 256 * 1024  # Upload is streamed from disk in chunks of this size
+
+# Progress notifications for torrents added from chats (system/torrent_watch.py)
+TORRENT_WATCH_FILE = SESSIONS_DIR / "torrent_watch.json"  # Progress messages of tracked torrents
+TORRENT_WATCH_INTERVAL = 5  # Seconds between qBittorrent syncs while tracked torrents download
+TORRENT_WATCH_IDLE_INTERVAL = 30  # Seconds between syncs when nothing is tracked
+TORRENT_PROGRESS_INTERVAL = 60  # Minimum seconds between edits of a progress message
+# Rescan just the completed download in Jellyfin instead of waiting for a library scan
+JELLYFIN_AUTO_REFRESH = os.getenv("JELLYFIN_AUTO_REFRESH", "") == "1"
+JELLYFIN_REFRESH_CATEGORIES = {"Movies", "TV Shows"}  # qBittorrent categories of Jellyfin libraries
+
+# Fast-path commands (system/fastpath.py)
+FAST_COMMAND_TIMEOUT = 20  # Seconds
+
+# Tool daemon configuration (system/toolsd.py)
+# Default path must match SOCKET_PATH in workspace/scripts/toolsd_client.py
+TOOLSD_SOCKET = os.getenv("TOOLSD_SOCKET") or f"/tmp/tg2claude-toolsd-{os.getuid()}.sock"
+TOOLSD_REFRESH_INTERVAL = 30 * 60  # Re-login to services every 30 minutes
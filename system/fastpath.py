@@ -0,0 +1,74 @@
+"""Fast-path bot commands answered by workspace scripts without Claude.
+
+Read-only queries like "что качается?" don't need a Claude turn: the bot
+runs the same script Claude would run and replies with its output. The
+scripts forward themselves to the toolsd daemon when it's running, so a
+reply takes a fraction of a second.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+from config import WORKSPACE_DIR, FAST_COMMAND_TIMEOUT
+from streaming import TELEGRAM_MESSAGE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class FastCommand(NamedTuple):
+    """Bot command mapped to a workspace script."""
+    script: str
+    usage: Optional[str]  # Set if the command requires an argument
+    description: str
+
+
+FAST_COMMANDS: Dict[str, FastCommand] = {
+    "downloads": FastCommand("qbt-list-active.py", None, "Активные загрузки"),
+    "torrents": FastCommand("qbt-list-all.py", None, "Все торренты, /torrents <название> - поиск"),
+    "search": FastCommand("jellyfin-search.py", "/search <название>", "Поиск фильма или сериала в Jellyfin"),
+    "refresh": FastCommand("jellyfin-refresh.py", "/refresh <библиотека>", "Обновить библиотеку Jellyfin"),
+}
+
+
+async def run_script(script: str, args: List[str], env: Optional[Dict[str, str]] = None) -> str:
+    """Run workspace script and return its output (stdout and stderr), env is added to the bot's environment."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join("scripts", script), *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        cwd=WORKSPACE_DIR,
+        env={**os.environ, **(env or {})}
+    )
+
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), FAST_COMMAND_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return f"❌ Скрипт {script} не ответил за {FAST_COMMAND_TIMEOUT} с"
+
+    if process.returncode:
+        logger.warning(f"Fast command script {script} exited with code {process.returncode}")
+
+    return output.decode("utf-8", errors="replace").strip()
+
+
+async def run_fast_command(command: str, args: Optional[str]) -> str:
+    """Reply text for a fast-path command."""
+    fast_command = FAST_COMMANDS[command]
+    args = (args or "").strip()
+
+    if fast_command.usage and not args:
+        return f"Использование: {fast_command.usage}"
+
+    output = await run_script(fast_command.script, [args] if args else [])
+    if not output:
+        return "✅ Готово"
+
+    if len(output) > TELEGRAM_MESSAGE_LIMIT:
+        output = output[:TELEGRAM_MESSAGE_LIMIT - 2].rsplit("\n", 1)[0] + "\n…"
+
+    return output
@@ -0,0 +1,223 @@
+"""Per-turn resource isolation for Claude processes.
+
+Every turn can run in its own cgroup v2 with CPU weight, memory.max and
+pids.max limits, so a heavy tool run (ffmpeg, a big find) can't starve
+the bot and other users' turns. TURN_ISOLATION selects how:
+
+    systemd   - systemd-run --scope (--user when the bot is not root)
+    cgroupfs  - directories under TURN_CGROUP_ROOT, which must be a
+                delegated cgroup v2 subtree writable by the bot
+    (empty)   - no limits
+
+The mode is probed once (detect_isolation at bot start): when systemd-run
+can't create scopes the bot falls back to cgroupfs, and when the cgroup
+root isn't usable either, turns run without limits, with a warning.
+In cgroupfs mode the process joins its cgroup through a small shell
+wrapper that writes its own pid and execs Claude: the bot is threaded,
+so nothing runs between fork and exec.
+
+CPU time and peak memory of the turn are read from the cgroup when it is
+ours (cgroupfs) and from getrusage of reaped children otherwise.
+"""
+
+import logging
+import os
+import resource
+import subprocess
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import (
+    TURN_CGROUP_ROOT,
+    TURN_CPU_WEIGHT,
+    TURN_ISOLATION,
+    TURN_MEMORY_MAX,
+    TURN_PIDS_MAX,
+)
+
+logger = logging.getLogger(__name__)
+
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# Writes the shell's pid into cgroup.procs ($0) and becomes the command, so everything it starts is inside
+JOIN_CGROUP_SCRIPT = 'echo $$ > "$0" || echo "tg2claude: turn runs without cgroup limits" >&2; exec "$@"'
+
+# Mode actually in use, set by detect_isolation()
+_mode: Optional[str] = None
+
+
+def parse_size(value: str) -> str:
+    """Size like "2G" in bytes for cgroupfs, "max" kept as is."""
+    value = value.strip().upper()
+    if value == "MAX" or not value:
+        return "max"
+    if value[-1] in SIZE_UNITS:
+        return str(int(float(value[:-1]) * SIZE_UNITS[value[-1]]))
+    return str(int(value))
+
+
+def systemd_run_base() -> List[str]:
+    """systemd-run prefix for a transient scope of the bot's user."""
+    cmd = ["systemd-run", "--scope", "--quiet", "--collect"]
+    if os.getuid() != 0:
+        cmd.append("--user")
+    return cmd
+
+
+def systemd_available() -> bool:
+    """Whether systemd-run can create scopes here (needs systemd as init or a user manager)."""
+    try:
+        result = subprocess.run(
+            systemd_run_base() + ["true"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"systemd-run not usable: {e}")
+        return False
+    if result.returncode != 0:
+        logger.warning(f"systemd-run not usable: {result.stderr.decode(errors='replace').strip()}")
+        return False
+    return True
+
+
+def cgroupfs_available() -> bool:
+    """Whether TURN_CGROUP_ROOT is a writable cgroup v2 subtree with the needed controllers."""
+    try:
+        TURN_CGROUP_ROOT.mkdir(exist_ok=True)
+        enable_controllers(TURN_CGROUP_ROOT)
+    except OSError as e:
+        logger.warning(f"Cgroup root {TURN_CGROUP_ROOT} not usable: {e}")
+        return False
+    return True
+
+
+def detect_isolation() -> str:
+    """Probe configured TURN_ISOLATION once and pick the mode that works here."""
+    global _mode
+    if _mode is not None:
+        return _mode
+
+    mode = TURN_ISOLATION
+    if mode == "systemd" and not systemd_available():
+        mode = "cgroupfs"
+        logger.warning("Turn isolation: systemd not available, trying cgroupfs")
+    if mode == "cgroupfs" and not cgroupfs_available():
+        mode = ""
+    if TURN_ISOLATION and not mode:
+        logger.warning(f"Turn isolation {TURN_ISOLATION!r} not available, turns run without limits")
+    elif mode:
+        logger.info(f"Turn isolation: {mode}")
+
+    _mode = mode
+    return mode
+
+
+class TurnScope:
+    """Resource limits and accounting for one Claude process tree."""
+
+    def __init__(self, user_id: int, cgroup: Optional[str] = None):
+        """Pass cgroup of an already running turn to account and remove it (after bot restart)."""
+        self.name = f"tg2claude-turn-{user_id}-{uuid.uuid4().hex[:8]}"
+        self.cgroup: Optional[Path] = Path(cgroup) if cgroup else None
+        self.rusage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def command(self, cmd: List[str]) -> List[str]:
+        """Command wrapped into a systemd scope or into the cgroup made by create()."""
+        if self.cgroup:
+            return ["/bin/sh", "-c", JOIN_CGROUP_SCRIPT, str(self.cgroup / "cgroup.procs")] + cmd
+        if detect_isolation() != "systemd":
+            return cmd
+
+        wrapper = systemd_run_base() + [f"--unit={self.name}"]
+        wrapper.extend([
+            "-p", f"CPUWeight={TURN_CPU_WEIGHT}",
+            "-p", f"MemoryMax={TURN_MEMORY_MAX}",
+            "-p", f"TasksMax={TURN_PIDS_MAX}",
+            "--",
+        ])
+        return wrapper + cmd
+
+    def create(self) -> None:
+        """Create cgroup for the turn (cgroupfs mode), on failure the turn runs unlimited."""
+        if detect_isolation() != "cgroupfs":
+            return
+
+        cgroup = TURN_CGROUP_ROOT / self.name
+        try:
+            cgroup.mkdir()
+            (cgroup / "cpu.weight").write_text(str(TURN_CPU_WEIGHT))
+            (cgroup / "memory.max").write_text(parse_size(TURN_MEMORY_MAX))
+            (cgroup / "pids.max").write_text(str(TURN_PIDS_MAX))
+        except OSError as e:
+            logger.warning(f"Turn cgroup {cgroup} not created, running without limits: {e}")
+            if cgroup.exists():
+                remove_cgroup(cgroup)
+            return
+
+        self.cgroup = cgroup
+
+    def usage(self) -> Dict[str, Any]:
+        """CPU seconds and peak memory of the finished turn."""
+        if self.cgroup:
+            cpu = read_keyed(self.cgroup / "cpu.stat")
+            peak = read_int(self.cgroup / "memory.peak")
+            return {
+                "cpu_user_s": round(cpu.get("user_usec", 0) / 1e6, 2),
+                "cpu_system_s": round(cpu.get("system_usec", 0) / 1e6, 2),
+                "max_rss_mb": round(peak / 1024 ** 2, 1) if peak is not None else None,
+            }
+
+        # Children reaped since the turn started: approximate when turns overlap
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return {
+            "cpu_user_s": round(after.ru_utime - self.rusage_before.ru_utime, 2),
+            "cpu_system_s": round(after.ru_stime - self.rusage_before.ru_stime, 2),
+            "max_rss_mb": None,
+        }
+
+    def close(self) -> None:
+        """Remove turn cgroup (all processes must have exited)."""
+        if self.cgroup:
+            remove_cgroup(self.cgroup)
+            self.cgroup = None
+
+
+def enable_controllers(root: Path) -> None:
+    """Enable cpu, memory and pids controllers for children of root."""
+    control = root / "cgroup.subtree_control"
+    enabled = control.read_text().split()
+    missing = [c for c in ("cpu", "memory", "pids") if c not in enabled]
+    if missing:
+        control.write_text(" ".join(f"+{c}" for c in missing))
+
+
+def remove_cgroup(cgroup: Path) -> None:
+    """Remove cgroup directory, logging if processes are still inside."""
+    try:
+        cgroup.rmdir()
+    except OSError as e:
+        logger.warning(f"Turn cgroup {cgroup} not removed: {e}")
+
+
+def read_keyed(path: Path) -> Dict[str, int]:
+    """Read cgroup "key value" file like cpu.stat."""
+    values = {}
+    try:
+        for line in path.read_text().splitlines():
+            key, _, value = line.partition(" ")
+            if value.isdigit():
+                values[key] = int(value)
+    except OSError:
+        pass
+    return values
+
+
+def read_int(path: Path) -> Optional[int]:
+    """Read single-number cgroup file, None if missing (memory.peak needs Linux 5.19)."""
+    try:
+        return int(path.read_text().strip())
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,223 @@
+"""Retrieval over workspace/knowledge for tg2claude bot.
+
+Knowledge docs are split into sections by markdown headings and indexed
+with BM25. The bot looks up the incoming message and adds the best
+matching sections to the prompt, so Claude doesn't have to open the
+docs with tool calls on every turn. The index is rebuilt when any
+knowledge file is added, removed or modified.
+"""
+
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import (
+    KNOWLEDGE_DIR,
+    KNOWLEDGE_MAX_SECTIONS,
+    KNOWLEDGE_MIN_SCORE,
+    KNOWLEDGE_SECTION_CHARS,
+    KNOWLEDGE_SNIPPETS_BUDGET,
+)
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Heading and file name words count as this many occurrences
+TITLE_WEIGHT = 3
+
+# Words are cut to this length: crude stemming for Russian endings
+STEM_LENGTH = 6
+
+TOKEN_RE = re.compile(r"\w+")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "к", "ко", "у", "о", "об", "от", "до", "за", "из", "для",
+    "не", "ни", "но", "а", "или", "что", "как", "это", "так", "же", "ли", "бы", "то", "все", "всё",
+    "мне", "меня", "мой", "моя", "я", "ты", "он", "она", "мы", "вы", "они", "его", "её", "их",
+    "есть", "был", "была", "было", "будет", "можно", "нужно", "надо", "пожалуйста", "плиз",
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "it", "with",
+}
+
+
+class Section(NamedTuple):
+    """Part of a knowledge file under one heading."""
+    file: str
+    title: str
+    text: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase stemmed words without stop words."""
+    return [
+        word[:STEM_LENGTH]
+        for word in TOKEN_RE.findall(text.lower().replace("ё", "е"))
+        if word not in STOP_WORDS and not word.isdigit()
+    ]
+
+
+def split_sections(file_name: str, text: str) -> List[Section]:
+    """
+    Split markdown into sections by headings outside code blocks.
+    Section title is the heading path below the document title:
+    "5. Работа с файлами › 5.1. Посмотреть структуру файлов".
+    """
+    sections = []
+    path: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    in_code = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            title = " › ".join(title for level, title in path if level > 1)
+            sections.append(Section(file_name, title, body))
+        lines.clear()
+
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+
+        match = None if in_code else HEADING_RE.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, match.group(2)))
+        else:
+            lines.append(line)
+
+    flush()
+    return sections
+
+
+class KnowledgeIndex:
+    """BM25 index over sections of knowledge files."""
+
+    def __init__(self, sections: List[Section]):
+        self.sections = sections
+        self.term_freqs: List[Counter] = []
+        self.lengths: List[int] = []
+        doc_freq: Counter = Counter()
+
+        for section in sections:
+            title_tokens = tokenize(section.title + " " + Path(section.file).stem.replace("-", " "))
+            tokens = tokenize(section.text) + title_tokens * TITLE_WEIGHT
+            freqs = Counter(tokens)
+            self.term_freqs.append(freqs)
+            self.lengths.append(len(tokens))
+            doc_freq.update(freqs.keys())
+
+        count = len(sections)
+        self.avg_length = sum(self.lengths) / count if count else 0
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, Section]]:
+        """Best matching sections with their BM25 scores."""
+        terms = set(tokenize(query)) & self.idf.keys()
+        if not terms:
+            return []
+
+        scored = []
+        for i, freqs in enumerate(self.term_freqs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.avg_length)
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((score, self.sections[i]))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:limit]
+
+
+# Index cache and signature of files it was built from
+_index: Optional[KnowledgeIndex] = None
+_signature: Optional[Tuple] = None
+
+
+def files_signature(directory: Path) -> Tuple:
+    """Names, sizes and mtimes of knowledge files."""
+    try:
+        files = sorted(directory.glob("*.md"))
+    except OSError:
+        return ()
+
+    signature = []
+    for path in files:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def get_index() -> KnowledgeIndex:
+    """Knowledge index, rebuilt when files changed."""
+    global _index, _signature
+
+    signature = files_signature(KNOWLEDGE_DIR)
+    if _index is None or signature != _signature:
+        sections = []
+        for name, _, _ in signature:
+            try:
+                text = (KNOWLEDGE_DIR / name).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+            sections.extend(split_sections(name, text))
+        _index = KnowledgeIndex(sections)
+        _signature = signature
+
+    return _index
+
+
+# Between snippets in the prompt
+SNIPPET_SEPARATOR = "\n\n"
+# Longest tail a cut section gets: closing code fence and ellipsis
+CUT_SUFFIX = "\n```\n…"
+
+
+def retrieve(query: str) -> str:
+    """
+    Relevant knowledge sections for the query, formatted for the prompt
+    and limited to KNOWLEDGE_SNIPPETS_BUDGET characters. Empty if nothing matches.
+    """
+    results = get_index().search(query, KNOWLEDGE_MAX_SECTIONS)
+
+    parts = []
+    budget = KNOWLEDGE_SNIPPETS_BUDGET
+    for score, section in results:
+        if score < KNOWLEDGE_MIN_SCORE:
+            break
+
+        header = f"[knowledge/{section.file}" + (f" › {section.title}]\n" if section.title else "]\n")
+        separator = len(SNIPPET_SEPARATOR) if parts else 0
+        text = section.text
+        limit = min(KNOWLEDGE_SECTION_CHARS, budget - separator - len(header))
+        if len(text) > limit:
+            # Room for the closing fence and the ellipsis added below
+            text = text[:max(0, limit - len(CUT_SUFFIX))].rsplit("\n", 1)[0]
+            if text.count("```") % 2:
+                # Close code block cut in the middle
+                text += "\n```"
+            text += "\n…"
+
+        # Checked before appending: a section that doesn't fit even cut is skipped
+        snippet = header + text
+        if not text.strip("\n…") or separator + len(snippet) > budget:
+            continue
+
+        parts.append(snippet)
+        budget -= separator + len(snippet)
+
+    return SNIPPET_SEPARATOR.join(parts)
@@ -0,0 +1,244 @@
+"""MCP server exposing qBittorrent and Jellyfin operations as typed tools.
+
+Replaces shelling out to workspace/scripts/*.py for the common media actions:
+clients from scripts/media_clients.py stay logged in for the whole Claude
+session and tools return compact JSON instead of decorated text.
+
+Register once (see MCP_TROUBLESHOOTING.md):
+    claude mcp add --transport stdio media -- /path/to/venv/bin/python /path/to/system/mcp_media.py
+"""
+
+import json
+import sys
+from typing import Any, List
+
+from config import WORKSPACE_DIR
+
+sys.path.insert(0, str(WORKSPACE_DIR / "scripts"))
+
+try:
+    from mcp.server.fastmcp import FastMCP
+except ImportError:
+    print("mcp package is not installed: pip install 'mcp<2'", file=sys.stderr)
+    sys.exit(1)
+
+import media_clients  # noqa: E402
+from script_output import file_record, item_details_record, item_record, torrent_record  # noqa: E402
+
+# Per-request timeout for service calls, seconds
+REQUEST_TIMEOUT = 15
+
+VALID_CATEGORIES = ["Movies", "TV Shows"]
+TORRENT_ACTIONS = {
+    "pause": "pause",
+    "resume": "resume",
+    "delete": "delete",
+    "delete-full": "delete",
+    "recheck": "recheck",
+    "reannounce": "reannounce",
+}
+
+mcp = FastMCP("media")
+
+
+def dump(data: Any) -> str:
+    """Serialize tool result as compact JSON."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def qbt_get(path: str, **params) -> Any:
+    """GET qBittorrent API endpoint and decode JSON."""
+    session = media_clients.qbt_session()
+    response = session.get(f"{session.base_url}/api/v2/{path}", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def qbt_post(path: str, **data) -> None:
+    """POST to qBittorrent API endpoint."""
+    session = media_clients.qbt_session()
+    response = session.post(f"{session.base_url}/api/v2/{path}", data=data, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    if response.text not in ("", "Ok."):
+        raise RuntimeError(response.text)
+
+
+def jellyfin_get(path: str, **params) -> Any:
+    """GET Jellyfin API endpoint and decode JSON."""
+    session = media_clients.jellyfin_session()
+    response = session.get(f"{session.base_url}/{path}", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+@mcp.tool()
+def torrents_list(filter: str = "all", query: str = "", limit: int = 50) -> str:
+    """List qBittorrent torrents.
+
+    filter: all, downloading, seeding, completed, paused, active, inactive, stalled, errored.
+    query: case-insensitive substring of torrent name. Returns {total, torrents[]}.
+    """
+    torrents = qbt_get("torrents/info", filter=filter)
+    if query:
+        query_lower = query.lower()
+        torrents = [t for t in torrents if query_lower in t.get("name", "").lower()]
+    return dump({"total": len(torrents), "torrents": [torrent_record(t) for t in torrents[:limit]]})
+
+
+@mcp.tool()
+def torrent_files(hash: str, limit: int = 500) -> str:
+    """List files of a torrent: {i, name, size, priority, progress}.
+
+    priority: 0 = skipped, 1 = normal, 6 = high, 7 = maximal. Empty list means metadata is not loaded yet.
+    """
+    files = qbt_get("torrents/files", hash=hash.lower())
+    return dump({
+        "total": len(files),
+        "files": [file_record(f, i) for i, f in enumerate(files[:limit])],
+    })
+
+
+@mcp.tool()
+def torrent_add(magnet: str, category: str, name: str = "", wait: int = 0) -> str:
+    """Add magnet link to qBittorrent and start downloading. category: Movies or TV Shows.
+
+    wait: seconds to wait for metadata, then files are returned too (null if it didn't arrive in time).
+    """
+    if category not in VALID_CATEGORIES:
+        raise ValueError(f"category must be one of: {', '.join(VALID_CATEGORIES)}")
+    if not magnet.startswith("magnet:"):
+        raise ValueError("not a magnet link")
+
+    data = {"urls": magnet, "category": category, "paused": "false"}
+    if name:
+        data["rename"] = name
+    tag = media_clients.notify_tag()
+    if tag:
+        data["tags"] = tag
+    qbt_post("torrents/add", **data)
+    torrent_hash = media_clients.magnet_hash(magnet)
+    if not wait or not torrent_hash:
+        return dump({"ok": True, "hash": torrent_hash})
+
+    ready = media_clients.wait_for_metadata(media_clients.qbt_session(), [torrent_hash], wait)
+    files = ready[torrent_hash][1] if torrent_hash in ready else None
+    return dump({
+        "ok": True,
+        "hash": torrent_hash,
+        "files": [file_record(f, i) for i, f in enumerate(files)] if files else None,
+    })
+
+
+@mcp.tool()
+def torrent_control(action: str, hashes: List[str]) -> str:
+    """Control torrents. action: pause, resume, delete (keep files), delete-full (with files), recheck, reannounce."""
+    if action not in TORRENT_ACTIONS:
+        raise ValueError(f"action must be one of: {', '.join(TORRENT_ACTIONS)}")
+
+    data = {"hashes": "|".join(h.lower() for h in hashes)}
+    if TORRENT_ACTIONS[action] == "delete":
+        data["deleteFiles"] = "true" if action == "delete-full" else "false"
+    qbt_post(f"torrents/{TORRENT_ACTIONS[action]}", **data)
+    return dump({"ok": True, "action": action, "count": len(hashes)})
+
+
+@mcp.tool()
+def torrent_set_priority(hash: str, file_ids: str, priority: int) -> str:
+    """Set priority of torrent files. file_ids: "0,1,2", "5-10" or "0,3,5-8". priority: 0 skip, 1 normal, 6 high, 7 max."""
+    if priority not in (0, 1, 6, 7):
+        raise ValueError("priority must be 0, 1, 6 or 7")
+
+    ids = media_clients.parse_file_ids(file_ids)
+    qbt_post("torrents/filePrio", hash=hash.lower(), id="|".join(map(str, ids)), priority=priority)
+    return dump({"ok": True, "files": len(ids), "priority": priority})
+
+
+@mcp.tool()
+def media_search(query: str, limit: int = 20) -> str:
+    """Search movies and series in Jellyfin by title: {id, name, year, type, size, path}."""
+    result = jellyfin_get(
+        "Items",
+        searchTerm=query,
+        IncludeItemTypes="Movie,Series",
+        Recursive="true",
+        Fields="Path,MediaSources",
+        Limit=limit,
+        EnableImages="false",
+        EnableUserData="false",
+    )
+    return dump({
+        "total": result.get("TotalRecordCount", 0),
+        "items": [item_record(item) for item in result.get("Items", [])],
+    })
+
+
+@mcp.tool()
+def media_info(item_id: str) -> str:
+    """Detailed Jellyfin item info: quality, codecs, audio tracks, subtitles, duration, path."""
+    result = jellyfin_get(
+        "Items",
+        Ids=item_id,
+        Fields="Path,MediaSources,MediaStreams,Overview",
+        EnableImages="false",
+        EnableUserData="false",
+    )
+    items = result.get("Items", [])
+    if not items:
+        raise ValueError(f"item {item_id} not found")
+
+    return dump(item_details_record(items[0]))
+
+
+@mcp.tool()
+def media_play(item_id: str, device: str = "AppleTV") -> str:
+    """Start playing Jellyfin item on a device with an active Jellyfin session (default AppleTV)."""
+    sessions = jellyfin_get("Sessions")
+    target = next((s for s in sessions if s.get("DeviceName") == device), None)
+    if not target:
+        devices = sorted({s.get("DeviceName", "?") for s in sessions})
+        raise ValueError(f"no active session on {device}, available: {', '.join(devices) or 'none'}")
+
+    session = media_clients.jellyfin_session()
+    response = session.post(
+        f"{session.base_url}/Sessions/{target['Id']}/Playing",
+        params={"itemIds": item_id, "playCommand": "PlayNow"},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return dump({"ok": True, "device": device})
+
+
+@mcp.tool()
+def library_refresh(library: str) -> str:
+    """Rescan Jellyfin library by name (e.g. Фильмы, Сериалы)."""
+    libraries = jellyfin_get("Library/VirtualFolders")
+    target = next((lib for lib in libraries if lib["Name"].lower() == library.lower()), None)
+    if not target:
+        raise ValueError(f"library not found, available: {', '.join(lib['Name'] for lib in libraries)}")
+
+    session = media_clients.jellyfin_session()
+    response = session.post(
+        f"{session.base_url}/Library/Refresh",
+        params={"id": target["ItemId"]},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return dump({"ok": True, "library": target["Name"]})
+
+
+@mcp.tool()
+def library_refresh_paths(paths: List[str]) -> str:
+    """Rescan only the given download paths (qBittorrent save/content path) in Jellyfin, much faster than library_refresh."""
+    session = media_clients.jellyfin_session()
+    updates = [{"Path": session.media_path(path), "UpdateType": "Modified"} for path in paths]
+    response = session.post(
+        f"{session.base_url}/Library/Media/Updated",
+        json={"Updates": updates},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return dump({"ok": True, "paths": [update["Path"] for update in updates]})
+
+
+if __name__ == "__main__":
+    mcp.run()
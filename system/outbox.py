@@ -0,0 +1,324 @@
+"""Durable outbox for messages sent to Telegram.
+
+Every message extracted from a Claude turn is first written to an SQLite
+outbox (OUTBOX_FILE) and only then sent, so a crash or a Telegram outage
+doesn't lose the result of a turn. Messages of one chat are delivered in
+order; failed sends are retried with backoff by a background sender.
+Whatever the previous bot process left pending is drained at start,
+before reattached turns queue new messages behind it.
+
+Idempotency keys make enqueueing the same message twice (a turn replayed
+from its spool after a restart) a no-op. Text longer than a Telegram
+message is queued as several rows. A row may name preview messages (text
+streamed while Claude was writing it) that are deleted once it is sent.
+File rows carry a batch of workspace files (system/uploads.py) instead of
+text and are ordered together with the chat's messages.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config import (
+    OUTBOX_FILE,
+    OUTBOX_KEEP_SENT,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+    SESSIONS_DIR,
+)
+from streaming import TELEGRAM_MESSAGE_LIMIT, split_point
+from uploads import send_files
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    chat_id INTEGER NOT NULL,
+    thread_id INTEGER,
+    text TEXT NOT NULL,
+    markdown INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created REAL NOT NULL,
+    sent_message_id INTEGER,
+    error TEXT,
+    preview TEXT,
+    files TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, chat_id, id);
+"""
+
+
+class Undeliverable(Exception):
+    """Row can never be sent (its files are gone)."""
+
+
+class Outbox:
+    """SQLite-backed queue of Telegram messages with a retrying sender."""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(OUTBOX_FILE, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        # Outbox created before preview messages and files were queued
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(outbox)")}
+        for column in ("preview", "files"):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE outbox ADD COLUMN {column} TEXT")
+        self.wakeup = asyncio.Event()
+        # Row IDs being sent right now (inline send and sender loop share rows)
+        self.in_flight: Set[int] = set()
+
+    def insert(
+        self,
+        idempotency_key: str,
+        chat_id: int,
+        thread_id: Optional[int],
+        text: str,
+        markdown: bool,
+        preview: Optional[str] = None,
+        files: Optional[str] = None
+    ) -> Optional[int]:
+        """Persist one row, returns its ID or None if the key was already queued."""
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO outbox "
+            "(idempotency_key, chat_id, thread_id, text, markdown, next_attempt, created, preview, files) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (idempotency_key, chat_id, thread_id, text, int(markdown), 0, time.time(), preview, files)
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def enqueue(
+        self,
+        chat_id: int,
+        thread_id: Optional[int],
+        text: str,
+        idempotency_key: Optional[str] = None,
+        markdown: bool = True,
+        preview: Sequence[int] = ()
+    ) -> List[int]:
+        """
+        Persist message split into parts that fit Telegram.
+        Returns IDs of the new rows, empty if the key was already queued.
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        parts = []
+        while len(text) > TELEGRAM_MESSAGE_LIMIT:
+            cut = split_point(text, TELEGRAM_MESSAGE_LIMIT)
+            parts.append(text[:cut])
+            text = text[cut:]
+        parts.append(text)
+
+        row_ids = []
+        for number, part in enumerate(parts):
+            # Previews go away with the last part, when the whole text is in the chat
+            last = number == len(parts) - 1
+            row_id = self.insert(
+                f"{key}:{number}" if number else key, chat_id, thread_id, part, markdown,
+                preview=",".join(map(str, preview)) if last and preview else None
+            )
+            if row_id is not None:
+                row_ids.append(row_id)
+        return row_ids
+
+    async def send(
+        self,
+        chat_id: int,
+        thread_id: Optional[int],
+        text: str,
+        idempotency_key: Optional[str] = None,
+        markdown: bool = True,
+        preview: Sequence[int] = ()
+    ) -> None:
+        """
+        Persist message and try to send it right away.
+        If earlier messages of the chat are still pending, it waits for the
+        sender loop behind them to keep order.
+        """
+        row_ids = self.enqueue(chat_id, thread_id, text, idempotency_key, markdown, preview)
+        if not row_ids:
+            logger.info(f"Outbox: {idempotency_key} already queued, skipping")
+            return
+        await self.send_queued(chat_id, row_ids)
+
+    async def send_files(
+        self,
+        chat_id: int,
+        thread_id: Optional[int],
+        files: Sequence[Path],
+        idempotency_key: Optional[str] = None
+    ) -> None:
+        """Persist a batch of files (one message or media group) and try to send it right away."""
+        row_id = self.insert(
+            idempotency_key or uuid.uuid4().hex, chat_id, thread_id,
+            ", ".join(path.name for path in files), markdown=False,
+            files=json.dumps([str(path) for path in files], ensure_ascii=False)
+        )
+        if row_id is None:
+            logger.info(f"Outbox: {idempotency_key} already queued, skipping")
+            return
+        await self.send_queued(chat_id, [row_id])
+
+    async def send_queued(self, chat_id: int, row_ids: List[int]) -> None:
+        """Deliver just queued rows inline while each is first in its chat, the rest is left to the loop."""
+        for row_id in row_ids:
+            first = self.db.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND chat_id = ? ORDER BY id LIMIT 1", (chat_id,)
+            ).fetchone()
+            if first is None or first["id"] != row_id or not await self.deliver(first):
+                break
+        self.wakeup.set()
+
+    async def deliver(self, row: sqlite3.Row) -> bool:
+        """Send one queued message, returns True if it left the queue (sent or given up)."""
+        if row["id"] in self.in_flight:
+            return False
+        self.in_flight.add(row["id"])
+
+        try:
+            message = await self.send_message(row)
+        except TelegramRetryAfter as e:
+            # Flood control: wait as asked, doesn't count as a failed attempt
+            self.reschedule(row, row["attempts"], time.time() + e.retry_after, str(e))
+            return False
+        except (TelegramBadRequest, TelegramForbiddenError, Undeliverable) as e:
+            # Message rejected even as plain text, bot blocked or files gone: retrying won't help
+            self.give_up(row, str(e))
+            return True
+        except Exception as e:
+            attempts = row["attempts"] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                self.give_up(row, f"{type(e).__name__}: {e}")
+                return True
+            delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+            logger.warning(f"Outbox: message {row['id']} failed ({type(e).__name__}: {e}), retry in {delay} s")
+            self.reschedule(row, attempts, time.time() + delay, f"{type(e).__name__}: {e}")
+            return False
+        finally:
+            self.in_flight.discard(row["id"])
+
+        self.db.execute(
+            "UPDATE outbox SET status = 'sent', sent_message_id = ?, attempts = attempts + 1 WHERE id = ?",
+            (message.message_id, row["id"])
+        )
+        logger.info(f"Outbox: message {row['id']} sent (msg_id={message.message_id})")
+        await self.delete_preview(row)
+        # Messages queued behind it in the chat can go now
+        self.wakeup.set()
+        return True
+
+    async def delete_preview(self, row: sqlite3.Row) -> None:
+        """Delete streamed preview messages the sent row replaces."""
+        if not row["preview"]:
+            return
+        for message_id in row["preview"].split(","):
+            try:
+                await self.bot.delete_message(row["chat_id"], int(message_id))
+            except Exception as e:
+                logger.warning(f"Outbox: preview {message_id} not deleted: {type(e).__name__}: {e}")
+
+    async def send_message(self, row: sqlite3.Row) -> Any:
+        """Send files or text with Markdown, falling back to plain text if Telegram can't parse it."""
+        if row["files"]:
+            files = [Path(name) for name in json.loads(row["files"])]
+            missing = [path.name for path in files if not path.is_file()]
+            if missing:
+                raise Undeliverable(f"files removed: {', '.join(missing)}")
+            return await send_files(self.bot, row["chat_id"], row["thread_id"], files)
+
+        if row["markdown"]:
+            try:
+                return await self.bot.send_message(
+                    row["chat_id"],
+                    row["text"],
+                    parse_mode=ParseMode.MARKDOWN,
+                    message_thread_id=row["thread_id"]
+                )
+            except TelegramBadRequest as e:
+                logger.error(f"Outbox: failed to send message {row['id']} with markdown: {e}")
+
+        return await self.bot.send_message(row["chat_id"], row["text"], message_thread_id=row["thread_id"])
+
+    def reschedule(self, row: sqlite3.Row, attempts: int, next_attempt: float, error: str) -> None:
+        """Keep message pending until next_attempt."""
+        self.db.execute(
+            "UPDATE outbox SET attempts = ?, next_attempt = ?, error = ? WHERE id = ?",
+            (attempts, next_attempt, error, row["id"])
+        )
+        # Sender loop picks up the new due time
+        self.wakeup.set()
+
+    def give_up(self, row: sqlite3.Row, error: str) -> None:
+        """Mark message failed, later messages of the chat are no longer held back."""
+        logger.error(f"Outbox: giving up on message {row['id']} to chat {row['chat_id']}: {error}")
+        logger.error(f"Outbox: first 500 chars: {row['text'][:500]}")
+        self.db.execute("UPDATE outbox SET status = 'failed', error = ? WHERE id = ?", (error, row["id"]))
+        self.wakeup.set()
+
+    async def deliver_due(self) -> Tuple[bool, Optional[float]]:
+        """
+        Try the first pending message of every chat that is due.
+        Returns whether any left the queue and when the next one is due.
+        """
+        now = time.time()
+        heads = self.db.execute(
+            "SELECT * FROM outbox WHERE id IN "
+            "(SELECT MIN(id) FROM outbox WHERE status = 'pending' GROUP BY chat_id) "
+            "ORDER BY id"
+        ).fetchall()
+
+        progress = False
+        next_due = None
+        for row in heads:
+            if row["next_attempt"] > now:
+                next_due = min(next_due or row["next_attempt"], row["next_attempt"])
+                continue
+            try:
+                progress |= await self.deliver(row)
+            except Exception as e:
+                logger.error(f"Outbox: sender error: {type(e).__name__}: {e}")
+        return progress, next_due
+
+    async def drain(self) -> None:
+        """
+        Deliver everything due left by the previous bot process, before reattached
+        turns add to it. Messages waiting for a retry stay for the sender loop.
+        """
+        while (await self.deliver_due())[0]:
+            pass
+
+    async def run(self) -> None:
+        """Sender loop: deliver due messages (first pending one per chat), prune old sent ones."""
+        while True:
+            self.wakeup.clear()
+            progress, next_due = await self.deliver_due()
+
+            self.db.execute(
+                "DELETE FROM outbox WHERE status != 'pending' AND created < ?", (time.time() - OUTBOX_KEEP_SENT,)
+            )
+
+            if progress:
+                # Next message of the same chats may be due now
+                continue
+
+            timeout = max(0.0, next_due - time.time()) if next_due else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
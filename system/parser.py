@@ -1,7 +1,7 @@
 """JSON parser module for Claude Code stream output."""
 
 import json
-from typing import Dict, Any, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 
 def parse_line(line: str) -> Optional[Dict[str, Any]]:
@@ -19,6 +19,127 @@ def parse_line(line: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+# Preview budgets for tool events shown in Telegram
+TOOL_INPUT_PREVIEW_CHARS = 300
+TOOL_RESULT_PREVIEW_LINES = 5
+TOOL_RESULT_PREVIEW_CHARS = 1000
+# Strings longer than this are cut and summarised inside tool input preview
+FIELD_PREVIEW_CHARS = 80
+
+# Claude Code tools that create or change files
+FILE_WRITE_TOOLS = {"Write", "Edit", "MultiEdit", "NotebookEdit"}
+
+
+def format_size(size: int) -> str:
+    """Human-readable size of a text (characters counted as bytes)."""
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def summarize_text(text: str) -> str:
+    """Short description of a long text: size and line count."""
+    lines = text.count("\n") + 1
+    return f"{format_size(len(text))}, {lines:,} строк"
+
+
+def iter_json_preview(value: Any, indent: int = 0) -> Iterator[str]:
+    """
+    Yield indented JSON of value piece by piece.
+    Long strings are cut to FIELD_PREVIEW_CHARS and summarised, so the caller
+    can stop consuming as soon as its budget is spent.
+    """
+    pad = "  " * (indent + 1)
+
+    if isinstance(value, dict):
+        if not value:
+            yield "{}"
+            return
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield f"\n{pad}{json.dumps(str(key), ensure_ascii=False)}: "
+            yield from iter_json_preview(item, indent + 1)
+            if i < len(value) - 1:
+                yield ","
+        yield "\n" + "  " * indent + "}"
+
+    elif isinstance(value, list):
+        if not value:
+            yield "[]"
+            return
+        yield "["
+        for i, item in enumerate(value):
+            yield "\n" + pad
+            yield from iter_json_preview(item, indent + 1)
+            if i < len(value) - 1:
+                yield ","
+        yield "\n" + "  " * indent + "]"
+
+    elif isinstance(value, str) and len(value) > FIELD_PREVIEW_CHARS:
+        head = json.dumps(value[:FIELD_PREVIEW_CHARS], ensure_ascii=False)[:-1]
+        yield f"{head}…\" ({summarize_text(value)})"
+
+    else:
+        try:
+            yield json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            yield json.dumps(str(value)[:FIELD_PREVIEW_CHARS], ensure_ascii=False)
+
+
+def bounded_json(value: Any, limit: int) -> str:
+    """JSON preview of value no longer than limit characters."""
+    parts = []
+    size = 0
+
+    for piece in iter_json_preview(value):
+        if size + len(piece) > limit - 3:
+            parts.append(piece[:max(limit - 3 - size, 0)] + "...")
+            break
+        parts.append(piece)
+        size += len(piece)
+
+    return "".join(parts)
+
+
+def text_head(text: str, max_lines: int, max_chars: int) -> Tuple[str, bool]:
+    """
+    First max_lines lines of text (at most max_chars characters) without
+    splitting the whole text. Returns (head, truncated).
+    """
+    pos = 0
+    for _ in range(max_lines):
+        pos = text.find("\n", pos, max_chars)
+        if pos == -1:
+            break
+        pos += 1
+    else:
+        # Text ends right after the last allowed line
+        return text[:pos - 1], pos < len(text)
+
+    if len(text) <= max_chars:
+        return text, False
+    return text[:max_chars], True
+
+
+def result_text(content: Any) -> Optional[str]:
+    """Text of tool result content: string or list of {"type": "text"} blocks."""
+    if isinstance(content, str):
+        return content
+
+    if isinstance(content, list):
+        texts = [
+            block.get("text", "")
+            for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        ]
+        if len(texts) == len(content):
+            return "\n".join(texts)
+
+    return None
+
+
 def format_tool_use(tool_use: Dict[str, Any]) -> str:
     """
     Format tool_use object for Telegram.
@@ -27,13 +148,7 @@ def format_tool_use(tool_use: Dict[str, Any]) -> str:
     name = tool_use.get("name", "Unknown")
     input_data = tool_use.get("input", {})
 
-    # Convert input to JSON string and truncate
-    try:
-        input_str = json.dumps(input_data, ensure_ascii=False, indent=2)
-        if len(input_str) > 300:
-            input_str = input_str[:297] + "..."
-    except:
-        input_str = str(input_data)[:300]
+    input_str = bounded_json(input_data, TOOL_INPUT_PREVIEW_CHARS)
 
     return f"🔧 {name}\n```json\n{input_str}\n```"
 
@@ -44,28 +159,97 @@ def format_tool_result(result: Dict[str, Any]) -> str:
     Returns formatted string with limited content.
     """
     # Extract result content
-    content = ""
-
     if isinstance(result, dict):
         # Try to extract content from different possible structures
         if "content" in result:
-            content = str(result["content"])
+            raw = result["content"]
         elif "output" in result:
-            content = str(result["output"])
+            raw = result["output"]
         else:
-            content = json.dumps(result, ensure_ascii=False, indent=2)
+            raw = result
     else:
-        content = str(result)
+        raw = result
 
-    # Split into lines and take first 5
-    lines = content.split("\n")
-    if len(lines) > 5:
-        preview = "\n".join(lines[:5])
-        return f"📥 Результат:\n```\n{preview}\n...\n```"
+    content = result_text(raw)
+    if content is None:
+        preview = bounded_json(raw, TOOL_RESULT_PREVIEW_CHARS)
+        return f"📥 Результат:\n```\n{preview}\n```"
+
+    # Take first lines only, long output gets a size summary
+    preview, truncated = text_head(content, TOOL_RESULT_PREVIEW_LINES, TOOL_RESULT_PREVIEW_CHARS)
+    if truncated:
+        return f"📥 Результат ({summarize_text(content)}):\n```\n{preview}\n...\n```"
     else:
         return f"📥 Результат:\n```\n{content}\n```"
 
 
+def extract_text_delta(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract text delta from partial message event (--include-partial-messages).
+    Only main agent text is streamed, subagents are shown by complete messages.
+    """
+    if data.get("type") != "stream_event" or data.get("parent_tool_use_id"):
+        return None
+
+    event = data.get("event", {})
+    if event.get("type") != "content_block_delta":
+        return None
+
+    delta = event.get("delta", {})
+    if delta.get("type") == "text_delta":
+        return delta.get("text") or None
+
+    return None
+
+
+def extract_tool_names(data: Dict[str, Any]) -> List[str]:
+    """Names of tools called in a complete assistant message."""
+    if data.get("type") != "assistant":
+        return []
+
+    content = data.get("message", {}).get("content", [])
+    return [
+        item.get("name", "Unknown")
+        for item in content
+        if isinstance(item, dict) and item.get("type") == "tool_use"
+    ]
+
+
+def extract_written_files(data: Dict[str, Any]) -> List[str]:
+    """Paths of files written or edited by tool calls in a complete assistant message."""
+    if data.get("type") != "assistant":
+        return []
+
+    paths = []
+    for item in data.get("message", {}).get("content", []):
+        if not isinstance(item, dict) or item.get("type") != "tool_use" or item.get("name") not in FILE_WRITE_TOOLS:
+            continue
+        tool_input = item.get("input", {})
+        path = tool_input.get("file_path") or tool_input.get("notebook_path")
+        if path:
+            paths.append(path)
+    return paths
+
+
+def extract_context_tokens(data: Dict[str, Any]) -> Optional[int]:
+    """
+    Context size of the main agent's API call from assistant message usage:
+    uncached, cache-write and cache-read input tokens.
+    """
+    if data.get("type") != "assistant" or data.get("parent_tool_use_id"):
+        return None
+
+    usage = data.get("message", {}).get("usage")
+    if not usage:
+        return None
+
+    return (
+        (usage.get("input_tokens") or 0)
+        + (usage.get("cache_creation_input_tokens") or 0)
+        + (usage.get("cache_read_input_tokens") or 0)
+    )
+
+
 def extract_message_content(data: Dict[str, Any]) -> Optional[str]:
     """
     Extract message content from Claude response.
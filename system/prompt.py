@@ -0,0 +1,102 @@
+"""System prompt generation for tg2claude bot.
+
+Static context (base PROMPT.md, workspace layout, user profile) goes into
+a per-user system prompt file instead of every message, so the prompt
+prefix stays the same between turns and the user message carries only
+the user's text.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from config import PROMPT_FILE, PROMPTS_DIR, WORKSPACE_DIR
+
+# Directories listed without their contents
+COLLAPSED_DIRS = {"inbox", "output"}
+
+
+def generate_file_tree(directory: str, prefix: str = "", max_depth: int = 5, current_depth: int = 0) -> str:
+    """Generate compact file tree for workspace."""
+    if current_depth >= max_depth:
+        return ""
+
+    lines = []
+    try:
+        items = sorted(os.listdir(directory))
+        # Filter out hidden files and common ignored items
+        items = [item for item in items if not item.startswith('.') and item not in ['__pycache__', 'node_modules', 'venv']]
+
+        # User files change every turn and would invalidate the cached prompt prefix
+        if os.path.basename(directory) in COLLAPSED_DIRS:
+            return f"{prefix}└── ..." if items else ""
+
+        for i, item in enumerate(items):
+            path = os.path.join(directory, item)
+            is_last = i == len(items) - 1
+            current_prefix = "└── " if is_last else "├── "
+
+            if os.path.isdir(path):
+                lines.append(f"{prefix}{current_prefix}{item}/")
+                extension = "    " if is_last else "│   "
+                subtree = generate_file_tree(path, prefix + extension, max_depth, current_depth + 1)
+                if subtree:
+                    lines.append(subtree)
+            else:
+                lines.append(f"{prefix}{current_prefix}{item}")
+    except PermissionError:
+        pass
+
+    return "\n".join(lines)
+
+
+def build_system_prompt(user_id: int, username: Optional[str], full_name: str, language_code: Optional[str]) -> str:
+    """
+    Build system prompt: base prompt first (never changes), then workspace
+    layout (changes when files are added), then user profile.
+    """
+    base_prompt = PROMPT_FILE.read_text(encoding="utf-8").rstrip()
+
+    # Get absolute working directory path
+    workspace_path = os.path.abspath(WORKSPACE_DIR)
+    file_tree = generate_file_tree(workspace_path)
+
+    return f"""{base_prompt}
+
+## Рабочая директория
+
+{workspace_path}
+
+Структура файлов:
+{file_tree}
+
+## Пользователь
+
+- ID: {user_id}
+- Username: @{username if username else 'none'}
+- Имя: {full_name}
+- Язык: {language_code if language_code else 'unknown'}
+"""
+
+
+def write_system_prompt(user_id: int, username: Optional[str], full_name: str, language_code: Optional[str]) -> Path:
+    """
+    Write user's system prompt file and return its path.
+    File is rewritten only when content changed, atomically: a turn of the
+    same user starting in another chat never reads it half-written.
+    """
+    prompt = build_system_prompt(user_id, username, full_name, language_code)
+    prompt_file = PROMPTS_DIR / f"{user_id}.md"
+
+    try:
+        if prompt_file.read_text(encoding="utf-8") == prompt:
+            return prompt_file
+    except (FileNotFoundError, IOError):
+        pass
+
+    PROMPTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = prompt_file.with_suffix(".tmp")
+    tmp_path.write_text(prompt, encoding="utf-8")
+    os.replace(tmp_path, prompt_file)
+
+    return prompt_file
@@ -0,0 +1,111 @@
+"""Per-turn model routing for tg2claude bot.
+
+Short commands like "включи свет" go to a fast model, everything else to
+the default one. Users can pin a model with /model. Latency and cost of
+finished turns are aggregated per model in MODEL_STATS_FILE.
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from config import CLAUDE_MODEL, CLAUDE_FAST_MODEL, CLAUDE_MODELS, MODEL_STATS_FILE, SESSIONS_DIR
+
+# Model choice stored in session when routing is automatic
+AUTO = "auto"
+
+# Longer messages always go to the default model
+SIMPLE_MAX_LENGTH = 80
+
+# Short imperative requests to devices and players
+SIMPLE_RE = re.compile(
+    r"\b(включи|выключи|открой|закрой|убавь|прибавь|сделай|поставь|останови|продолжи|запусти|"
+    r"пауза|паузу|громче|тише|свет|лампу|люстру|шторы|штору|телевизор|appletv|apple tv)\w*",
+    re.IGNORECASE
+)
+
+# Requests that need search, planning or writing code
+COMPLEX_RE = re.compile(
+    r"\b(скача|найди|найти|ищи|поищи|посоветуй|подскажи|почему|зачем|объясни|сравни|напиши|"
+    r"создай|скрипт|код|исправь|настрой|сериал|фильм|торрент|magnet)\w*|4k|4к|1080|\?",
+    re.IGNORECASE
+)
+
+
+def classify(text: str) -> Tuple[str, str]:
+    """Pick model by message text: (model, reason)."""
+    text = text.strip()
+
+    if len(text) > SIMPLE_MAX_LENGTH:
+        return CLAUDE_MODEL, "long"
+    if COMPLEX_RE.search(text):
+        return CLAUDE_MODEL, "complex"
+    if SIMPLE_RE.search(text):
+        return CLAUDE_FAST_MODEL, "simple"
+
+    return CLAUDE_MODEL, "default"
+
+
+def choose_model(text: str, session: Dict[str, Any]) -> Tuple[str, str]:
+    """Model for this turn: user's /model override or classification."""
+    override = session.get("model", AUTO)
+    if override in CLAUDE_MODELS:
+        return override, "override"
+
+    return classify(text)
+
+
+def load_stats() -> Dict[str, Dict[str, Any]]:
+    """Aggregated turn stats per model."""
+    try:
+        with open(MODEL_STATS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return {}
+
+
+def record_turn(model: str, reason: str, duration_ms: Optional[int], cost_usd: Optional[float]) -> None:
+    """Add finished turn to per-model stats."""
+    stats = load_stats()
+    entry = stats.setdefault(model, {"turns": 0, "duration_ms": 0, "cost_usd": 0.0, "reasons": {}})
+
+    entry["turns"] += 1
+    entry["duration_ms"] += duration_ms or 0
+    entry["cost_usd"] = round(entry["cost_usd"] + (cost_usd or 0), 6)
+    entry["reasons"][reason] = entry["reasons"].get(reason, 0) + 1
+
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(MODEL_STATS_FILE, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+
+
+def record_resources(model: str, usage: Dict[str, Any]) -> None:
+    """Add CPU time and peak memory of a finished Claude process to per-model stats."""
+    stats = load_stats()
+    entry = stats.setdefault(model, {"turns": 0, "duration_ms": 0, "cost_usd": 0.0, "reasons": {}})
+
+    entry["processes"] = entry.get("processes", 0) + 1
+    entry["cpu_s"] = round(entry.get("cpu_s", 0.0) + usage["cpu_user_s"] + usage["cpu_system_s"], 2)
+    if usage.get("max_rss_mb") is not None:
+        entry["max_rss_mb"] = max(entry.get("max_rss_mb", 0.0), usage["max_rss_mb"])
+
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(MODEL_STATS_FILE, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+
+
+def format_stats() -> str:
+    """Average latency and cost per model for /model."""
+    lines = []
+    for model, entry in sorted(load_stats().items()):
+        turns = entry["turns"] or 1
+        line = (
+            f"{model}: {entry['turns']} запросов, "
+            f"в среднем {entry['duration_ms'] / turns / 1000:.1f} с и ${entry['cost_usd'] / turns:.4f}"
+        )
+        if entry.get("processes"):
+            line += f", CPU {entry['cpu_s'] / entry['processes']:.1f} с"
+        if entry.get("max_rss_mb"):
+            line += f", пик памяти {entry['max_rss_mb']:.0f} МБ"
+        lines.append(line)
+    return "\n".join(lines)
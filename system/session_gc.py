@@ -0,0 +1,264 @@
+"""Garbage collection of stale Claude session transcripts.
+
+Claude Code keeps every session transcript in
+~/.claude/projects/<workspace path>/<session_id>.jsonl (plus a
+<session_id>/ directory with subagent transcripts). /start and session
+rotation only forget the ID in sessions/, so dead transcripts pile up.
+
+Only transcripts of sessions the bot itself ran (sessions/history.json)
+are collected: the same project dir also holds sessions started by hand
+with `claude` in the workspace, and those are left alone unless
+--include-unknown is given. Transcripts of sessions currently referenced
+from sessions/*.json are never touched. Others are archived (tar.gz in sessions/archive/) when
+older than GC_RETENTION_DAYS, then oldest first while the total exceeds
+GC_SIZE_BUDGET_MB. Archives older than GC_ARCHIVE_DAYS are deleted.
+
+Usage:
+    python system/session_gc.py --dry-run
+    python system/session_gc.py [--retention-days N] [--budget-mb N] [--delete] [--include-unknown]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import shutil
+import sys
+import tarfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from config import (
+    CLAUDE_PROJECTS_DIR,
+    GC_ARCHIVE_DAYS,
+    GC_ARCHIVE_DIR,
+    GC_INTERVAL,
+    GC_MIN_AGE_HOURS,
+    GC_RETENTION_DAYS,
+    GC_SIZE_BUDGET_MB,
+    SESSIONS_DIR,
+    WORKSPACE_DIR,
+)
+from sessions import load_session_history
+from turnlog import prune_turn_logs, writer as turn_log_writer
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+class Transcript(NamedTuple):
+    """Claude session transcript on disk."""
+    session_id: str
+    path: Path
+    subagents_dir: Optional[Path]
+    size: int
+    mtime: float
+
+
+def project_dir(workspace: Path = WORKSPACE_DIR) -> Path:
+    """Claude Code transcripts directory for workspace (non-alphanumerics become "-")."""
+    return CLAUDE_PROJECTS_DIR / re.sub(r"[^a-zA-Z0-9]", "-", str(workspace.resolve()))
+
+
+def dir_size(path: Path) -> int:
+    """Total size of files in directory."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def list_transcripts(directory: Path) -> List[Transcript]:
+    """Transcripts in directory with subagent dirs counted into their size."""
+    transcripts = []
+    for path in directory.glob("*.jsonl"):
+        try:
+            stat = path.stat()
+            subagents_dir = path.with_suffix("")
+            if subagents_dir.is_dir():
+                size = stat.st_size + dir_size(subagents_dir)
+            else:
+                subagents_dir = None
+                size = stat.st_size
+        except OSError:
+            continue
+        transcripts.append(Transcript(path.stem, path, subagents_dir, size, stat.st_mtime))
+
+    return transcripts
+
+
+def active_session_ids() -> Set[str]:
+    """Session IDs referenced from sessions/*.json: resumed on the next message."""
+    active = set()
+    for session_file in SESSIONS_DIR.glob("*.json"):
+        try:
+            with open(session_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            continue
+        if isinstance(data, dict) and data.get("claude_session_id"):
+            active.add(data["claude_session_id"])
+    return active
+
+
+def plan_gc(
+    transcripts: List[Transcript],
+    active: Set[str],
+    known: Optional[Set[str]],
+    retention_days: float,
+    budget_bytes: int,
+    now: float
+) -> List[Dict[str, Any]]:
+    """
+    Transcripts to remove with reasons: expired first, then oldest over budget.
+    Only sessions in known are considered (None - all of them), and only they count into the budget.
+    """
+    managed = [t for t in transcripts if known is None or t.session_id in known]
+    candidates = sorted(
+        (t for t in managed if t.session_id not in active and now - t.mtime > GC_MIN_AGE_HOURS * 3600),
+        key=lambda t: t.mtime
+    )
+
+    plan = []
+    kept_size = sum(t.size for t in managed)
+    for transcript in candidates:
+        if now - transcript.mtime > retention_days * DAY:
+            reason = "expired"
+        elif kept_size > budget_bytes:
+            reason = "over budget"
+        else:
+            continue
+        plan.append({"transcript": transcript, "reason": reason})
+        kept_size -= transcript.size
+
+    return plan
+
+
+def archive_transcript(transcript: Transcript, archive_dir: Path) -> None:
+    """Pack transcript and its subagent dir into archive_dir/<id>.tar.gz and remove them."""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive = archive_dir / f"{transcript.session_id}.tar.gz"
+
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(transcript.path, arcname=transcript.path.name)
+        if transcript.subagents_dir:
+            tar.add(transcript.subagents_dir, arcname=transcript.subagents_dir.name)
+
+    remove_transcript(transcript)
+
+
+def remove_transcript(transcript: Transcript) -> None:
+    """Delete transcript and its subagent dir."""
+    transcript.path.unlink(missing_ok=True)
+    if transcript.subagents_dir:
+        shutil.rmtree(transcript.subagents_dir, ignore_errors=True)
+
+
+def prune_archives(archive_dir: Path, max_age_days: float, now: float, dry_run: bool) -> List[Path]:
+    """Delete archives older than max_age_days."""
+    expired = [
+        path for path in archive_dir.glob("*.tar.gz")
+        if now - path.stat().st_mtime > max_age_days * DAY
+    ]
+    if not dry_run:
+        for path in expired:
+            path.unlink(missing_ok=True)
+    return expired
+
+
+def format_size(size: float) -> str:
+    """Human-readable size."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def run_gc(
+    dry_run: bool = False,
+    retention_days: float = GC_RETENTION_DAYS,
+    budget_mb: float = GC_SIZE_BUDGET_MB,
+    delete: bool = False,
+    include_unknown: bool = False
+) -> str:
+    """Collect stale transcripts and return a report."""
+    now = time.time()
+    transcripts = list_transcripts(project_dir())
+    active = active_session_ids()
+    history = load_session_history()
+    known = None if include_unknown else set(history)
+    unknown = 0 if include_unknown else sum(1 for t in transcripts if t.session_id not in history)
+
+    plan = plan_gc(transcripts, active, known, retention_days, int(budget_mb * 1024 * 1024), now)
+
+    action = "delete" if delete else "archive"
+    lines = []
+    freed = 0
+    for item in plan:
+        transcript = item["transcript"]
+        user_id = history.get(transcript.session_id, {}).get("user_id", "?")
+        age_days = (now - transcript.mtime) / DAY
+        lines.append(
+            f"{action} {transcript.session_id} user={user_id} age={age_days:.0f}d "
+            f"size={format_size(transcript.size)} ({item['reason']})"
+        )
+
+        if not dry_run:
+            try:
+                if delete:
+                    remove_transcript(transcript)
+                else:
+                    archive_transcript(transcript, GC_ARCHIVE_DIR)
+            except OSError as e:
+                lines[-1] += f" FAILED: {e}"
+                continue
+        freed += transcript.size
+
+    expired_archives = prune_archives(GC_ARCHIVE_DIR, GC_ARCHIVE_DAYS, now, dry_run) if GC_ARCHIVE_DIR.exists() else []
+    lines.extend(f"delete archive {path.name}" for path in expired_archives)
+
+    # Raw stream logs have their own retention, applied here for idle conversations too.
+    # In the turn log writer thread, so an index is not rewritten while a turn appends to it
+    pruned = turn_log_writer.submit(prune_turn_logs, dry_run).result()
+    lines.extend(f"delete turn log {path.parent.name}/{path.name}" for path in pruned)
+
+    total = sum(t.size for t in transcripts)
+    prefix = "[dry run] " if dry_run else ""
+    lines.append(
+        f"{prefix}{len(transcripts)} transcripts ({format_size(total)}), {len(active)} active, "
+        f"{len(plan)} to {action} ({format_size(freed)}), {len(expired_archives)} old archives, "
+        f"{len(pruned)} turn log segments"
+        + (f", {unknown} not started by the bot (skipped)" if unknown else "")
+    )
+    return "\n".join(lines)
+
+
+async def gc_loop() -> None:
+    """Run GC every GC_INTERVAL in a worker thread."""
+    while True:
+        try:
+            report = await asyncio.to_thread(run_gc)
+            logger.info(f"Session GC:\n{report}")
+        except Exception as e:
+            logger.error(f"Session GC failed: {type(e).__name__}: {e}")
+        await asyncio.sleep(GC_INTERVAL)
+
+
+def main():
+    """Command line entry point."""
+    arg_parser = argparse.ArgumentParser(description="Archive stale Claude session transcripts")
+    arg_parser.add_argument("--dry-run", action="store_true", help="only report what would be done")
+    arg_parser.add_argument("--retention-days", type=float, default=GC_RETENTION_DAYS)
+    arg_parser.add_argument("--budget-mb", type=float, default=GC_SIZE_BUDGET_MB)
+    arg_parser.add_argument("--delete", action="store_true", help="delete instead of archiving")
+    arg_parser.add_argument("--include-unknown", action="store_true",
+                            help="also collect transcripts of sessions the bot never ran")
+    args = arg_parser.parse_args()
+
+    print(run_gc(args.dry_run, args.retention_days, args.budget_mb, args.delete, args.include_unknown))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
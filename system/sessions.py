@@ -1,23 +1,38 @@
 """Session management module for tg2claude bot."""
 
 import json
+import time
 from pathlib import Path
-from typing import Dict, Any
-from config import SESSIONS_DIR
+from typing import Dict, Any, Optional, Set, Tuple
+from config import SESSIONS_DIR, SESSION_HISTORY_FILE
 
+# Conversation: (user_id, chat_id, forum topic id or None)
+SessionKey = Tuple[int, int, Optional[int]]
 
-def get_session_file(user_id: int) -> Path:
-    """Get session file path for user."""
-    return SESSIONS_DIR / f"{user_id}.json"
+
+def get_session_file(key: SessionKey) -> Path:
+    """
+    Get session file path for conversation.
+    Private chat with the bot keeps the plain <user_id>.json name.
+    """
+    user_id, chat_id, thread_id = key
+
+    if chat_id == user_id and thread_id is None:
+        return SESSIONS_DIR / f"{user_id}.json"
+
+    name = f"{user_id}_{chat_id}"
+    if thread_id is not None:
+        name += f"_{thread_id}"
+    return SESSIONS_DIR / f"{name}.json"
 
 
-def get_session(user_id: int) -> Dict[str, Any]:
+def get_session(key: SessionKey) -> Dict[str, Any]:
     """
-    Get session data for user.
+    Get session data for conversation.
     Returns dict with claude_session_id and locked.
     If file doesn't exist, returns empty dict with locked=False.
     """
-    session_file = get_session_file(user_id)
+    session_file = get_session_file(key)
 
     if not session_file.exists():
         return {"locked": False}
@@ -33,9 +48,9 @@ def get_session(user_id: int) -> Dict[str, Any]:
         return {"locked": False}
 
 
-def save_session(user_id: int, data: Dict[str, Any]) -> None:
-    """Save session data for user."""
-    session_file = get_session_file(user_id)
+def save_session(key: SessionKey, data: Dict[str, Any]) -> None:
+    """Save session data for conversation."""
+    session_file = get_session_file(key)
 
     # Ensure sessions directory exists
     SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
@@ -44,9 +59,52 @@ def save_session(user_id: int, data: Dict[str, Any]) -> None:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
 
-def delete_session(user_id: int) -> None:
-    """Delete session file for user."""
-    session_file = get_session_file(user_id)
+def delete_session(key: SessionKey) -> None:
+    """Delete session file for conversation."""
+    session_file = get_session_file(key)
 
     if session_file.exists():
-        session_file.unlink()
\ No newline at end of file
+        session_file.unlink()
+
+
+def unlock_sessions(keep: Set[SessionKey]) -> None:
+    """Clear locks left by a killed bot process, except conversations in keep."""
+    keep_files = {get_session_file(key) for key in keep}
+
+    for session_file in SESSIONS_DIR.glob("*.json"):
+        if session_file in keep_files:
+            continue
+        try:
+            with open(session_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            continue
+        if isinstance(data, dict) and data.get("locked"):
+            data["locked"] = False
+            with open(session_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def load_session_history() -> Dict[str, Dict[str, Any]]:
+    """
+    Get all Claude session IDs ever used by the bot.
+    Returns dict session_id -> {user_id, first_used, last_used}.
+    """
+    try:
+        with open(SESSION_HISTORY_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return {}
+
+
+def record_session_use(user_id: int, session_id: str) -> None:
+    """Remember that user's turn ran in Claude session (for transcript GC)."""
+    history = load_session_history()
+    now = int(time.time())
+
+    entry = history.setdefault(session_id, {"user_id": user_id, "first_used": now})
+    entry["last_used"] = now
+
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(SESSION_HISTORY_FILE, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
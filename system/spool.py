@@ -0,0 +1,109 @@
+"""Spool directories of Claude runs that outlive the bot process.
+
+Claude writes its stream to sessions/turns/<id>/stdout.jsonl instead of a
+pipe and runs in its own session, so a bot restart doesn't kill it. The
+bot follows the file and records in meta.json how far the output has
+been delivered; after a restart it reattaches to the spools left behind
+and continues from that offset.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import TURNS_DIR
+
+# Environment variable marking Claude processes with their spool ID
+TURN_ENV = "TG2CLAUDE_TURN"
+# Chat of the turn, "<chat_id>" or "<chat_id>:<thread_id>": scripts tag added torrents
+# with it so the bot can report their progress (system/torrent_watch.py)
+CHAT_ENV = "TG2CLAUDE_CHAT"
+
+
+def chat_env(chat_id: int, thread_id: Optional[int]) -> Dict[str, str]:
+    """Environment marking processes started for a chat (or forum topic)."""
+    return {CHAT_ENV: f"{chat_id}:{thread_id}" if thread_id else str(chat_id)}
+
+
+class TurnSpool:
+    """Spool directory of one Claude run."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.id = path.name
+        self.stdout_path = path / "stdout.jsonl"
+        self.stderr_path = path / "stderr.log"
+        self.meta_path = path / "meta.json"
+        self.meta = self.load_meta()
+        # Offset in stdout.jsonl after the last line read
+        self.position = self.meta.get("delivered", 0)
+        # Claude process when started by this bot process
+        self.process: Optional[subprocess.Popen] = None
+
+    def load_meta(self) -> Dict[str, Any]:
+        """Read meta.json, empty dict if missing or broken."""
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, IOError):
+            return {}
+
+    def update(self, **fields: Any) -> None:
+        """Merge fields into meta.json (written atomically)."""
+        self.meta.update(fields)
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def mark_delivered(self) -> None:
+        """Everything read so far reached the user or the outbox, don't replay it after a restart."""
+        if self.meta.get("delivered") != self.position:
+            self.update(delivered=self.position)
+
+    def is_running(self) -> bool:
+        """Claude process of this spool is still alive."""
+        if self.process:
+            # Also reaps the child once it exited
+            return self.process.poll() is None
+        pid = self.meta.get("pid")
+        return bool(pid) and pid_alive(pid, self.id)
+
+    def remove(self) -> None:
+        """Delete spool directory."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def create_spool(**meta: Any) -> TurnSpool:
+    """New spool directory with initial meta."""
+    path = TURNS_DIR / f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    path.mkdir(parents=True)
+    spool = TurnSpool(path)
+    spool.update(created=time.time(), delivered=0, **meta)
+    return spool
+
+
+def list_spools() -> List[TurnSpool]:
+    """Spools left in TURNS_DIR, oldest first."""
+    if not TURNS_DIR.exists():
+        return []
+    return [TurnSpool(path) for path in sorted(TURNS_DIR.iterdir()) if path.is_dir()]
+
+
+def pid_alive(pid: int, spool_id: str) -> bool:
+    """
+    Process is alive and is the Claude run of the spool.
+    Checks the environment marker, so a reused PID is not mistaken for it
+    (a zombie has empty environ and counts as finished).
+    """
+    try:
+        with open(f"/proc/{pid}/environ", "rb") as f:
+            environ = f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return False
+    return f"{TURN_ENV}={spool_id}".encode() in environ.split(b"\0")
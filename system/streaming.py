@@ -0,0 +1,250 @@
+"""Live Telegram messages updated while a Claude turn runs."""
+
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+from aiogram import Bot, types
+from aiogram.enums import ChatAction, ParseMode
+
+from config import STREAM_EDIT_INTERVAL, STATUS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Telegram message length limit
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_point(text: str, limit: int) -> int:
+    """Where to cut text that doesn't fit into one message: last newline in the second half, else limit."""
+    cut = text.rfind("\n", limit // 2, limit)
+    return cut + 1 if cut != -1 else limit
+
+
+class LiveMessage:
+    """
+    Preview of a text block streamed into Telegram while Claude is still writing it.
+
+    Deltas are accumulated and shown with at most one edit per
+    STREAM_EDIT_INTERVAL: the first delta is sent right away, later ones
+    are batched. Text is shown plain (partial markdown is usually broken).
+    The complete text is sent by the outbox, which deletes the preview
+    messages returned by close() once it is delivered. finish() keeps the
+    preview as the answer when no complete message follows (error, abort).
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, thread_id: Optional[int] = None, interval: float = STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.text = ""          # Whole streamed block
+        self.offset = 0         # Start of the part shown in current message
+        self.message: Optional[types.Message] = None
+        self.message_ids: List[int] = []  # All messages of the block
+        # Called with message_ids when a preview message is sent (to persist them)
+        self.on_preview: Optional[Callable[[List[int]], None]] = None
+        self.shown = ""         # What current message displays now
+        self.last_edit = 0.0
+
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_waiting = False
+        self.lock = asyncio.Lock()
+
+    @property
+    def active(self) -> bool:
+        """Some text of the current block was received."""
+        return bool(self.text)
+
+    def append(self, delta: str) -> None:
+        """Add text delta and schedule a throttled update."""
+        self.text += delta
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def close(self) -> List[int]:
+        """Stop updating the preview and reset for the next block. Returns IDs of its messages."""
+        await self._stop_flush()
+        message_ids = self.message_ids
+        self._reset()
+        return message_ids
+
+    async def finish(self) -> None:
+        """Show the whole block with markdown as the final answer and reset for the next one."""
+        await self._stop_flush()
+        if self.text:
+            await self._flush(final=True)
+        self._reset()
+
+    async def _stop_flush(self) -> None:
+        """Cancel a pending update, wait for one already sending."""
+        if self.flush_task and not self.flush_task.done():
+            if self.flush_waiting:
+                self.flush_task.cancel()
+            else:
+                await self.flush_task
+        self.flush_task = None
+
+    def _reset(self) -> None:
+        self.text = ""
+        self.offset = 0
+        self.message = None
+        self.message_ids = []
+        self.shown = ""
+
+    async def _delayed_flush(self) -> None:
+        """Wait until the next edit is allowed and show accumulated text."""
+        delay = self.last_edit + self.interval - time.monotonic()
+        if delay > 0:
+            self.flush_waiting = True
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.flush_waiting = False
+        await self._flush()
+
+    async def _flush(self, final: bool = False) -> None:
+        """Show text since offset, moving to a new message when it doesn't fit."""
+        async with self.lock:
+            while len(self.text) - self.offset > TELEGRAM_MESSAGE_LIMIT:
+                cut = self.offset + split_point(self.text[self.offset:], TELEGRAM_MESSAGE_LIMIT)
+                await self._show(self.text[self.offset:cut], final=True)
+                self.offset = cut
+                self.message = None
+                self.shown = ""
+
+            await self._show(self.text[self.offset:], final)
+
+    async def _show(self, text: str, final: bool) -> None:
+        """Send or edit current message. Final text is tried with markdown first."""
+        if not text.strip() or (text == self.shown and not final):
+            return
+
+        self.last_edit = time.monotonic()
+        modes = [ParseMode.MARKDOWN, None] if final else [None]
+
+        for parse_mode in modes:
+            try:
+                if self.message is None:
+                    self.message = await self.bot.send_message(
+                        self.chat_id, text, parse_mode=parse_mode, message_thread_id=self.thread_id
+                    )
+                    self.message_ids.append(self.message.message_id)
+                    if self.on_preview:
+                        self.on_preview(self.message_ids)
+                elif text != self.shown or parse_mode:
+                    await self.bot.edit_message_text(
+                        text,
+                        chat_id=self.chat_id,
+                        message_id=self.message.message_id,
+                        parse_mode=parse_mode
+                    )
+                self.shown = text
+                return
+            except Exception as e:
+                # "message is not modified" after markdown rendering, rate limits etc.
+                logger.warning(f"Live message update failed ({parse_mode}): {type(e).__name__}: {e}")
+
+
+def format_elapsed(seconds: float) -> str:
+    """Elapsed time as m:ss."""
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+class TurnStatus:
+    """
+    Typing indicator and one editable status line for a running turn.
+
+    Stream events only change state (current tool, tool count); a single
+    background task refreshes the typing action and edits the status line
+    once per STATUS_INTERVAL, so the number of API calls depends on turn
+    duration only, not on how many events it produces.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        message: types.Message,
+        thread_id: Optional[int] = None,
+        interval: float = STATUS_INTERVAL
+    ):
+        self.bot = bot
+        self.message = message
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.started = time.monotonic()
+        self.activity = "🤖 Обрабатываю запрос..."
+        self.tool_count = 0
+        self.shown = message.text
+        self.task: Optional[asyncio.Task] = None
+        self.finished = False
+
+    def start(self) -> None:
+        """Start typing/status refresh loop."""
+        self.task = asyncio.create_task(self._loop())
+
+    def tool_started(self, name: str) -> None:
+        """Claude called a tool."""
+        self.tool_count += 1
+        self.activity = f"🔧 {name}"
+
+    def queued(self) -> None:
+        """Turn waits for a free slot (MAX_CONCURRENT_TURNS)."""
+        self.activity = "⏳ В очереди"
+
+    def running(self) -> None:
+        """Turn got a slot and Claude is starting."""
+        self.activity = "🤖 Обрабатываю запрос..."
+
+    def writing(self) -> None:
+        """Claude is writing text."""
+        self.activity = "✍️ Пишет ответ"
+
+    async def finish(self, ok: bool = True) -> None:
+        """Stop refresh loop and leave a final summary in the status line (once)."""
+        if self.finished:
+            return
+        self.finished = True
+
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        icon = "✅ Готово" if ok else "❌ Прервано"
+        await self._edit(f"{icon} за {format_elapsed(time.monotonic() - self.started)}{self._tools_suffix()}")
+
+    def render(self) -> str:
+        """Current status line."""
+        return f"{self.activity} · {format_elapsed(time.monotonic() - self.started)}{self._tools_suffix()}"
+
+    def _tools_suffix(self) -> str:
+        return f" · инструментов: {self.tool_count}" if self.tool_count else ""
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.bot.send_chat_action(
+                    self.message.chat.id, ChatAction.TYPING, message_thread_id=self.thread_id
+                )
+            except Exception as e:
+                logger.warning(f"Typing action failed: {type(e).__name__}: {e}")
+
+            await asyncio.sleep(self.interval)
+            await self._edit(self.render())
+
+    async def _edit(self, text: str) -> None:
+        if text == self.shown:
+            return
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.message.chat.id, message_id=self.message.message_id)
+            self.shown = text
+        except Exception as e:
+            logger.warning(f"Status update failed: {type(e).__name__}: {e}")
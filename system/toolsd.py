@@ -0,0 +1,294 @@
+"""Tool daemon keeping workspace script dependencies and service clients warm.
+
+Workspace scripts call toolsd_client.forward_to_daemon() before their heavy
+imports. When this daemon is running, the request is served by a forked child
+of an already warm process: `requests` is imported, scripts are compiled and
+qBittorrent/Jellyfin sessions are logged in. The script runs in a grandchild
+whose stdout and stderr go to pipes; the child forwards them over the Unix
+socket as separate frames (see toolsd_client.frame), followed by an exit
+code frame. Logins run in a forked login child that sends the session
+cookies back over a pipe, so an unreachable service never blocks the accept
+loop. The daemon itself stays single-threaded: a fork can't copy a lock held
+by another thread (requests/urllib3, logging) into a child.
+"""
+
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict, Optional, Tuple
+
+from config import WORKSPACE_DIR, TOOLSD_SOCKET, TOOLSD_REFRESH_INTERVAL
+
+SCRIPTS_DIR = WORKSPACE_DIR / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import media_clients  # noqa: E402
+import toolsd_client  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - toolsd - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Compiled scripts by file name: (mtime, code object)
+compiled_scripts: Dict[str, Tuple[float, object]] = {}
+
+# Pipe from the running login child and what it has sent so far
+refresh_pipe: Optional[int] = None
+refresh_data = b""
+
+
+def compile_scripts() -> None:
+    """Compile all Python scripts so children don't pay for it on each call."""
+    for path in SCRIPTS_DIR.glob("*.py"):
+        mtime = path.stat().st_mtime
+        cached = compiled_scripts.get(path.name)
+        if cached and cached[0] == mtime:
+            continue
+        try:
+            compiled_scripts[path.name] = (mtime, compile(path.read_bytes(), str(path), "exec"))
+        except SyntaxError as e:
+            logger.warning(f"Failed to compile {path.name}: {e}")
+
+
+def start_refresh() -> None:
+    """Fork a login child, its result is picked up by finish_refresh() from the accept loop."""
+    global refresh_pipe, refresh_data
+    if refresh_pipe is not None:
+        # Previous login still running (slow service)
+        return
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_fd)
+            state = media_clients.login_all()
+            os.write(write_fd, json.dumps(state).encode("utf-8"))
+            code = 0
+        except BaseException as e:
+            logger.warning(f"Failed to warm up clients: {type(e).__name__}: {e}")
+        finally:
+            os._exit(code)
+
+    os.close(write_fd)
+    refresh_pipe = read_fd
+    refresh_data = b""
+
+
+def finish_refresh() -> None:
+    """Read from the login child, on EOF switch children to the new sessions."""
+    global refresh_pipe, refresh_data
+    chunk = os.read(refresh_pipe, 65536)
+    if chunk:
+        refresh_data += chunk
+        return
+
+    os.close(refresh_pipe)
+    refresh_pipe = None
+    if not refresh_data:
+        # Login failed, the child logged why; keep the previous sessions
+        return
+
+    try:
+        state = json.loads(refresh_data)
+        media_clients.use_state(state)
+    except Exception as e:
+        logger.warning(f"Failed to apply clients: {type(e).__name__}: {e}")
+        return
+    logger.info(f"Logged in to {', '.join(state) or 'no services'}")
+
+
+def get_script_code(name: str):
+    """Get compiled code for script, recompiling it if the file has changed."""
+    path = SCRIPTS_DIR / name
+    mtime = path.stat().st_mtime
+    cached = compiled_scripts.get(name)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    return compile(path.read_bytes(), str(path), "exec")
+
+
+def run_script(request: dict) -> int:
+    """Run requested script with stdout/stderr already redirected. Returns exit code."""
+    name = request.get("script", "")
+    argv = [str(arg) for arg in request.get("argv", [])]
+
+    if os.path.basename(name) != name or not name.endswith(".py") or not (SCRIPTS_DIR / name).is_file():
+        print(f"❌ Скрипт {name} не найден в {SCRIPTS_DIR}")
+        return 1
+
+    try:
+        os.chdir(request.get("cwd") or WORKSPACE_DIR)
+    except OSError:
+        os.chdir(WORKSPACE_DIR)
+
+    # Child only: environment of the calling process (chat of the turn)
+    env = request.get("env") or {}
+    for variable in toolsd_client.FORWARDED_ENV:
+        if variable in env:
+            os.environ[variable] = str(env[variable])
+        else:
+            os.environ.pop(variable, None)
+
+    path = str(SCRIPTS_DIR / name)
+    sys.argv = [path] + argv
+    code = 0
+
+    try:
+        exec(get_script_code(name), {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+
+    return code
+
+
+def run_request(conn: socket.socket) -> int:
+    """
+    Run requested script in a grandchild and forward its stdout and stderr to the
+    client as separate frames. Pipes also catch output of the script's own subprocesses.
+    Returns exit code.
+    """
+    with conn.makefile("rb") as reader:
+        request = json.loads(reader.readline())
+
+    out_read, out_write = os.pipe()
+    err_read, err_write = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            conn.close()
+            os.close(out_read)
+            os.close(err_read)
+            os.dup2(out_write, 1)
+            os.dup2(err_write, 2)
+            os.close(out_write)
+            os.close(err_write)
+            sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+            sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", buffering=1, closefd=False)
+            code = run_script(request)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except Exception:
+                pass
+            os._exit(code)
+
+    os.close(out_write)
+    os.close(err_write)
+    streams = {out_read: toolsd_client.STDOUT, err_read: toolsd_client.STDERR}
+    while streams:
+        readable, _, _ = select.select(list(streams), [], [])
+        for fd in readable:
+            data = os.read(fd, 65536)
+            if data:
+                conn.sendall(toolsd_client.frame(streams[fd], data))
+            else:
+                os.close(fd)
+                del streams[fd]
+
+    _, status = os.waitpid(pid, 0)
+    code = os.waitstatus_to_exitcode(status)
+    # Killed by a signal: shell convention
+    return 128 - code if code < 0 else code
+
+
+def handle_connection(server: socket.socket, conn: socket.socket) -> None:
+    """Fork a child serving a single script call."""
+    pid = os.fork()
+    if pid:
+        conn.close()
+        return
+
+    # Child process
+    code = 1
+    try:
+        server.close()
+        # Scripts may spawn and wait for their own subprocesses
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        code = run_request(conn)
+    except BaseException:
+        try:
+            traceback.print_exc()
+        except Exception:
+            pass
+    finally:
+        try:
+            conn.sendall(toolsd_client.frame(toolsd_client.EXIT, str(code).encode()))
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def serve() -> None:
+    """Accept script calls forever."""
+    toolsd_client.IN_DAEMON = True
+
+    # Reap finished children automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(TOOLSD_SOCKET):
+        os.unlink(TOOLSD_SOCKET)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(TOOLSD_SOCKET)
+    os.chmod(TOOLSD_SOCKET, 0o600)
+    server.listen(64)
+
+    compile_scripts()
+    start_refresh()
+    last_refresh = time.monotonic()
+    logger.info(f"Listening on {TOOLSD_SOCKET}")
+
+    try:
+        while True:
+            waiting = [server] + ([refresh_pipe] if refresh_pipe is not None else [])
+            try:
+                readable, _, _ = select.select(waiting, [], [], 60)
+            except InterruptedError:
+                continue
+
+            if refresh_pipe is not None and refresh_pipe in readable:
+                finish_refresh()
+
+            if server in readable:
+                conn, _ = server.accept()
+                handle_connection(server, conn)
+
+            if time.monotonic() - last_refresh > TOOLSD_REFRESH_INTERVAL:
+                compile_scripts()
+                start_refresh()
+                last_refresh = time.monotonic()
+    finally:
+        server.close()
+        if os.path.exists(TOOLSD_SOCKET):
+            os.unlink(TOOLSD_SOCKET)
+
+
+if __name__ == "__main__":
+    try:
+        serve()
+    except KeyboardInterrupt:
+        logger.info("Stopped by user")
@@ -0,0 +1,326 @@
+"""Progress and completion notifications for torrents added from chats.
+
+qbt-add-torrent.py and the MCP media server tag torrents added during a
+turn with the chat they came from (tg2claude:<chat_id>[:<thread_id>]).
+This background task keeps a copy of qBittorrent's torrent list through
+the incremental sync/maindata API and, for tagged torrents, keeps one
+progress message per torrent, edited at most every
+TORRENT_PROGRESS_INTERVAL, and sends "done" through the outbox when the
+download completes. The tag is removed after that, so asking Claude
+"ну что, скачалось?" is no longer needed.
+
+Completion of any torrent (tagged or not) also runs the on_complete
+hooks, e.g. refresh_jellyfin with JELLYFIN_AUTO_REFRESH.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiogram import Bot
+
+from config import (
+    JELLYFIN_REFRESH_CATEGORIES,
+    SESSIONS_DIR,
+    TORRENT_PROGRESS_INTERVAL,
+    TORRENT_WATCH_FILE,
+    TORRENT_WATCH_IDLE_INTERVAL,
+    TORRENT_WATCH_INTERVAL,
+    WORKSPACE_DIR,
+)
+from fastpath import run_script
+from outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Must match NOTIFY_TAG_PREFIX in workspace/scripts/media_clients.py
+NOTIFY_TAG_PREFIX = "tg2claude:"
+QBT_KEYS_FILE = WORKSPACE_DIR / "keys" / "qbittorrent.json"
+
+# qBittorrent reports this ETA when it can't estimate one
+ETA_UNKNOWN = 8640000
+REQUEST_TIMEOUT = 30
+
+
+# Called with hash and torrent when a download completes
+CompletionHook = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class QbtError(Exception):
+    """qBittorrent rejected login or a request."""
+
+
+def find_notify_tag(tags: str) -> Optional[str]:
+    """Notification tag among comma-separated torrent tags."""
+    for tag in tags.split(","):
+        tag = tag.strip()
+        if tag.startswith(NOTIFY_TAG_PREFIX):
+            return tag
+    return None
+
+
+def parse_notify_tag(tag: str) -> Optional[Tuple[int, Optional[int]]]:
+    """Chat and forum topic from a notification tag, None if it's malformed."""
+    chat_id, _, thread_id = tag[len(NOTIFY_TAG_PREFIX):].partition(":")
+    try:
+        return int(chat_id), int(thread_id) if thread_id else None
+    except ValueError:
+        return None
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable size."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_eta(seconds: int) -> str:
+    """Remaining time like 1 ч 05 мин."""
+    if seconds >= ETA_UNKNOWN or seconds < 0:
+        return "неизвестно"
+    hours, rest = divmod(seconds, 3600)
+    minutes = rest // 60
+    if hours:
+        return f"{hours} ч {minutes:02d} мин"
+    return f"{minutes} мин" if minutes else "меньше минуты"
+
+
+def is_complete(torrent: Dict[str, Any]) -> bool:
+    """All selected files are downloaded."""
+    return torrent.get("progress", 0) >= 1
+
+
+def progress_text(torrent: Dict[str, Any]) -> str:
+    """Progress message of a downloading torrent."""
+    name = torrent.get("name", "?")
+    if torrent.get("state") == "metaDL":
+        return f"⏳ {name}\nЗагрузка метаданных..."
+
+    progress = torrent.get("progress", 0)
+    size = torrent.get("size", 0)
+    line = f"{progress:.1%} из {format_bytes(size)}" if size else f"{progress:.1%}"
+    speed = torrent.get("dlspeed", 0)
+    if speed:
+        line += f", {format_bytes(speed)}/с, осталось {format_eta(torrent.get('eta', ETA_UNKNOWN))}"
+    elif torrent.get("state", "").startswith(("paused", "stopped")):
+        line += ", на паузе"
+    else:
+        line += ", ожидание пиров"
+    return f"⬇️ {name}\n{line}"
+
+
+def load_state() -> Dict[str, Dict[str, Any]]:
+    """Tracked torrents: hash -> chat, progress message and time of its last edit."""
+    try:
+        with open(TORRENT_WATCH_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return {}
+
+
+def save_state(state: Dict[str, Dict[str, Any]]) -> None:
+    """Write tracked torrents atomically."""
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TORRENT_WATCH_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, TORRENT_WATCH_FILE)
+
+
+async def refresh_jellyfin(torrent_hash: str, torrent: Dict[str, Any]) -> None:
+    """Rescan only the completed download in Jellyfin, not the whole library."""
+    if torrent.get("category") not in JELLYFIN_REFRESH_CATEGORIES:
+        return
+    path = torrent.get("content_path") or torrent.get("save_path")
+    if not path:
+        return
+    output = await run_script("jellyfin-refresh.py", ["--path", path])
+    logger.info(f"Torrent {torrent_hash}: Jellyfin refresh of {path}: {output}")
+
+
+class TorrentWatcher:
+    """Follows qBittorrent and reports tagged torrents to their chats."""
+
+    def __init__(self, bot: Bot, outbox: Outbox, on_complete: Optional[List[CompletionHook]] = None):
+        self.bot = bot
+        self.outbox = outbox
+        self.on_complete = on_complete or []
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.base_url = ""
+        # Response ID of the last sync, 0 asks for the full list
+        self.rid = 0
+        self.torrents: Dict[str, Dict[str, Any]] = {}
+        self.watched = load_state()
+
+    async def login(self) -> None:
+        """Open a session and log in with workspace/keys/qbittorrent.json."""
+        with open(QBT_KEYS_FILE, "r", encoding="utf-8") as f:
+            creds = json.load(f)
+        self.base_url = f"http://{creds['host']}:{creds['port']}"
+
+        # unsafe: qBittorrent is usually addressed by IP, default jar ignores cookies of IP hosts
+        self.session = aiohttp.ClientSession(
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+        async with self.session.post(
+            f"{self.base_url}/api/v2/auth/login",
+            data={"username": creds["username"], "password": creds["password"]}
+        ) as response:
+            text = await response.text()
+        if text != "Ok.":
+            raise QbtError(f"login failed: {text}")
+        self.rid = 0
+
+    async def close(self) -> None:
+        """Close the HTTP session, next sync logs in again."""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def sync(self) -> List[str]:
+        """Apply changes since the last sync to the torrent list, returns hashes of torrents completed since."""
+        async with self.session.get(f"{self.base_url}/api/v2/sync/maindata", params={"rid": self.rid}) as response:
+            if response.status != 200:
+                raise QbtError(f"sync/maindata: HTTP {response.status}")
+            data = await response.json(content_type=None)
+
+        previous = self.torrents
+        if data.get("full_update"):
+            self.torrents = {}
+
+        completed = []
+        for torrent_hash, changes in (data.get("torrents") or {}).items():
+            # Unknown before (first sync after start) doesn't count, nothing to compare with
+            before = previous.get(torrent_hash)
+            if before and not is_complete(before) and changes.get("progress", 0) >= 1:
+                completed.append(torrent_hash)
+            self.torrents.setdefault(torrent_hash, {}).update(changes)
+        for torrent_hash in data.get("torrents_removed") or []:
+            self.torrents.pop(torrent_hash, None)
+        self.rid = data.get("rid", 0)
+        return completed
+
+    async def run_hooks(self, completed: List[str]) -> None:
+        """Run completion hooks, a failing hook doesn't stop the others."""
+        for torrent_hash in completed:
+            for hook in self.on_complete:
+                try:
+                    await hook(torrent_hash, self.torrents[torrent_hash])
+                except Exception as e:
+                    logger.error(f"Torrent {torrent_hash}: hook {hook.__name__} failed: {type(e).__name__}: {e}")
+
+    async def remove_tag(self, torrent_hash: str, tag: str) -> None:
+        """Stop tracking the torrent in qBittorrent."""
+        async with self.session.post(
+            f"{self.base_url}/api/v2/torrents/removeTags", data={"hashes": torrent_hash, "tags": tag}
+        ) as response:
+            if response.status != 200:
+                raise QbtError(f"torrents/removeTags: HTTP {response.status}")
+
+    async def report(self, torrent_hash: str, torrent: Dict[str, Any], chat: Tuple[int, Optional[int]]) -> None:
+        """Send or update the progress message, at most every TORRENT_PROGRESS_INTERVAL."""
+        entry = self.watched.get(torrent_hash)
+        now = time.time()
+        if entry and now - entry["updated"] < TORRENT_PROGRESS_INTERVAL:
+            return
+
+        chat_id, thread_id = chat
+        text = progress_text(torrent)
+        if entry is None:
+            entry = self.watched[torrent_hash] = {"chat_id": chat_id, "thread_id": thread_id, "message_id": None}
+        entry.update(name=torrent.get("name"), updated=now)
+
+        try:
+            if entry["message_id"] and entry.get("text") != text:
+                await self.bot.edit_message_text(text, chat_id=chat_id, message_id=entry["message_id"])
+            elif not entry["message_id"]:
+                message = await self.bot.send_message(chat_id, text, message_thread_id=thread_id)
+                entry["message_id"] = message.message_id
+            entry["text"] = text
+        except Exception as e:
+            # Progress is best effort, the final message goes through the outbox
+            logger.warning(f"Torrent {torrent_hash}: failed to report progress to chat {chat_id}: {type(e).__name__}: {e}")
+
+    async def finish(self, torrent_hash: str, torrent: Dict[str, Any], chat: Tuple[int, Optional[int]]) -> None:
+        """Notify the chat that the download is complete, replacing the progress message."""
+        chat_id, thread_id = chat
+        name = torrent.get("name", "?")
+        logger.info(f"Torrent {torrent_hash} ({name}) completed, notifying chat {chat_id}")
+
+        # Key makes a repeated notification a no-op if removing the tag fails
+        await self.outbox.send(
+            chat_id, thread_id, f"✅ Скачано: {name} ({format_bytes(torrent.get('size', 0))})",
+            idempotency_key=f"torrent:{torrent_hash}:done", markdown=False
+        )
+
+        entry = self.watched.pop(torrent_hash, None)
+        if entry and entry["message_id"]:
+            try:
+                await self.bot.delete_message(chat_id, entry["message_id"])
+            except Exception as e:
+                logger.warning(f"Torrent {torrent_hash}: failed to delete progress message: {type(e).__name__}: {e}")
+
+    async def forget(self, torrent_hash: str) -> None:
+        """Torrent was deleted from qBittorrent or untagged: stop reporting it."""
+        entry = self.watched.pop(torrent_hash)
+        if torrent_hash in self.torrents or not entry["message_id"]:
+            return
+        try:
+            await self.bot.edit_message_text(
+                f"🗑 {entry.get('name') or torrent_hash}\nТоррент удалён из qBittorrent",
+                chat_id=entry["chat_id"], message_id=entry["message_id"]
+            )
+        except Exception as e:
+            logger.warning(f"Torrent {torrent_hash}: failed to update progress message: {type(e).__name__}: {e}")
+
+    async def notify(self) -> None:
+        """Report tagged torrents, stop tracking ones that are gone."""
+        for torrent_hash, torrent in list(self.torrents.items()):
+            tag = find_notify_tag(torrent.get("tags", ""))
+            chat = parse_notify_tag(tag) if tag else None
+            if not chat:
+                continue
+            if is_complete(torrent):
+                await self.finish(torrent_hash, torrent, chat)
+                await self.remove_tag(torrent_hash, tag)
+                torrent["tags"] = ""
+            else:
+                await self.report(torrent_hash, torrent, chat)
+
+        for torrent_hash in list(self.watched):
+            torrent = self.torrents.get(torrent_hash)
+            if torrent is None or not find_notify_tag(torrent.get("tags", "")):
+                await self.forget(torrent_hash)
+
+        save_state(self.watched)
+
+    async def run(self) -> None:
+        """Watcher loop, disabled if qBittorrent keys are missing."""
+        if not QBT_KEYS_FILE.exists():
+            logger.info(f"{QBT_KEYS_FILE} not found, torrent notifications disabled")
+            return
+
+        try:
+            while True:
+                try:
+                    if self.session is None:
+                        await self.login()
+                    completed = await self.sync()
+                    await self.run_hooks(completed)
+                    await self.notify()
+                except Exception as e:
+                    logger.warning(f"Torrent watcher: {type(e).__name__}: {e}")
+                    # Expired cookie or restarted qBittorrent: log in and take the full list again
+                    await self.close()
+
+                await asyncio.sleep(TORRENT_WATCH_INTERVAL if self.watched else TORRENT_WATCH_IDLE_INTERVAL)
+        finally:
+            await self.close()
@@ -0,0 +1,231 @@
+"""Compressed log of raw Claude stream-json per conversation.
+
+Every line Claude prints during a turn is stored with the time the bot
+received it, so slow turns can be analysed after the fact and replayed
+offline without a live CLI.
+
+Layout, per conversation (named like its session file):
+
+    sessions/turnlog/<conversation>/000001.jsonl.gz  - segments
+    sessions/turnlog/<conversation>/index.jsonl      - one entry per turn
+
+Each turn is a separate gzip member appended to the current segment, its
+index entry holds segment, byte offset and length, so a turn is read
+without decompressing the whole segment. Segments rotate at
+TURN_LOG_SEGMENT_MB and are deleted after TURN_LOG_RETENTION_DAYS.
+Compression and file writes run in a single background thread.
+
+Usage:
+    python system/turnlog.py <conversation>                 - turns with latencies
+    python system/turnlog.py <conversation> --dump <turn>   - raw events of a turn
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import TURN_LOG_DIR, TURN_LOG_RETENTION_DAYS, TURN_LOG_SEGMENT_MB
+from sessions import SessionKey, get_session_file
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.jsonl"
+
+# All writes go through one thread: keeps order and never blocks the event loop
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turnlog")
+
+
+class TurnLog:
+    """Writer of one turn's raw events."""
+
+    def __init__(self, key: SessionKey, turn_id: str, **meta: Any):
+        self.directory = TURN_LOG_DIR / get_session_file(key).stem
+        self.entry: Dict[str, Any] = {"turn": turn_id, "started": time.time(), "events": 0, **meta}
+        self.file = None
+        self.gz = None
+        writer.submit(self._guard, self._open)
+
+    def add(self, line: str) -> None:
+        """Queue raw stream line with its receive time."""
+        writer.submit(self._guard, self._write, time.time(), line)
+
+    def close(self, **meta: Any) -> None:
+        """Queue end of turn: finish the gzip member and add index entry."""
+        writer.submit(self._guard, self._close, time.time(), meta)
+
+    def _guard(self, func, *args) -> None:
+        # Logging must never break a turn
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Turn log {self.directory.name} failed: {type(e).__name__}: {e}")
+            self.gz = None
+
+    def _open(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segment = current_segment(self.directory)
+        self.file = open(segment, "ab")
+        self.entry["segment"] = segment.name
+        self.entry["offset"] = self.file.tell()
+        self.gz = gzip.GzipFile(fileobj=self.file, mode="wb")
+
+    def _write(self, ts: float, line: str) -> None:
+        if not self.gz:
+            return
+        # Valid JSON is embedded as is, anything else as a string
+        try:
+            json.loads(line)
+            event = line
+        except ValueError:
+            event = json.dumps(line, ensure_ascii=False)
+        self.gz.write(f'{{"ts": {ts:.3f}, "event": {event}}}\n'.encode("utf-8"))
+        self.entry["events"] += 1
+
+    def _close(self, ts: float, meta: Dict[str, Any]) -> None:
+        if not self.gz:
+            return
+        self.gz.close()
+        self.entry["length"] = self.file.tell() - self.entry["offset"]
+        self.file.close()
+        self.entry.update(finished=ts, **meta)
+
+        with open(self.directory / INDEX_NAME, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.entry, ensure_ascii=False) + "\n")
+
+
+def current_segment(directory: Path) -> Path:
+    """
+    Segment to append the next turn to.
+    A new one is started when the last is full or has bytes not covered by
+    the index (a turn cut off by a crash), old segments are pruned then.
+    """
+    segments = sorted(directory.glob("*.jsonl.gz"))
+    if segments:
+        last = segments[-1]
+        entries = [e for e in read_index(directory) if e.get("segment") == last.name]
+        indexed_end = max((e["offset"] + e["length"] for e in entries), default=0)
+        size = last.stat().st_size
+        if size == indexed_end and size < TURN_LOG_SEGMENT_MB * 1024 * 1024:
+            return last
+        number = int(last.name.split(".")[0]) + 1
+    else:
+        number = 1
+
+    prune_turn_log(directory, time.time())
+    return directory / f"{number:06d}.jsonl.gz"
+
+
+def read_index(directory: Path) -> List[Dict[str, Any]]:
+    """Index entries of a conversation, oldest first."""
+    try:
+        with open(directory / INDEX_NAME, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return []
+
+
+def read_turn(directory: Path, entry: Dict[str, Any]) -> Iterator[Tuple[float, Any]]:
+    """(receive time, event) pairs of an indexed turn."""
+    with open(directory / entry["segment"], "rb") as f:
+        f.seek(entry["offset"])
+        data = gzip.decompress(f.read(entry["length"]))
+
+    for line in data.decode("utf-8").splitlines():
+        record = json.loads(line)
+        yield record["ts"], record["event"]
+
+
+def prune_turn_log(directory: Path, now: float, dry_run: bool = False) -> List[Path]:
+    """Delete segments older than retention and their index entries."""
+    expired = [
+        path for path in directory.glob("*.jsonl.gz")
+        if now - path.stat().st_mtime > TURN_LOG_RETENTION_DAYS * 24 * 60 * 60
+    ]
+    if not expired or dry_run:
+        return expired
+
+    names = {path.name for path in expired}
+    kept = [e for e in read_index(directory) if e.get("segment") not in names]
+    for path in expired:
+        path.unlink(missing_ok=True)
+
+    index_path = directory / INDEX_NAME
+    tmp_path = index_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in kept)
+    tmp_path.replace(index_path)
+    return expired
+
+
+def prune_turn_logs(dry_run: bool = False) -> List[Path]:
+    """Apply retention to logs of all conversations (idle ones never rotate)."""
+    if not TURN_LOG_DIR.exists():
+        return []
+    now = time.time()
+    return [path for directory in TURN_LOG_DIR.iterdir() if directory.is_dir()
+            for path in prune_turn_log(directory, now, dry_run)]
+
+
+def turn_latencies(start: float, events: List[Tuple[float, Any]]) -> Dict[str, Optional[float]]:
+    """Seconds from turn start to the first event, first text delta, first tool call and result."""
+    marks: Dict[str, Optional[float]] = {
+        "first_event": events[0][0] - start if events else None,
+        "first_text": None,
+        "first_tool": None,
+        "result": None,
+    }
+    for ts, event in events:
+        if not isinstance(event, dict):
+            continue
+        if marks["first_text"] is None and event.get("type") == "stream_event" \
+                and event.get("event", {}).get("delta", {}).get("type") == "text_delta":
+            marks["first_text"] = ts - start
+        if marks["first_tool"] is None and event.get("type") == "assistant" and any(
+                block.get("type") == "tool_use" for block in event.get("message", {}).get("content", [])):
+            marks["first_tool"] = ts - start
+        if event.get("type") == "result":
+            marks["result"] = ts - start
+    return marks
+
+
+def format_seconds(value: Optional[float]) -> str:
+    """Seconds or dash."""
+    return f"{value:.1f}s" if value is not None else "-"
+
+
+def main():
+    """Command line entry point."""
+    arg_parser = argparse.ArgumentParser(description="Inspect raw Claude stream logs of a conversation")
+    arg_parser.add_argument("conversation", help="session file name without .json, e.g. 123456789")
+    arg_parser.add_argument("--dump", metavar="TURN", help="print raw events of a turn as JSON lines")
+    args = arg_parser.parse_args()
+
+    directory = TURN_LOG_DIR / args.conversation
+    entries = read_index(directory)
+
+    if args.dump:
+        for entry in (e for e in entries if e["turn"] == args.dump):
+            for ts, event in read_turn(directory, entry):
+                print(json.dumps({"ts": ts, "event": event}, ensure_ascii=False))
+        return 0
+
+    for entry in entries:
+        marks = turn_latencies(entry["started"], list(read_turn(directory, entry)))
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["started"]))
+        print(
+            f"{started} {entry['turn']} model={entry.get('model')} events={entry['events']} "
+            f"first={format_seconds(marks['first_event'])} text={format_seconds(marks.get('first_text'))} tool={format_seconds(marks.get('first_tool'))} "
+            f"result={format_seconds(marks.get('result'))}"
+            + (" resumed" if entry.get("resumed") else "")
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Upload of files produced by Claude back to the chat.
+
+After a turn the bot sends the files Claude created or changed for the
+user, so a report, image or subtitle file doesn't need a follow-up turn
+just to be fetched. Files come from two places:
+
+- Write/Edit tool calls of the turn, if the file is in the workspace
+  outside service directories (scripts/, knowledge/, keys/, inbox/)
+- output/<conversation>/, where Claude saves results of shell commands
+  (ffmpeg, downloads), anything modified since the turn started. The
+  directory is per conversation (named like its session file), so a file
+  made in one chat never goes to another chat of the same user.
+
+Images go as photos, the rest as documents, several files as media
+groups. Batches are delivered by the outbox (file rows), so an upload
+survives Telegram errors and isn't repeated when a turn is replayed.
+Uploads are streamed from disk.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import FSInputFile, InputMediaDocument, InputMediaPhoto
+
+from config import (
+    OUTPUT_DIR,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_MAX_FILES,
+    UPLOAD_MAX_MB,
+    UPLOAD_PHOTO_MAX_MB,
+    WORKSPACE_DIR,
+)
+from sessions import SessionKey, get_session_file
+
+logger = logging.getLogger(__name__)
+
+# Top-level workspace directories whose files are never uploaded
+EXCLUDED_DIRS = {"scripts", "knowledge", "keys", "inbox"}
+
+# Sent with sendPhoto, everything else with sendDocument
+PHOTO_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Telegram media group size
+MEDIA_GROUP_LIMIT = 10
+
+
+def uploadable(path: Path) -> bool:
+    """File is in the workspace and not in a service directory."""
+    try:
+        relative = path.relative_to(WORKSPACE_DIR.resolve())
+    except ValueError:
+        return False
+    parts = relative.parts
+    return (
+        len(parts) > 0
+        and parts[0] not in EXCLUDED_DIRS
+        and not any(part.startswith(".") or part == "__pycache__" for part in parts)
+    )
+
+
+def output_dir(key: SessionKey) -> Path:
+    """Conversation's directory for files to send: output/<user_id> in a private chat."""
+    return OUTPUT_DIR / get_session_file(key).stem
+
+
+def collect_turn_files(key: SessionKey, written: Iterable[str], since: float) -> List[Path]:
+    """Files to upload after a turn of the conversation that started at since, oldest first."""
+    candidates = set()
+
+    for name in written:
+        path = Path(name)
+        if not path.is_absolute():
+            path = WORKSPACE_DIR / path
+        candidates.add(path.resolve())
+
+    directory = output_dir(key)
+    if directory.is_dir():
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            candidates.update(Path(root, f).resolve() for f in files if not f.startswith("."))
+
+    files = []
+    for path in candidates:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        # Edited before the turn (and not by it) or deleted again
+        if not path.is_file() or stat.st_mtime < since or not uploadable(path):
+            continue
+        files.append((stat.st_mtime, path))
+
+    return [path for _, path in sorted(files)][:UPLOAD_MAX_FILES]
+
+
+def is_photo(path: Path) -> bool:
+    """Send as photo: image small enough for sendPhoto."""
+    return path.suffix.lower() in PHOTO_SUFFIXES and path.stat().st_size <= UPLOAD_PHOTO_MAX_MB * 1024 * 1024
+
+
+def plan_uploads(files: List[Path]) -> Tuple[List[List[Path]], List[Path]]:
+    """Split files into batches for one send each (photos, then documents) and files too large to send."""
+    photos, documents, too_large = [], [], []
+    for path in files:
+        if path.stat().st_size > UPLOAD_MAX_MB * 1024 * 1024:
+            too_large.append(path)
+        elif is_photo(path):
+            photos.append(path)
+        else:
+            documents.append(path)
+
+    batches = [
+        group[start:start + MEDIA_GROUP_LIMIT]
+        for group in (photos, documents)
+        for start in range(0, len(group), MEDIA_GROUP_LIMIT)
+    ]
+    return batches, too_large
+
+
+def too_large_note(files: List[Path]) -> str:
+    """Message about files that can't be sent."""
+    names = "\n".join(str(path.relative_to(WORKSPACE_DIR.resolve())) for path in files)
+    return f"📦 Файлы больше {UPLOAD_MAX_MB} MB, отправить не получится:\n{names}"
+
+
+async def send_files(bot: Bot, chat_id: int, thread_id: Optional[int], batch: List[Path]) -> Any:
+    """Send one batch from plan_uploads: single file or media group. Returns the (first) message."""
+    inputs = [FSInputFile(path, filename=path.name, chunk_size=UPLOAD_CHUNK_SIZE) for path in batch]
+    photo = is_photo(batch[0])
+
+    if len(batch) == 1:
+        single = bot.send_photo if photo else bot.send_document
+        message = await single(chat_id, inputs[0], message_thread_id=thread_id)
+    else:
+        media_type = InputMediaPhoto if photo else InputMediaDocument
+        messages = await bot.send_media_group(
+            chat_id, [media_type(media=item) for item in inputs], message_thread_id=thread_id
+        )
+        message = messages[0]
+
+    logger.info(f"Uploaded {', '.join(path.name for path in batch)} to chat {chat_id}")
+    return message
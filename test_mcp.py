@@ -9,13 +9,15 @@ from pathlib import Path
 # Add system directory to path
 sys.path.insert(0, str(Path(__file__).parent / "system"))
 
-from config import WORKSPACE_DIR, CLAUDE_BASE_CMD
+from config import WORKSPACE_DIR, CLAUDE_BASE_CMD, CLAUDE_MODEL, PROMPT_FILE
 
 
 async def run_claude_test():
     """Run Claude exactly as the bot does."""
     # Build command exactly like bot
     cmd = CLAUDE_BASE_CMD.copy()
+    cmd.extend(["--model", CLAUDE_MODEL])
+    cmd.extend(["--system-prompt-file", str(PROMPT_FILE)])
     cmd.extend(["-p", "у тебя есть mcp?"])
 
     print(f"Command: {' '.join(cmd)}")
@@ -5,36 +5,26 @@
 Примеры:
   python3 jellyfin-get-link.py Интерстеллар
   python3 jellyfin-get-link.py "Breaking Bad"
+  python3 jellyfin-get-link.py Интерстеллар --json   # машинный вывод (см. script_output.py)
 """
 
 import sys
-import json
-import requests
-import os
 
-def load_credentials():
-    """Загрузка учетных данных из keys/jellyfin.json"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    keys_file = os.path.join(os.path.dirname(script_dir), 'keys', 'jellyfin.json')
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+import requests
+from media_clients import get_jellyfin_session
+from script_output import init_output, is_human, emit, print_error, item_record
 
-def get_server_id(url, api_key):
+def get_server_id(session, url):
     """Получить ID сервера"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
-    response = requests.get(f'{url}/System/Info', headers=headers)
+    response = session.get(f'{url}/System/Info')
     response.raise_for_status()
     return response.json()['Id']
 
-def search_items(url, api_key, query):
+def search_items(session, url, query):
     """Поиск контента по названию"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
-
     params = {
         'searchTerm': query,
         'IncludeItemTypes': 'Movie,Series',
@@ -42,12 +32,17 @@ def search_items(url, api_key, query):
         'Fields': 'Path,MediaSources'
     }
 
-    response = requests.get(f'{url}/Items', headers=headers, params=params)
+    response = session.get(f'{url}/Items', params=params)
     response.raise_for_status()
     return response.json()
 
 def main():
+    init_output()
+
     if len(sys.argv) < 2:
+        if not is_human():
+            print_error("Использование: jellyfin-get-link.py <название>")
+            sys.exit(1)
         print("❌ Ошибка: не указано название")
         print("\nИспользование: python3 jellyfin-get-link.py <название>")
         print("\nПримеры:")
@@ -59,16 +54,27 @@ def main():
 
     try:
         # Загрузить учетные данные
-        creds = load_credentials()
-        url = creds['url']
-        api_key = creds['api_key']
+        session, url = get_jellyfin_session()
 
         # Получить Server ID
-        server_id = get_server_id(url, api_key)
+        server_id = get_server_id(session, url)
 
         # Поиск
-        print(f"🔍 Поиск '{query}'...\n")
-        result = search_items(url, api_key, query)
+        if is_human():
+            print(f"🔍 Поиск '{query}'...\n")
+        result = search_items(session, url, query)
+
+        if not is_human():
+            items = []
+            for item in result['Items']:
+                record = item_record(item)
+                record['details'] = f"{url}/web/index.html#!/details?id={item['Id']}"
+                if item['Type'] == 'Movie':
+                    record['player'] = f"{url}/web/index.html#!/video?id={item['Id']}&serverId={server_id}"
+                    record['download'] = f"{url}/Items/{item['Id']}/Download?api_key={session.api_key}"
+                items.append(record)
+            emit({'query': query, 'items': items}, 'items', ['id', 'name', 'year', 'type', 'details', 'player', 'download', 'path'])
+            sys.exit(0)
 
         if result['TotalRecordCount'] == 0:
             print(f"❌ Ничего не найдено по запросу '{query}'")
@@ -92,7 +98,7 @@ def main():
                 player_link = f"{url}/web/index.html#!/video?id={item_id}&serverId={server_id}"
                 print(f"\n▶️  Открыть в плеере (сразу включит фильм):\n{player_link}")
 
-                stream_link = f"{url}/Items/{item_id}/Download?api_key={api_key}"
+                stream_link = f"{url}/Items/{item_id}/Download?api_key={session.api_key}"
                 print(f"\n⬇️  Прямая ссылка для скачивания:\n{stream_link}")
             else:
                 print(f"\n📺 Для сериалов используйте веб-интерфейс для выбора эпизода")
@@ -103,13 +109,13 @@ def main():
             print("\n" + "=" * 60 + "\n")
 
     except FileNotFoundError:
-        print("❌ Файл keys/jellyfin.json не найден")
+        print_error("Файл keys/jellyfin.json не найден")
         sys.exit(1)
     except requests.exceptions.RequestException as e:
-        print(f"❌ Ошибка подключения к Jellyfin: {e}")
+        print_error(f"Ошибка подключения к Jellyfin: {e}")
         sys.exit(1)
     except Exception as e:
-        print(f"❌ Ошибка: {e}")
+        print_error(f"Ошибка: {e}")
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -1,22 +1,24 @@
 #!/usr/bin/env python3
 """
 Скрипт для получения активной сессии Jellyfin на Apple TV
+Использование: python3 jellyfin-get-session.py [--json|--compact]
 """
 import sys
-import json
-import requests
 
-# Загружаем конфигурацию
-with open('keys/jellyfin.json', 'r') as f:
-    config = json.load(f)
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
+
+from media_clients import get_jellyfin_session
+from script_output import init_output, is_human, emit, print_error
 
-JELLYFIN_URL = config['url']
-API_KEY = config['api_key']
+# Загружаем конфигурацию
+jellyfin, JELLYFIN_URL = get_jellyfin_session()
+API_KEY = jellyfin.api_key
 
 def get_sessions():
     """Получает все активные сессии"""
     url = f"{JELLYFIN_URL}/Sessions?api_key={API_KEY}"
-    response = requests.get(url)
+    response = jellyfin.get(url)
     response.raise_for_status()
     return response.json()
 
@@ -33,7 +35,17 @@ def get_appletv_session():
 def main():
     session = get_appletv_session()
 
-    if session:
+    if session and not is_human():
+        emit({
+            'id': session['Id'],
+            'user': session.get('UserName'),
+            'client': session['Client'],
+            'version': session.get('ApplicationVersion'),
+            'active': session['IsActive'],
+            'media_control': session.get('SupportsMediaControl', False),
+        })
+
+    if session and is_human():
         print(f"✅ Найдена активная сессия Apple TV")
         print(f"ID сессии: {session['Id']}")
         print(f"Пользователь: {session.get('UserName', 'N/A')}")
@@ -42,11 +54,16 @@ def main():
         print(f"Активна: {session['IsActive']}")
         print(f"Поддержка управления медиа: {session.get('SupportsMediaControl', False)}")
 
+    if session:
         # Сохраняем ID сессии для использования в других скриптах
         with open('/tmp/jellyfin_session_id.txt', 'w') as f:
             f.write(session['Id'])
 
         return session['Id']
+    elif not is_human():
+        devices = [f"{s.get('DeviceName', 'Unknown')} ({s.get('Client', 'Unknown')})" for s in get_sessions()]
+        print_error(f"Активная сессия Apple TV не найдена, доступные: {', '.join(devices) or 'нет'}")
+        return None
     else:
         print("❌ Активная сессия Apple TV не найдена")
         print("\nВсе доступные сессии:")
@@ -56,4 +73,5 @@ def main():
         return None
 
 if __name__ == "__main__":
+    init_output()
     main()
@@ -1,46 +1,97 @@
 #!/usr/bin/env python3
 """
 Список всего контента в Jellyfin
-Использование: python3 jellyfin-list.py [фильмы|сериалы]
+Использование: python3 jellyfin-list.py [фильмы|сериалы] [опции]
+Опции:
+  --fields name,year,...  какие поля выводить (id, name, year, type, size, path, providers)
+  --limit N               вывести не больше N записей
+  --offset N              пропустить первые N записей
+  --page-size N           размер страницы запроса к Jellyfin (по умолчанию 100)
+  --json                  компактный вывод: JSON Lines (первая строка - {"total", "fields"})
+  --tsv, --compact        компактный вывод: TSV с заголовком
 Примеры:
   python3 jellyfin-list.py          # весь контент
   python3 jellyfin-list.py фильмы   # только фильмы
   python3 jellyfin-list.py сериалы  # только сериалы
+  python3 jellyfin-list.py фильмы --tsv --fields id,name,year --limit 50
 """
 
 import sys
 import json
+
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
+
 import requests
-import os
+from media_clients import get_jellyfin_session
+from script_output import init_output, print_error, COMPACT, JSON
 
-def load_credentials():
-    """Загрузка учетных данных из keys/jellyfin.json"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    keys_file = os.path.join(os.path.dirname(script_dir), 'keys', 'jellyfin.json')
+PAGE_SIZE = 100
 
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+# Поле вывода -> поле Jellyfin, которое нужно запросить (None - приходит всегда)
+FIELD_SOURCES = {
+    'id': None,
+    'name': None,
+    'year': None,
+    'type': None,
+    'size': 'MediaSources',
+    'path': 'Path',
+    'providers': 'ProviderIds',
+}
+DEFAULT_FIELDS = ['type', 'name', 'year', 'size']
 
-def get_items(url, api_key, item_type=None):
-    """Получить список контента"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
+def get_items(session, url, item_type=None, fields=None, start_index=0, limit=PAGE_SIZE, with_total=True):
+    """Получить одну страницу контента"""
+    jellyfin_fields = sorted({FIELD_SOURCES[f] for f in (fields or DEFAULT_FIELDS) if FIELD_SOURCES[f]})
 
     params = {
         'Recursive': 'true',
-        'Fields': 'Path,MediaSources,ProviderIds',
         'SortBy': 'SortName',
-        'SortOrder': 'Ascending'
+        'SortOrder': 'Ascending',
+        'StartIndex': start_index,
+        'Limit': limit,
+        'EnableImages': 'false',
+        'EnableUserData': 'false',
+        'EnableTotalRecordCount': 'true' if with_total else 'false',
     }
 
+    if jellyfin_fields:
+        params['Fields'] = ','.join(jellyfin_fields)
+
     if item_type:
         params['IncludeItemTypes'] = item_type
 
-    response = requests.get(f'{url}/Items', headers=headers, params=params)
+    response = session.get(f'{url}/Items', params=params)
     response.raise_for_status()
     return response.json()
 
+def iter_items(session, url, item_type=None, fields=None, offset=0, max_items=None, page_size=PAGE_SIZE):
+    """
+    Постранично обойти контент.
+    Первым значением отдаёт общее количество записей, дальше - записи по одной.
+    """
+    start_index = offset
+    fetched = 0
+    total = None
+
+    while max_items is None or fetched < max_items:
+        limit = page_size if max_items is None else min(page_size, max_items - fetched)
+        page = get_items(session, url, item_type, fields, start_index, limit, with_total=total is None)
+
+        if total is None:
+            total = page.get('TotalRecordCount', 0)
+            yield total
+
+        items = page.get('Items', [])
+        for item in items:
+            yield item
+
+        fetched += len(items)
+        start_index += len(items)
+
+        if len(items) < limit or start_index >= total:
+            break
+
 def format_size(bytes_size):
     """Форматирование размера в человекочитаемый вид"""
     if not bytes_size:
@@ -52,62 +103,174 @@ def format_size(bytes_size):
         bytes_size /= 1024.0
     return f"{bytes_size:.2f} ПБ"
 
-def main():
-    item_type = None
-    type_filter = ""
-
-    if len(sys.argv) > 1:
-        filter_arg = sys.argv[1].lower()
-        if filter_arg in ['фильмы', 'фильм', 'movie', 'movies']:
-            item_type = 'Movie'
-            type_filter = "Фильмы"
-        elif filter_arg in ['сериалы', 'сериал', 'series', 'tv']:
-            item_type = 'Series'
-            type_filter = "Сериалы"
+def project_item(item, fields):
+    """Оставить у записи только запрошенные поля"""
+    values = {
+        'id': lambda: item['Id'],
+        'name': lambda: item['Name'],
+        'year': lambda: item.get('ProductionYear'),
+        'type': lambda: item['Type'],
+        'size': lambda: sum(ms.get('Size', 0) or 0 for ms in item.get('MediaSources', [])) or None,
+        'path': lambda: item.get('Path'),
+        'providers': lambda: item.get('ProviderIds') or {},
+    }
+    return {field: values[field]() for field in fields}
+
+def format_human(row):
+    """Строка для человека: иконка, название, год, размер и остальные поля"""
+    parts = []
+    if 'type' in row:
+        parts.append("🎬" if row['type'] == 'Movie' else "📺")
+    if 'name' in row:
+        parts.append(row['name'])
+    if 'year' in row:
+        parts.append(f"({row['year'] or 'N/A'})")
+    line = ' '.join(parts)
+
+    extra = []
+    if 'size' in row:
+        extra.append(format_size(row['size']))
+    if 'id' in row:
+        extra.append(f"ID: {row['id']}")
+    if 'path' in row:
+        extra.append(row['path'] or 'N/A')
+    if 'providers' in row and row['providers']:
+        extra.append(', '.join(f"{k}={v}" for k, v in row['providers'].items()))
+
+    if extra:
+        line = f"{line} - {' | '.join(extra)}" if line else ' | '.join(extra)
+    return line
+
+def format_tsv(row, fields):
+    """Строка TSV"""
+    cells = []
+    for field in fields:
+        value = row[field]
+        if value is None:
+            value = ''
+        elif isinstance(value, dict):
+            value = ','.join(f"{k}={v}" for k, v in value.items())
+        cells.append(str(value).replace('\t', ' ').replace('\n', ' '))
+    return '\t'.join(cells)
+
+def print_usage():
+    """Вывести справку по использованию"""
+    print("\nИспользование: python3 jellyfin-list.py [фильмы|сериалы] [--fields id,name,year,type,size,path,providers]")
+    print("                [--limit N] [--offset N] [--page-size N] [--json|--tsv]")
+
+def parse_args(args, mode='human'):
+    """Разбор аргументов командной строки"""
+    options = {
+        'item_type': None,
+        'type_filter': "",
+        'fields': None,
+        'limit': None,
+        'offset': 0,
+        'page_size': PAGE_SIZE,
+        'mode': mode,
+    }
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ('--json', '--tsv'):
+            options['mode'] = arg[2:]
+        elif arg in ('--fields', '--limit', '--offset', '--page-size'):
+            if i + 1 >= len(args):
+                raise ValueError(f"не указано значение для {arg}")
+            value = args[i + 1]
+            i += 1
+            if arg == '--fields':
+                fields = [f.strip().lower() for f in value.split(',') if f.strip()]
+                unknown = [f for f in fields if f not in FIELD_SOURCES]
+                if unknown or not fields:
+                    raise ValueError(f"неизвестные поля: {', '.join(unknown) or value}")
+                options['fields'] = fields
+            else:
+                number = int(value)
+                if number < 0 or (arg in ('--page-size', '--limit') and number == 0):
+                    raise ValueError(f"неверное значение для {arg}: {value}")
+                options[arg[2:].replace('-', '_')] = number
         else:
-            print(f"❌ Неверный фильтр: {sys.argv[1]}")
-            print("\nИспользование: python3 jellyfin-list.py [фильмы|сериалы]")
-            sys.exit(1)
+            filter_arg = arg.lower()
+            if filter_arg in ['фильмы', 'фильм', 'movie', 'movies']:
+                options['item_type'] = 'Movie'
+                options['type_filter'] = "Фильмы"
+            elif filter_arg in ['сериалы', 'сериал', 'series', 'tv']:
+                options['item_type'] = 'Series'
+                options['type_filter'] = "Сериалы"
+            else:
+                raise ValueError(f"Неверный фильтр: {arg}")
+        i += 1
+
+    if options['fields'] is None:
+        # Для машинного вывода id полезнее иконки типа
+        options['fields'] = DEFAULT_FIELDS if options['mode'] == 'human' else ['id', 'type', 'name', 'year', 'size']
+
+    return options
+
+def main():
+    # --json/--compact разбираются общим модулем, --tsv - синоним --compact
+    output_mode = init_output()
+    mode = {JSON: 'json', COMPACT: 'tsv'}.get(output_mode, 'human')
+
+    try:
+        options = parse_args(sys.argv[1:], mode)
+    except ValueError as e:
+        print_error(str(e))
+        if output_mode not in (COMPACT, JSON):
+            print_usage()
+        sys.exit(1)
+
+    mode = options['mode']
+    fields = options['fields']
 
     try:
         # Загрузить учетные данные
-        creds = load_credentials()
-        url = creds['url']
-        api_key = creds['api_key']
+        session, url = get_jellyfin_session()
 
-        # Получить список
-        title = f"📚 {type_filter}" if type_filter else "📚 Весь контент"
-        print(f"{title}\n")
+        items = iter_items(
+            session, url, options['item_type'], fields,
+            offset=options['offset'], max_items=options['limit'], page_size=options['page_size']
+        )
 
-        result = get_items(url, api_key, item_type)
+        total = next(items)
 
-        if result['TotalRecordCount'] == 0:
-            print("❌ Контент не найден")
-            sys.exit(0)
+        if mode == 'json':
+            print(json.dumps({'total': total, 'fields': fields}, ensure_ascii=False, separators=(',', ':')))
+        elif mode == 'tsv':
+            print('\t'.join(fields))
+        else:
+            title = f"📚 {options['type_filter']}" if options['type_filter'] else "📚 Весь контент"
+            print(f"{title}\n")
 
-        print(f"Всего: {result['TotalRecordCount']}\n")
+            if total == 0:
+                print("❌ Контент не найден")
+                sys.exit(0)
 
-        for item in result['Items']:
-            item_type_icon = "🎬" if item['Type'] == 'Movie' else "📺"
-            name = item['Name']
-            year = item.get('ProductionYear', 'N/A')
+            print(f"Всего: {total}\n")
 
-            # Размер файла
-            size = "N/A"
-            if 'MediaSources' in item and len(item['MediaSources']) > 0:
-                total_size = sum(ms.get('Size', 0) for ms in item['MediaSources'])
-                size = format_size(total_size)
+        # Выводим по мере поступления страниц, не накапливая результат
+        for count, item in enumerate(items, 1):
+            row = project_item(item, fields)
+            if mode == 'json':
+                print(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+            elif mode == 'tsv':
+                print(format_tsv(row, fields))
+            else:
+                print(format_human(row))
 
-            print(f"{item_type_icon} {name} ({year}) - {size}")
+            if count % options['page_size'] == 0:
+                sys.stdout.flush()
 
     except FileNotFoundError:
-        print("❌ Файл keys/jellyfin.json не найден")
+        print_error("Файл keys/jellyfin.json не найден")
         sys.exit(1)
     except requests.exceptions.RequestException as e:
-        print(f"❌ Ошибка подключения к Jellyfin: {e}")
+        print_error(f"Ошибка подключения к Jellyfin: {e}")
         sys.exit(1)
     except Exception as e:
-        print(f"❌ Ошибка: {e}")
+        print_error(f"Ошибка: {e}")
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -1,22 +1,24 @@
 #!/usr/bin/env python3
 """
 Скрипт для запуска видео на Apple TV через Jellyfin Sessions API
+Использование: python3 jellyfin-play-video.py <название_фильма> [--json|--compact]
 """
 import sys
-import json
-import requests
 
-# Загружаем конфигурацию
-with open('keys/jellyfin.json', 'r') as f:
-    config = json.load(f)
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
+
+from media_clients import get_jellyfin_session
+from script_output import init_output, is_human, emit, print_error
 
-JELLYFIN_URL = config['url']
-API_KEY = config['api_key']
+# Загружаем конфигурацию
+jellyfin, JELLYFIN_URL = get_jellyfin_session()
+API_KEY = jellyfin.api_key
 
 def get_appletv_session():
     """Получает ID сессии Apple TV"""
     url = f"{JELLYFIN_URL}/Sessions?api_key={API_KEY}"
-    response = requests.get(url)
+    response = jellyfin.get(url)
     response.raise_for_status()
     sessions = response.json()
 
@@ -37,18 +39,23 @@ def play_video(session_id, item_id):
         'X-Emby-Token': API_KEY
     }
 
-    response = requests.post(url, params=params, headers=headers)
+    response = jellyfin.post(url, params=params, headers=headers)
 
     if response.status_code == 204:
-        print(f"✅ Команда воспроизведения отправлена успешно")
+        if is_human():
+            print(f"✅ Команда воспроизведения отправлена успешно")
         return True
     else:
-        print(f"❌ Ошибка: {response.status_code}")
-        print(response.text)
+        print_error(f"Ошибка: {response.status_code} {response.text}")
         return False
 
 def main():
+    init_output()
+
     if len(sys.argv) < 2:
+        if not is_human():
+            print_error("Использование: jellyfin-play-video.py <название_фильма>")
+            sys.exit(1)
         print("Использование: python3 jellyfin-play-video.py <название_фильма>")
         print("Пример: python3 jellyfin-play-video.py Бремя")
         sys.exit(1)
@@ -56,24 +63,26 @@ def main():
     search_query = sys.argv[1]
 
     # Получаем сессию
-    print("🔍 Поиск сессии Apple TV...")
+    if is_human():
+        print("🔍 Поиск сессии Apple TV...")
     session_id = get_appletv_session()
 
     if not session_id:
-        print("❌ Активная сессия Apple TV не найдена. Запустите Jellyfin на Apple TV.")
+        print_error("Активная сессия Apple TV не найдена. Запустите Jellyfin на Apple TV.")
         sys.exit(1)
 
-    print(f"✅ Найдена сессия: {session_id}")
+    if is_human():
+        print(f"✅ Найдена сессия: {session_id}")
 
-    # Ищем фильм
-    print(f"🔍 Поиск фильма '{search_query}'...")
+        # Ищем фильм
+        print(f"🔍 Поиск фильма '{search_query}'...")
     search_url = f"{JELLYFIN_URL}/Items?searchTerm={search_query}&Recursive=true&IncludeItemTypes=Movie&api_key={API_KEY}"
-    response = requests.get(search_url)
+    response = jellyfin.get(search_url)
     response.raise_for_status()
     results = response.json()
 
     if results['TotalRecordCount'] == 0:
-        print(f"❌ Фильм '{search_query}' не найден")
+        print_error(f"Фильм '{search_query}' не найден")
         sys.exit(1)
 
     item = results['Items'][0]
@@ -81,11 +90,16 @@ def main():
     item_name = item['Name']
     item_year = item.get('ProductionYear', '')
 
-    print(f"✅ Найден: {item_name} ({item_year})")
-    print(f"📺 Запуск на Apple TV...")
+    if is_human():
+        print(f"✅ Найден: {item_name} ({item_year})")
+        print(f"📺 Запуск на Apple TV...")
 
     # Запускаем видео
-    play_video(session_id, item_id)
+    if not play_video(session_id, item_id):
+        sys.exit(1)
+
+    if not is_human():
+        emit({'session': session_id, 'id': item_id, 'name': item_name, 'year': item_year or None})
 
 if __name__ == "__main__":
     main()
@@ -1,64 +1,86 @@
 #!/usr/bin/env python3
 """
-Обновление библиотеки Jellyfin по названию
+Обновление библиотеки Jellyfin по названию или только изменённых путей
 Использование: python3 jellyfin-refresh.py <название>
+               python3 jellyfin-refresh.py --path <путь> [путь ...]
 Примеры:
   python3 jellyfin-refresh.py Фильмы
   python3 jellyfin-refresh.py Сериалы
+  python3 jellyfin-refresh.py --path /data/movies/Interstellar.2014   # только эта папка, за секунды
+  python3 jellyfin-refresh.py Фильмы --json   # машинный вывод (см. script_output.py)
+
+Пути qBittorrent переводятся в пути Jellyfin по "path_map" из keys/jellyfin.json,
+например {"path_map": {"/downloads/": "/media/"}}.
 """
 
 import sys
-import json
-import requests
-import os
 
-def load_credentials():
-    """Загрузка учетных данных из keys/jellyfin.json"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    keys_file = os.path.join(os.path.dirname(script_dir), 'keys', 'jellyfin.json')
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+import requests
+from media_clients import get_jellyfin_session
+from script_output import init_output, is_human, emit, print_error
 
-def get_libraries(url, api_key):
+def get_libraries(session, url):
     """Получить список всех библиотек"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
-
-    response = requests.get(f'{url}/Library/VirtualFolders', headers=headers)
+    response = session.get(f'{url}/Library/VirtualFolders')
     response.raise_for_status()
     return response.json()
 
-def refresh_library(url, api_key, library_id):
+def refresh_library(session, url, library_id):
     """Обновить библиотеку по ID"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
-
-    response = requests.post(f'{url}/Library/Refresh', headers=headers, params={'id': library_id})
+    response = session.post(f'{url}/Library/Refresh', params={'id': library_id})
     response.raise_for_status()
     return response.status_code == 204
 
+def notify_updated(session, url, paths):
+    """Сообщить Jellyfin об изменённых путях: сканируется только папка с ними, а не вся библиотека"""
+    updates = [{'Path': path, 'UpdateType': 'Modified'} for path in paths]
+    response = session.post(f'{url}/Library/Media/Updated', json={'Updates': updates})
+    response.raise_for_status()
+
+def refresh_paths(paths):
+    """Режим --path: обновить только указанные пути"""
+    session, url = get_jellyfin_session()
+    media_paths = [session.media_path(path) for path in paths]
+    notify_updated(session, url, media_paths)
+    if is_human():
+        for path in media_paths:
+            print(f"✅ Jellyfin обновит: {path}")
+    else:
+        emit({'paths': media_paths})
+
 def main():
+    init_output()
+
     if len(sys.argv) < 2:
+        if not is_human():
+            print_error("Использование: jellyfin-refresh.py <библиотека>")
+            sys.exit(1)
         print("❌ Ошибка: не указано название библиотеки")
         print("\nИспользование: python3 jellyfin-refresh.py <название>")
         print("\nПримеры:")
         print("  python3 jellyfin-refresh.py Фильмы")
         print("  python3 jellyfin-refresh.py Сериалы")
+        print("  python3 jellyfin-refresh.py --path <путь к загрузке>")
         sys.exit(1)
 
     library_name = ' '.join(sys.argv[1:])
 
     try:
+        if sys.argv[1] == '--path':
+            if len(sys.argv) < 3:
+                print_error("Использование: jellyfin-refresh.py --path <путь> [путь ...]")
+                sys.exit(1)
+            refresh_paths(sys.argv[2:])
+            return
+
         # Загрузить учетные данные
-        creds = load_credentials()
-        url = creds['url']
-        api_key = creds['api_key']
+        session, url = get_jellyfin_session()
 
         # Получить список библиотек
-        libraries = get_libraries(url, api_key)
+        libraries = get_libraries(session, url)
 
         # Найти библиотеку по названию
         library = None
@@ -68,6 +90,9 @@ def main():
                 break
 
         if not library:
+            if not is_human():
+                print_error(f"Библиотека '{library_name}' не найдена, доступные: {', '.join(lib['Name'] for lib in libraries)}")
+                sys.exit(1)
             print(f"❌ Библиотека '{library_name}' не найдена")
             print("\n📚 Доступные библиотеки:")
             for lib in libraries:
@@ -75,18 +100,22 @@ def main():
             sys.exit(1)
 
         # Обновить библиотеку
-        print(f"🔄 Обновление библиотеки '{library['Name']}'...")
-        refresh_library(url, api_key, library['ItemId'])
-        print(f"✅ Библиотека '{library['Name']}' успешно обновлена!")
+        if is_human():
+            print(f"🔄 Обновление библиотеки '{library['Name']}'...")
+        refresh_library(session, url, library['ItemId'])
+        if is_human():
+            print(f"✅ Библиотека '{library['Name']}' успешно обновлена!")
+        else:
+            emit({'library': library['Name']})
 
     except FileNotFoundError:
-        print("❌ Файл keys/jellyfin.json не найден")
+        print_error("Файл keys/jellyfin.json не найден")
         sys.exit(1)
     except requests.exceptions.RequestException as e:
-        print(f"❌ Ошибка подключения к Jellyfin: {e}")
+        print_error(f"Ошибка подключения к Jellyfin: {e}")
         sys.exit(1)
     except Exception as e:
-        print(f"❌ Ошибка: {e}")
+        print_error(f"Ошибка: {e}")
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -5,27 +5,20 @@
 Примеры:
   python3 jellyfin-search.py Интерстеллар
   python3 jellyfin-search.py "Breaking Bad"
+  python3 jellyfin-search.py Интерстеллар --json   # машинный вывод (см. script_output.py)
 """
 
 import sys
-import json
-import requests
-import os
 
-def load_credentials():
-    """Загрузка учетных данных из keys/jellyfin.json"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    keys_file = os.path.join(os.path.dirname(script_dir), 'keys', 'jellyfin.json')
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+import requests
+from media_clients import get_jellyfin_session
+from script_output import init_output, is_human, emit, print_error, item_record, ITEM_FIELDS
 
-def search_items(url, api_key, query):
+def search_items(session, url, query):
     """Поиск контента по названию"""
-    headers = {
-        'Authorization': f'MediaBrowser Token={api_key}'
-    }
-
     params = {
         'searchTerm': query,
         'IncludeItemTypes': 'Movie,Series',
@@ -33,7 +26,7 @@ def search_items(url, api_key, query):
         'Fields': 'Path,MediaSources,ProviderIds'
     }
 
-    response = requests.get(f'{url}/Items', headers=headers, params=params)
+    response = session.get(f'{url}/Items', params=params)
     response.raise_for_status()
     return response.json()
 
@@ -49,7 +42,12 @@ def format_size(bytes_size):
     return f"{bytes_size:.2f} ПБ"
 
 def main():
+    init_output()
+
     if len(sys.argv) < 2:
+        if not is_human():
+            print_error("Использование: jellyfin-search.py <название>")
+            sys.exit(1)
         print("❌ Ошибка: не указан поисковый запрос")
         print("\nИспользование: python3 jellyfin-search.py <название>")
         print("\nПримеры:")
@@ -61,13 +59,20 @@ def main():
 
     try:
         # Загрузить учетные данные
-        creds = load_credentials()
-        url = creds['url']
-        api_key = creds['api_key']
+        session, url = get_jellyfin_session()
 
         # Поиск
-        print(f"🔍 Поиск '{query}'...\n")
-        result = search_items(url, api_key, query)
+        if is_human():
+            print(f"🔍 Поиск '{query}'...\n")
+        result = search_items(session, url, query)
+
+        if not is_human():
+            emit({
+                'query': query,
+                'total': result['TotalRecordCount'],
+                'items': [item_record(item) for item in result['Items']],
+            }, 'items', ITEM_FIELDS)
+            sys.exit(0)
 
         if result['TotalRecordCount'] == 0:
             print(f"❌ Ничего не найдено по запросу '{query}'")
@@ -97,13 +102,13 @@ def main():
             print()
 
     except FileNotFoundError:
-        print("❌ Файл keys/jellyfin.json не найден")
+        print_error("Файл keys/jellyfin.json не найден")
         sys.exit(1)
     except requests.exceptions.RequestException as e:
-        print(f"❌ Ошибка подключения к Jellyfin: {e}")
+        print_error(f"Ошибка подключения к Jellyfin: {e}")
         sys.exit(1)
     except Exception as e:
-        print(f"❌ Ошибка: {e}")
+        print_error(f"Ошибка: {e}")
         sys.exit(1)
 
 if __name__ == '__main__':
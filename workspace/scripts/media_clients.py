@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Общие клиенты qBittorrent и Jellyfin для скриптов из scripts/
+
+Сессии кэшируются на уровне модуля: при обычном запуске скрипта это одна
+авторизация на процесс, а внутри демона toolsd (system/toolsd.py) -
+одна авторизация на всё время его работы.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import time
+import requests
+from pathlib import Path
+
+from script_output import print_error
+
+KEYS_DIR = Path(__file__).parent.parent / "keys"
+
+# Прогретые сессии по имени сервиса
+_sessions = {}
+
+# Таймаут запросов к сервисам по умолчанию: (соединение, ответ), секунд
+REQUEST_TIMEOUT = (5, 30)
+
+# Чат Telegram, из которого запущен скрипт (выставляет бот, см. system/spool.py)
+CHAT_ENV = "TG2CLAUDE_CHAT"
+# Префикс тега торрентов, о завершении которых бот сообщает в чат
+NOTIFY_TAG_PREFIX = "tg2claude:"
+
+# Состояния торрента, пока метаданные magnet-ссылки не получены
+METADATA_STATES = ('metaDL', 'forcedMetaDL')
+# Пауза между запросами sync/maindata при ожидании метаданных, секунд
+METADATA_POLL_INTERVAL = 0.5
+
+def load_credentials(name):
+    """Загрузка credentials из keys/<name>"""
+    with open(KEYS_DIR / name, 'r') as f:
+        return json.load(f)
+
+class TimeoutSession(requests.Session):
+    """Сессия с таймаутом по умолчанию: недоступный сервис не вешает скрипт и демон toolsd"""
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        return super().request(method, url, *args, **kwargs)
+
+class QBittorrentSession(TimeoutSession):
+    """Сессия qBittorrent, которая сама перелогинивается при истёкшей cookie"""
+
+    def __init__(self, creds):
+        super().__init__()
+        self.base_url = f"http://{creds['host']}:{creds['port']}"
+        self._login_data = {
+            'username': creds['username'],
+            'password': creds['password']
+        }
+
+    def login(self):
+        """Авторизация, возвращает ответ qBittorrent ("Ok." при успехе)"""
+        response = super().request('POST', f"{self.base_url}/api/v2/auth/login", data=self._login_data)
+        return response.text
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+
+        # Cookie SID истекла (актуально для долгоживущего демона) - один повтор после логина
+        if response.status_code == 403 and not url.endswith('/auth/login'):
+            if self.login() == "Ok.":
+                response = super().request(method, url, *args, **kwargs)
+
+        return response
+
+class JellyfinSession(TimeoutSession):
+    """Сессия Jellyfin с заголовком авторизации"""
+
+    def __init__(self, creds):
+        super().__init__()
+        self.base_url = creds['url']
+        self.api_key = creds['api_key']
+        self.headers['Authorization'] = f'MediaBrowser Token={self.api_key}'
+        # Префиксы путей qBittorrent -> пути в Jellyfin, если сервисы видят диск по-разному
+        self.path_map = creds.get('path_map', {})
+
+    def media_path(self, path):
+        """Путь к файлу или папке загрузки так, как его видит Jellyfin"""
+        for prefix in sorted(self.path_map, key=len, reverse=True):
+            if path.startswith(prefix):
+                return self.path_map[prefix] + path[len(prefix):]
+        return path
+
+# Класс сессии и файл ключей по имени сервиса
+SESSION_TYPES = {
+    'qbittorrent': (QBittorrentSession, 'qbittorrent.json'),
+    'jellyfin': (JellyfinSession, 'jellyfin.json'),
+}
+
+class AuthError(Exception):
+    """Сервис отказал в авторизации"""
+
+def qbt_session():
+    """Авторизованная сессия qBittorrent, при ошибке авторизации - AuthError"""
+    session = _sessions.get('qbittorrent')
+
+    if session is None:
+        session = QBittorrentSession(load_credentials('qbittorrent.json'))
+        result = session.login()
+        if result != "Ok.":
+            raise AuthError(result)
+        _sessions['qbittorrent'] = session
+
+    return session
+
+def jellyfin_session():
+    """Сессия Jellyfin"""
+    session = _sessions.get('jellyfin')
+
+    if session is None:
+        session = JellyfinSession(load_credentials('jellyfin.json'))
+        _sessions['jellyfin'] = session
+
+    return session
+
+def get_qbt_session():
+    """Авторизованная сессия qBittorrent и базовый URL, (None, None) при ошибке авторизации"""
+    try:
+        session = qbt_session()
+    except AuthError as e:
+        print_error(f"Ошибка авторизации: {e}")
+        return None, None
+
+    return session, session.base_url
+
+def get_jellyfin_session():
+    """Сессия Jellyfin и URL сервера"""
+    session = jellyfin_session()
+    return session, session.base_url
+
+def parse_file_ids(ids_string):
+    """Парсинг строки с ID файлов
+    Примеры:
+      "0,1,2" -> [0, 1, 2]
+      "5-10" -> [5, 6, 7, 8, 9, 10]
+      "0,3,5-8,12" -> [0, 3, 5, 6, 7, 8, 12]
+    """
+    result = []
+    parts = ids_string.split(',')
+
+    for part in parts:
+        part = part.strip()
+        if '-' in part:
+            # Диапазон
+            start, end = part.split('-')
+            result.extend(range(int(start), int(end) + 1))
+        else:
+            # Одиночный ID
+            result.append(int(part))
+
+    return sorted(list(set(result)))  # Убираем дубликаты и сортируем
+
+def format_file_ids(ids):
+    """Обратное к parse_file_ids: [0, 1, 2, 5, 7, 8] -> 0-2,5,7-8"""
+    ranges = []
+    for file_id in sorted(ids):
+        if ranges and file_id == ranges[-1][1] + 1:
+            ranges[-1][1] = file_id
+        else:
+            ranges.append([file_id, file_id])
+
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+def magnet_hash(magnet_link):
+    """Info-hash из magnet-ссылки в hex нижнего регистра, как его показывает qBittorrent; None если его нет"""
+    match = re.search(r'xt=urn:btih:([0-9a-zA-Z]+)', magnet_link)
+    if not match:
+        return None
+    value = match.group(1)
+    if len(value) == 32:
+        # base32-форма
+        try:
+            return base64.b32decode(value.upper()).hex()
+        except binascii.Error:
+            return None
+    return value.lower() if len(value) == 40 else value
+
+def wait_for_metadata(session, hashes, timeout):
+    """
+    Дождаться метаданных торрентов, не дольше timeout секунд.
+    Состояние берётся из sync/maindata с rid: каждый ответ содержит только изменения,
+    список файлов запрашивается, когда метаданные уже есть.
+    Возвращает {hash: (торрент, файлы)} для торрентов, чьи метаданные получены.
+    """
+    pending = set(hashes)
+    torrents = {}
+    ready = {}
+    rid = 0
+    deadline = time.monotonic() + timeout
+
+    while pending:
+        response = session.get(f"{session.base_url}/api/v2/sync/maindata", params={'rid': rid})
+        response.raise_for_status()
+        data = response.json()
+        rid = data.get('rid', 0)
+        for torrent_hash, changes in (data.get('torrents') or {}).items():
+            if torrent_hash in pending:
+                torrents.setdefault(torrent_hash, {}).update(changes)
+
+        for torrent_hash in list(pending):
+            torrent = torrents.get(torrent_hash)
+            if not torrent or torrent.get('state', 'metaDL') in METADATA_STATES:
+                continue
+            response = session.get(f"{session.base_url}/api/v2/torrents/files", params={'hash': torrent_hash})
+            response.raise_for_status()
+            files = response.json()
+            if files:
+                ready[torrent_hash] = (torrent, files)
+                pending.discard(torrent_hash)
+
+        if not pending or time.monotonic() >= deadline:
+            break
+        time.sleep(METADATA_POLL_INTERVAL)
+
+    return ready
+
+def notify_tag():
+    """Тег qBittorrent для уведомления чата о загрузке, None если скрипт запущен не ботом"""
+    chat = os.environ.get(CHAT_ENV)
+    return f"{NOTIFY_TAG_PREFIX}{chat}" if chat else None
+
+def _bencode_end(data, pos):
+    """Позиция сразу после bencode-значения, начинающегося в pos"""
+    token = data[pos:pos + 1]
+    if token == b'i':
+        return data.index(b'e', pos) + 1
+    if token in (b'l', b'd'):
+        pos += 1
+        while data[pos:pos + 1] != b'e':
+            pos = _bencode_end(data, pos)
+        return pos + 1
+    # Строка: <длина>:<байты>
+    colon = data.index(b':', pos)
+    return colon + 1 + int(data[pos:colon])
+
+def torrent_hash(torrent_path):
+    """Info-hash .torrent файла: SHA-1 от bencode-словаря info, None если файл не разобрать"""
+    data = Path(torrent_path).read_bytes()
+    try:
+        if data[:1] != b'd':
+            return None
+        pos = 1
+        while data[pos:pos + 1] != b'e':
+            key_end = _bencode_end(data, pos)
+            key = data[data.index(b':', pos) + 1:key_end]
+            value_end = _bencode_end(data, key_end)
+            if key == b'info':
+                return hashlib.sha1(data[key_end:value_end]).hexdigest()
+            pos = value_end
+    except (ValueError, IndexError):
+        pass
+    return None
+
+def login_all():
+    """
+    Авторизация во всех сервисах, для которых есть ключи.
+    Возвращает состояние сессий (cookies) в виде JSON-совместимого словаря:
+    демон toolsd логинится в отдельном процессе и передаёт его через pipe.
+    """
+    state = {}
+
+    if (KEYS_DIR / 'qbittorrent.json').exists():
+        session = QBittorrentSession(load_credentials('qbittorrent.json'))
+        result = session.login()
+        session.close()
+        if result != "Ok.":
+            raise AuthError(result)
+        state['qbittorrent'] = {'cookies': requests.utils.dict_from_cookiejar(session.cookies)}
+    if (KEYS_DIR / 'jellyfin.json').exists():
+        # Токен в ключах, логин не нужен
+        state['jellyfin'] = {'cookies': {}}
+
+    return state
+
+def use_state(state):
+    """Заменить прогретые сессии на созданные из состояния login_all(), без запросов к сервисам"""
+    sessions = {}
+    for name, saved in state.items():
+        session_class, keys_file = SESSION_TYPES[name]
+        session = session_class(load_credentials(keys_file))
+        session.cookies.update(saved.get('cookies', {}))
+        sessions[name] = session
+
+    _sessions.clear()
+    _sessions.update(sessions)
@@ -1,86 +1,183 @@
 #!/usr/bin/env python3
 """
 Скрипт для добавления торрента в qBittorrent
-Использование: python qbt-add-torrent.py "Название" "magnet:..." "Movies|TV Shows"
+Использование: python qbt-add-torrent.py "Название" "magnet:...|файл.torrent" [ещё источники...] "Movies|TV Shows" [--wait[=секунд]] [--json|--compact]
+
+--wait - дождаться метаданных (по умолчанию до 30 секунд) и сразу показать hash и файлы,
+         без отдельного вызова qbt-show-files.py
+Несколько источников добавляются за один вызов как "Название (1)", "Название (2)", ...
 """
 
+import os
 import sys
-import json
-import requests
-from pathlib import Path
-
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
-
-def add_torrent(name, magnet_link, category):
-    """Добавление торрента в qBittorrent"""
-    creds = load_credentials()
-
-    # Формируем базовый URL
-    base_url = f"http://{creds['host']}:{creds['port']}"
 
-    # Создаём сессию для сохранения cookies
-    session = requests.Session()
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
-
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
-        return False
-
-    # Добавляем торрент
+import requests
+from media_clients import get_qbt_session, magnet_hash, notify_tag, torrent_hash, wait_for_metadata
+from script_output import init_output, is_human, emit, print_error, file_record, FILE_FIELDS
+
+VALID_CATEGORIES = ["Movies", "TV Shows"]
+USAGE = "qbt-add-torrent.py \"Название\" \"magnet:...|файл.torrent\" [...] \"Movies|TV Shows\" [--wait[=секунд]]"
+
+# Сколько ждать метаданные с --wait без числа, секунд
+DEFAULT_WAIT = 30
+# Сколько файлов показать после ожидания, полный список - qbt-show-files.py
+SHOW_FILES = 20
+
+def format_size(bytes_size):
+    """Форматирование размера в человекочитаемый вид"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes_size < 1024.0:
+            return f"{bytes_size:.2f} {unit}"
+        bytes_size /= 1024.0
+    return f"{bytes_size:.2f} PB"
+
+def add_torrent(session, base_url, name, source, category):
+    """Добавление торрента в qBittorrent по magnet-ссылке или .torrent файлу, возвращает hash"""
     add_url = f"{base_url}/api/v2/torrents/add"
     add_data = {
-        'urls': magnet_link,
         'category': category,
         'rename': name,
         'paused': 'false'  # Автоматически начать скачивание
     }
+    # Бот пришлёт в чат прогресс и сообщение о завершении
+    tag = notify_tag()
+    if tag:
+        add_data['tags'] = tag
+
+    if source.startswith("magnet:"):
+        add_data['urls'] = source
+        add_response = session.post(add_url, data=add_data)
+        torrent_id = magnet_hash(source)
+    else:
+        with open(source, 'rb') as f:
+            files = {'torrents': (os.path.basename(source), f, 'application/x-bittorrent')}
+            add_response = session.post(add_url, data=add_data, files=files)
+        torrent_id = torrent_hash(source)
+
+    if add_response.text != "Ok.":
+        raise RuntimeError(f"Ошибка добавления торрента '{name}': {add_response.text}")
+    return torrent_id
+
+def print_added(record, source):
+    """Вывод для человека: добавленный торрент и, если дождались, его файлы"""
+    print(f"✅ Торрент '{record['name']}' успешно добавлен в категорию '{record['category']}'")
+    if source.startswith("magnet:"):
+        print(f"🔗 Magnet: {source[:60]}...")
+    else:
+        print(f"📄 Файл: {source}")
+
+    if 'files' not in record:
+        return
+    if record['files'] is None:
+        print("⏳ Метаданные ещё не получены, файлы можно посмотреть позже через qbt-show-files.py")
+        return
+
+    files = record['files']
+    print(f"🆔 Hash: {record['hash']}")
+    print(f"📝 Файлов: {len(files)}, {format_size(sum(f['size'] for f in files))}")
+    for f in files[:SHOW_FILES]:
+        print(f"  [{f['i']}] {f['name']} ({format_size(f['size'])})")
+    if len(files) > SHOW_FILES:
+        print(f"  … ещё {len(files) - SHOW_FILES}, все файлы: python3 scripts/qbt-show-files.py {record['hash']}")
+
+def parse_args(args):
+    """Разбор аргументов: название, источники, категория и время ожидания метаданных"""
+    wait = None
+    positional = []
+    for arg in args:
+        if arg == '--wait':
+            wait = DEFAULT_WAIT
+        elif arg.startswith('--wait='):
+            value = arg.split('=', 1)[1]
+            if not value.isdigit():
+                raise ValueError("--wait= требует число секунд")
+            wait = int(value)
+        elif arg.startswith('--'):
+            raise ValueError(f"неизвестный аргумент: {arg}")
+        else:
+            positional.append(arg)
+
+    if len(positional) < 3:
+        raise ValueError("не хватает аргументов")
+
+    name, sources, category = positional[0], positional[1:-1], positional[-1]
 
-    add_response = session.post(add_url, data=add_data)
+    # Проверка категории
+    if category not in VALID_CATEGORIES:
+        raise ValueError(f"Неверная категория: {category}, доступные: {', '.join(VALID_CATEGORIES)}")
 
-    if add_response.text == "Ok.":
-        print(f"✅ Торрент '{name}' успешно добавлен в категорию '{category}'")
-        print(f"🔗 Magnet: {magnet_link[:60]}...")
-        return True
-    else:
-        print(f"❌ Ошибка добавления торрента: {add_response.text}")
-        return False
+    # Проверка magnet ссылок и файлов
+    for source in sources:
+        if not source.startswith("magnet:") and not (source.endswith(".torrent") and os.path.isfile(source)):
+            raise ValueError(f"это не magnet ссылка и не .torrent файл: {source[:60]}")
+
+    return name, sources, category, wait
 
 def main():
-    if len(sys.argv) != 4:
-        print("Использование: python qbt-add-torrent.py \"Название\" \"magnet:...\" \"Movies|TV Shows\"")
+    init_output()
+
+    try:
+        name, sources, category, wait = parse_args(sys.argv[1:])
+    except ValueError as e:
+        if not is_human():
+            print_error(f"{e}. Использование: {USAGE}")
+            sys.exit(1)
+        print(f"❌ {e}")
+        print(f"Использование: python {USAGE}")
         print("\nКатегории:")
         print("  Movies    - фильмы")
         print("  TV Shows  - сериалы")
+        print(f"\n  --wait     дождаться метаданных (до {DEFAULT_WAIT} с) и показать файлы")
+        print("  --wait=N   то же, не дольше N секунд")
         sys.exit(1)
 
-    name = sys.argv[1]
-    magnet_link = sys.argv[2]
-    category = sys.argv[3]
-
-    # Проверка категории
-    valid_categories = ["Movies", "TV Shows"]
-    if category not in valid_categories:
-        print(f"❌ Неверная категория: {category}")
-        print(f"Доступные категории: {', '.join(valid_categories)}")
+    session, base_url = get_qbt_session()
+    if not session:
         sys.exit(1)
 
-    # Проверка magnet ссылки
-    if not magnet_link.startswith("magnet:"):
-        print("❌ Ошибка: это не magnet ссылка")
-        sys.exit(1)
+    records = []
+    failed = False
+    for number, source in enumerate(sources, 1):
+        torrent_name = name if len(sources) == 1 else f"{name} ({number})"
+        try:
+            torrent_id = add_torrent(session, base_url, torrent_name, source, category)
+        except RuntimeError as e:
+            failed = True
+            if is_human() or len(sources) == 1:
+                print_error(str(e))
+            else:
+                # В машинном выводе ошибка остаётся в записи своего источника
+                records.append(({'name': torrent_name, 'category': category, 'hash': None, 'error': str(e)}, source))
+            continue
+        records.append(({'name': torrent_name, 'category': category, 'hash': torrent_id}, source))
+
+    if wait is not None and records:
+        try:
+            ready = wait_for_metadata(session, [r['hash'] for r, _ in records if r['hash']], wait)
+        except requests.exceptions.RequestException:
+            # Торренты уже добавлены, файлы покажет qbt-show-files.py
+            ready = {}
+        for record, _ in records:
+            if 'error' in record:
+                continue
+            torrent_files = ready.get(record['hash'], (None, None))[1]
+            record['files'] = [file_record(f, i) for i, f in enumerate(torrent_files)] if torrent_files else None
+
+    if not is_human():
+        if len(sources) == 1 and records:
+            record = records[0][0]
+            emit(record, 'files' if record.get('files') else None, FILE_FIELDS if record.get('files') else None)
+        elif records:
+            fields = ['name', 'category', 'hash'] + (['files'] if wait is not None else []) + ['error']
+            emit({'torrents': [record for record, _ in records]}, 'torrents', fields)
+    else:
+        for record, source in records:
+            print_added(record, source)
 
-    add_torrent(name, magnet_link, category)
+    sys.exit(1 if failed else 0)
 
 if __name__ == "__main__":
     main()
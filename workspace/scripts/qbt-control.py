@@ -8,41 +8,18 @@
   python qbt-control.py delete-full <hash> - удалить торрент с файлами
   python qbt-control.py recheck <hash>    - перепроверить торрент
   python qbt-control.py reannounce <hash> - переподключиться к трекерам
+  --json / --compact                      - машинный вывод (см. script_output.py)
 
 Где <hash> - это ID торрента (hash), который можно получить из qbt-list-active.py или qbt-list-all.py
 """
 
 import sys
-import json
-import requests
-from pathlib import Path
-
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
-
-def get_session():
-    """Создание авторизованной сессии"""
-    creds = load_credentials()
-    base_url = f"http://{creds['host']}:{creds['port']}"
-
-    session = requests.Session()
-
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
 
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
-        return None, None
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    return session, base_url
+from media_clients import get_qbt_session
+from script_output import init_output, is_human, emit, print_error
 
 def get_torrent_name(session, base_url, hash_id):
     """Получить название торрента по hash"""
@@ -55,15 +32,22 @@ def get_torrent_name(session, base_url, hash_id):
         return torrents[0].get('name', 'Неизвестный торрент')
     return None
 
+def report_done(action, hash_id, name, message):
+    """Сообщить об успешном действии"""
+    if is_human():
+        print(message)
+    else:
+        emit({'action': action, 'hash': hash_id, 'name': name})
+
 def pause_torrent(hash_id):
     """Поставить торрент на паузу"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
     name = get_torrent_name(session, base_url, hash_id)
     if not name:
-        print(f"❌ Торрент с ID {hash_id} не найден")
+        print_error(f"Торрент с ID {hash_id} не найден")
         return False
 
     url = f"{base_url}/api/v2/torrents/pause"
@@ -71,21 +55,21 @@ def pause_torrent(hash_id):
     response = session.post(url, data=data)
 
     if response.text == "Ok." or response.status_code == 200:
-        print(f"⏸️  Торрент '{name}' поставлен на паузу")
+        report_done('pause', hash_id, name, f"⏸️  Торрент '{name}' поставлен на паузу")
         return True
     else:
-        print(f"❌ Ошибка при постановке на паузу: {response.text}")
+        print_error(f"Ошибка при постановке на паузу: {response.text}")
         return False
 
 def resume_torrent(hash_id):
     """Продолжить загрузку торрента"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
     name = get_torrent_name(session, base_url, hash_id)
     if not name:
-        print(f"❌ Торрент с ID {hash_id} не найден")
+        print_error(f"Торрент с ID {hash_id} не найден")
         return False
 
     url = f"{base_url}/api/v2/torrents/resume"
@@ -93,21 +77,21 @@ def resume_torrent(hash_id):
     response = session.post(url, data=data)
 
     if response.text == "Ok." or response.status_code == 200:
-        print(f"▶️  Торрент '{name}' продолжает загрузку")
+        report_done('resume', hash_id, name, f"▶️  Торрент '{name}' продолжает загрузку")
         return True
     else:
-        print(f"❌ Ошибка при возобновлении: {response.text}")
+        print_error(f"Ошибка при возобновлении: {response.text}")
         return False
 
 def delete_torrent(hash_id, delete_files=False):
     """Удалить торрент"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
     name = get_torrent_name(session, base_url, hash_id)
     if not name:
-        print(f"❌ Торрент с ID {hash_id} не найден")
+        print_error(f"Торрент с ID {hash_id} не найден")
         return False
 
     url = f"{base_url}/api/v2/torrents/delete"
@@ -119,23 +103,23 @@ def delete_torrent(hash_id, delete_files=False):
 
     if response.text == "Ok." or response.status_code == 200:
         if delete_files:
-            print(f"🗑️  Торрент '{name}' удалён вместе с файлами")
+            report_done('delete-full', hash_id, name, f"🗑️  Торрент '{name}' удалён вместе с файлами")
         else:
-            print(f"🗑️  Торрент '{name}' удалён (файлы сохранены)")
+            report_done('delete', hash_id, name, f"🗑️  Торрент '{name}' удалён (файлы сохранены)")
         return True
     else:
-        print(f"❌ Ошибка при удалении: {response.text}")
+        print_error(f"Ошибка при удалении: {response.text}")
         return False
 
 def recheck_torrent(hash_id):
     """Перепроверить торрент"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
     name = get_torrent_name(session, base_url, hash_id)
     if not name:
-        print(f"❌ Торрент с ID {hash_id} не найден")
+        print_error(f"Торрент с ID {hash_id} не найден")
         return False
 
     url = f"{base_url}/api/v2/torrents/recheck"
@@ -143,21 +127,21 @@ def recheck_torrent(hash_id):
     response = session.post(url, data=data)
 
     if response.text == "Ok." or response.status_code == 200:
-        print(f"🔍 Торрент '{name}' начал перепроверку")
+        report_done('recheck', hash_id, name, f"🔍 Торрент '{name}' начал перепроверку")
         return True
     else:
-        print(f"❌ Ошибка при перепроверке: {response.text}")
+        print_error(f"Ошибка при перепроверке: {response.text}")
         return False
 
 def reannounce_torrent(hash_id):
     """Переподключиться к трекерам"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
     name = get_torrent_name(session, base_url, hash_id)
     if not name:
-        print(f"❌ Торрент с ID {hash_id} не найден")
+        print_error(f"Торрент с ID {hash_id} не найден")
         return False
 
     url = f"{base_url}/api/v2/torrents/reannounce"
@@ -165,10 +149,10 @@ def reannounce_torrent(hash_id):
     response = session.post(url, data=data)
 
     if response.text == "Ok." or response.status_code == 200:
-        print(f"📡 Торрент '{name}' переподключается к трекерам")
+        report_done('reannounce', hash_id, name, f"📡 Торрент '{name}' переподключается к трекерам")
         return True
     else:
-        print(f"❌ Ошибка при переподключении: {response.text}")
+        print_error(f"Ошибка при переподключении: {response.text}")
         return False
 
 def print_usage():
@@ -186,7 +170,12 @@ def print_usage():
     print("  python qbt-control.py delete-full 28a2695396c7cc02193c0927336f8877c3a5b4fa")
 
 def main():
+    init_output()
+
     if len(sys.argv) < 3:
+        if not is_human():
+            print_error("Использование: qbt-control.py <действие> <hash>")
+            sys.exit(1)
         print_usage()
         sys.exit(1)
 
@@ -203,8 +192,9 @@ def main():
     }
 
     if action not in actions:
-        print(f"❌ Неизвестное действие: {action}")
-        print_usage()
+        print_error(f"Неизвестное действие: {action}")
+        if is_human():
+            print_usage()
         sys.exit(1)
 
     # Выполняем действие
@@ -1,18 +1,14 @@
 #!/usr/bin/env python3
 """
 Скрипт для получения списка активных (скачивающихся) торрентов в qBittorrent
-Использование: python qbt-list-active.py
+Использование: python qbt-list-active.py [--json|--compact]
 """
 
-import json
-import requests
-from pathlib import Path
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+from media_clients import get_qbt_session
+from script_output import init_output, is_human, emit, torrent_record, TORRENT_FIELDS
 
 def format_size(bytes_size):
     """Форматирование размера в человекочитаемый вид"""
@@ -28,24 +24,8 @@ def format_speed(bytes_per_sec):
 
 def list_active_torrents():
     """Получение списка активных торрентов"""
-    creds = load_credentials()
-
-    # Формируем базовый URL
-    base_url = f"http://{creds['host']}:{creds['port']}"
-
-    # Создаём сессию для сохранения cookies
-    session = requests.Session()
-
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
-
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
+    session, base_url = get_qbt_session()
+    if not session:
         return
 
     # Получаем список торрентов с фильтром "downloading"
@@ -57,6 +37,10 @@ def list_active_torrents():
     response = session.get(info_url, params=params)
     torrents = response.json()
 
+    if not is_human():
+        emit({'torrents': [torrent_record(t) for t in torrents]}, 'torrents', TORRENT_FIELDS)
+        return
+
     if not torrents:
         print("📭 Нет активных загрузок")
         return
@@ -97,4 +81,5 @@ def list_active_torrents():
         print()
 
 if __name__ == "__main__":
+    init_output()
     list_active_torrents()
@@ -4,18 +4,16 @@
 Использование:
   python qbt-list-all.py                    - показать все торренты
   python qbt-list-all.py "название"         - поиск по названию
+  --json / --compact                        - машинный вывод (см. script_output.py)
 """
 
 import sys
-import json
-import requests
-from pathlib import Path
 
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
+
+from media_clients import get_qbt_session
+from script_output import init_output, is_human, emit, torrent_record, TORRENT_FIELDS
 
 def format_size(bytes_size):
     """Форматирование размера в человекочитаемый вид"""
@@ -67,24 +65,8 @@ def get_state_name(state):
 
 def list_all_torrents(search_query=None):
     """Получение списка всех торрентов с возможностью поиска"""
-    creds = load_credentials()
-
-    # Формируем базовый URL
-    base_url = f"http://{creds['host']}:{creds['port']}"
-
-    # Создаём сессию для сохранения cookies
-    session = requests.Session()
-
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
-
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
+    session, base_url = get_qbt_session()
+    if not session:
         return
 
     # Получаем список всех торрентов
@@ -98,6 +80,10 @@ def list_all_torrents(search_query=None):
         search_lower = search_query.lower()
         torrents = [t for t in torrents if search_lower in t.get('name', '').lower()]
 
+    if not is_human():
+        emit({'query': search_query, 'torrents': [torrent_record(t) for t in torrents]}, 'torrents', TORRENT_FIELDS)
+        return
+
     if not torrents:
         if search_query:
             print(f"🔍 Торренты с названием '{search_query}' не найдены")
@@ -151,5 +137,6 @@ def list_all_torrents(search_query=None):
         print()
 
 if __name__ == "__main__":
+    init_output()
     search_query = sys.argv[1] if len(sys.argv) > 1 else None
     list_all_torrents(search_query)
@@ -1,20 +1,21 @@
 #!/usr/bin/env python3
 """
 Скрипт для отображения структуры файлов торрента
-Использование: python qbt-show-files.py <hash>
+Использование: python qbt-show-files.py <hash> [--depth N] [--collapse N | --all] [--json|--compact]
 """
 
 import sys
-import json
-import requests
-from pathlib import Path
-from collections import defaultdict
 
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
+
+from media_clients import get_qbt_session, format_file_ids
+from script_output import init_output, is_human, emit, print_error, file_record, FILE_FIELDS
+
+# По умолчанию папка с большим числом файлов сворачивается
+DEFAULT_COLLAPSE = 50
+# Сколько файлов показывать из свёрнутой папки
+COLLAPSE_SHOW = 5
 
 def format_size(bytes_size):
     """Форматирование размера в человекочитаемый вид"""
@@ -37,114 +38,117 @@ def get_priority_status(priority):
     else:
         return "❓ неизвестно"
 
-def build_tree(files):
-    """Построить дерево папок и файлов"""
-    tree = defaultdict(list)
-
-    for file_info in files:
-        path = file_info['name']
-        parts = path.split('/')
+class FolderNode:
+    """Папка в дереве файлов торрента с суммарными размером и прогрессом"""
+
+    __slots__ = ('name', 'folders', 'files', 'size', 'downloaded', 'file_count', 'skipped')
+
+    def __init__(self, name):
+        self.name = name
+        self.folders = {}
+        self.files = []
+        self.size = 0
+        self.downloaded = 0
+        self.file_count = 0
+        self.skipped = 0
+
+    def add(self, file_info):
+        """Учесть файл в суммах этой папки"""
+        self.size += file_info['size']
+        self.downloaded += file_info['size'] * file_info.get('progress', 0)
+        self.file_count += 1
+        if file_info['priority'] == 0:
+            self.skipped += 1
+
+    def file_ids(self):
+        """ID всех файлов папки и подпапок"""
+        ids = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            ids.extend(f['index'] for f in node.files)
+            stack.extend(node.folders.values())
+        return ids
 
-        if len(parts) == 1:
-            # Файл в корне
-            tree['__root__'].append(file_info)
-        else:
-            # Файл в папке
-            folder = '/'.join(parts[:-1])
-            tree[folder].append(file_info)
-
-    return tree
-
-def print_tree(tree, files_list, total_size):
-    """Вывести дерево файлов"""
-    # Собираем все уникальные папки
-    folders = set()
-    for path in tree.keys():
-        if path != '__root__':
-            parts = path.split('/')
-            for i in range(len(parts)):
-                folders.add('/'.join(parts[:i+1]))
-
-    folders = sorted(folders)
-
-    # Если есть файлы в корне
-    if '__root__' in tree and tree['__root__']:
-        print("\n📂 Файлы в корне:")
-        for file_info in sorted(tree['__root__'], key=lambda x: x['name']):
-            idx = file_info['index']
-            name = file_info['name']
-            size = format_size(file_info['size'])
-            priority = file_info['priority']
-            status = get_priority_status(priority)
-            progress = file_info.get('progress', 0) * 100
-
-            print(f"├─ [{idx}] 📄 {name} ({size}) {status} [{progress:.1f}%]")
-
-    # Выводим папки и их содержимое
-    if folders:
-        print("\n📂 Структура папок:")
-
-        # Группируем по корневой папке
-        root_folders = set()
+def build_tree(files):
+    """
+    Построить дерево папок за один проход по списку файлов.
+    Суммы размера и прогресса копятся во всех папках на пути к файлу,
+    поэтому после построения у каждой папки они уже посчитаны.
+    """
+    root = FolderNode('')
+
+    for index, file_info in enumerate(files):
+        file_info.setdefault('index', index)
+        *folders, file_name = file_info['name'].split('/')
+
+        node = root
+        node.add(file_info)
         for folder in folders:
-            root = folder.split('/')[0]
-            root_folders.add(root)
-
-        for root_folder in sorted(root_folders):
-            # Находим все файлы в этой корневой папке
-            folder_files = []
-            for folder_path, files in tree.items():
-                if folder_path.startswith(root_folder):
-                    folder_files.extend(files)
-
-            # Считаем общий размер папки
-            folder_size = sum(f['size'] for f in folder_files)
-
-            print(f"\n├─ 📁 {root_folder}/ ({format_size(folder_size)})")
-
-            # Выводим файлы в этой папке и подпапках
-            for folder_path in sorted([f for f in folders if f.startswith(root_folder)]):
-                if folder_path in tree:
-                    # Определяем уровень вложенности
-                    depth = folder_path.count('/')
-                    indent = "│  " * (depth + 1)
-
-                    # Если это подпапка, показываем её
-                    if depth > 0:
-                        subfolder_name = folder_path.split('/')[-1]
-                        subfolder_files = tree[folder_path]
-                        subfolder_size = sum(f['size'] for f in subfolder_files)
-                        print(f"{indent}├─ 📁 {subfolder_name}/ ({format_size(subfolder_size)})")
-                        indent += "│  "
-
-                    # Выводим файлы
-                    for file_info in sorted(tree[folder_path], key=lambda x: x['name']):
-                        idx = file_info['index']
-                        name = file_info['name'].split('/')[-1]  # Только имя файла
-                        size = format_size(file_info['size'])
-                        priority = file_info['priority']
-                        status = get_priority_status(priority)
-                        progress = file_info.get('progress', 0) * 100
-
-                        print(f"{indent}├─ [{idx}] 📄 {name} ({size}) {status} [{progress:.1f}%]")
-
-def show_files(hash_id):
+            child = node.folders.get(folder)
+            if child is None:
+                child = node.folders[folder] = FolderNode(folder)
+            node = child
+            node.add(file_info)
+
+        node.files.append(file_info)
+
+    return root
+
+def format_file(file_info):
+    """Строка файла"""
+    name = file_info['name'].rsplit('/', 1)[-1]
+    size = format_size(file_info['size'])
+    status = get_priority_status(file_info['priority'])
+    progress = file_info.get('progress', 0) * 100
+    return f"[{file_info['index']}] 📄 {name} ({size}) {status} [{progress:.1f}%]"
+
+def format_folder(node, collapsed=False):
+    """Строка папки: размер, прогресс, число файлов; у свёрнутой ещё и ID файлов"""
+    progress = node.downloaded / node.size * 100 if node.size else 0
+    line = f"📁 {node.name}/ ({format_size(node.size)}) [{progress:.1f}%] {node.file_count} файлов"
+    if node.skipped:
+        line += f", {node.skipped} не качается"
+    if collapsed:
+        line += f", ID: {format_file_ids(node.file_ids())}"
+    return line
+
+def iter_tree(node, max_depth=None, collapse=None, prefix="", depth=0):
+    """
+    Строки дерева для папки node (без неё самой), по одной - для потокового вывода.
+    Папки глубже max_depth сворачиваются в одну строку с диапазонами ID,
+    из папки с более чем collapse файлами показываются первые COLLAPSE_SHOW.
+    """
+    entries = [(False, name, child) for name, child in sorted(node.folders.items())]
+    files = sorted(node.files, key=lambda f: f['name'])
+
+    hidden = []
+    if collapse is not None and len(files) > collapse:
+        files, hidden = files[:COLLAPSE_SHOW], files[COLLAPSE_SHOW:]
+    entries.extend((True, f['name'], f) for f in files)
+
+    for position, (is_file, _, entry) in enumerate(entries):
+        last = position == len(entries) - 1 and not hidden
+        branch = "└─ " if last else "├─ "
+
+        if is_file:
+            yield prefix + branch + format_file(entry)
+            continue
+
+        collapsed = max_depth is not None and depth >= max_depth
+        yield prefix + branch + format_folder(entry, collapsed)
+        if not collapsed:
+            yield from iter_tree(entry, max_depth, collapse, prefix + ("   " if last else "│  "), depth + 1)
+
+    if hidden:
+        hidden_size = sum(f['size'] for f in hidden)
+        hidden_ids = format_file_ids(f['index'] for f in hidden)
+        yield f"{prefix}└─ … ещё {len(hidden)} файлов ({format_size(hidden_size)}), ID: {hidden_ids}"
+
+def show_files(hash_id, max_depth=None, collapse=DEFAULT_COLLAPSE):
     """Показать файлы торрента"""
-    creds = load_credentials()
-    base_url = f"http://{creds['host']}:{creds['port']}"
-
-    session = requests.Session()
-
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
-
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
+    session, base_url = get_qbt_session()
+    if not session:
         return False
 
     # Получаем информацию о торренте
@@ -154,7 +158,7 @@ def show_files(hash_id):
     torrents = response.json()
 
     if not torrents or len(torrents) == 0:
-        print(f"❌ Торрент с hash {hash_id} не найден")
+        print_error(f"Торрент с hash {hash_id} не найден")
         return False
 
     torrent = torrents[0]
@@ -169,10 +173,20 @@ def show_files(hash_id):
     files = response.json()
 
     if not files:
-        print(f"❌ Не удалось получить список файлов")
-        print(f"⏳ Возможно торрент ещё загружает метаданные, попробуйте через несколько секунд")
+        if is_human():
+            print(f"❌ Не удалось получить список файлов")
+            print(f"⏳ Возможно торрент ещё загружает метаданные, попробуйте через несколько секунд")
+        else:
+            print_error("Не удалось получить список файлов, возможно торрент ещё загружает метаданные")
         return False
 
+    if not is_human():
+        emit({
+            'torrent': {'hash': hash_id, 'name': name, 'size': total_size, 'progress': round(progress, 1)},
+            'files': [file_record(f, i) for i, f in enumerate(files)],
+        }, 'files', FILE_FIELDS)
+        return True
+
     # Заголовок
     print(f"\n{'='*70}")
     print(f"📦 Торрент: {name}")
@@ -183,26 +197,72 @@ def show_files(hash_id):
 
     # Строим и выводим дерево
     tree = build_tree(files)
-    print_tree(tree, files, total_size)
+    print()
+    for line in iter_tree(tree, max_depth, collapse):
+        print(line)
 
     print(f"\n{'='*70}")
     print("💡 Для управления файлами используйте:")
     print(f"   python3 scripts/qbt-skip-files.py {hash_id} <ID файлов>")
     print(f"   python3 scripts/qbt-download-files.py {hash_id} <ID файлов>")
     print("\n   Примеры ID: 0,1,2 или 5-10 или 0,3,5-8,12")
+    if max_depth is not None or collapse is not None:
+        print("   Свёрнутые папки: --depth N (глубже), --all (показать всё)")
     print(f"{'='*70}\n")
 
     return True
 
+def parse_args(args):
+    """Разбор аргументов: hash и опции вывода дерева"""
+    hash_id = None
+    max_depth = None
+    collapse = DEFAULT_COLLAPSE
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '--all':
+            collapse = None
+        elif arg in ('--depth', '--collapse'):
+            if i + 1 >= len(args) or not args[i + 1].isdigit():
+                raise ValueError(f"{arg} требует число")
+            i += 1
+            if arg == '--depth':
+                max_depth = int(args[i])
+            else:
+                collapse = int(args[i])
+        elif arg.startswith('--') or hash_id is not None:
+            raise ValueError(f"неизвестный аргумент: {arg}")
+        else:
+            hash_id = arg.lower()
+        i += 1
+
+    if hash_id is None:
+        raise ValueError("не указан hash")
+
+    return hash_id, max_depth, collapse
+
 def main():
-    if len(sys.argv) != 2:
-        print("Использование: python qbt-show-files.py <hash>")
+    init_output()
+
+    try:
+        hash_id, max_depth, collapse = parse_args(sys.argv[1:])
+    except ValueError as e:
+        if not is_human():
+            print_error(f"{e}. Использование: qbt-show-files.py <hash> [--depth N] [--collapse N | --all]")
+            sys.exit(1)
+        print(f"❌ {e}")
+        print("Использование: python qbt-show-files.py <hash> [--depth N] [--collapse N | --all]")
+        print("\n  --depth N      показывать папки до глубины N, глубже - одной строкой с ID файлов")
+        print(f"  --collapse N   из папки с более чем N файлами показать первые {COLLAPSE_SHOW} (по умолчанию {DEFAULT_COLLAPSE})")
+        print("  --all          не сворачивать папки")
         print("\nПример:")
         print("  python qbt-show-files.py a08982d48ba7ce28e8bb42922d8fe37243903405")
+        print("  python qbt-show-files.py a08982d48ba7ce28e8bb42922d8fe37243903405 --depth 1")
         sys.exit(1)
 
-    hash_id = sys.argv[1].lower()
-    show_files(hash_id)
+    success = show_files(hash_id, max_depth, collapse)
+    sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
     main()
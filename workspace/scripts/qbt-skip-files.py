@@ -7,61 +7,16 @@
   python qbt-skip-files.py <hash> 0,1,2       - исключить файлы 0, 1, 2
   python qbt-skip-files.py <hash> 5-10        - исключить файлы с 5 по 10
   python qbt-skip-files.py <hash> 0,3,5-8,12  - комбинированный вариант
+  --json / --compact  - машинный вывод (см. script_output.py)
 """
 
 import sys
-import json
-import requests
-from pathlib import Path
-
-def load_credentials():
-    """Загрузка credentials из keys/qbittorrent.json"""
-    keys_file = Path(__file__).parent.parent / "keys" / "qbittorrent.json"
-    with open(keys_file, 'r') as f:
-        return json.load(f)
-
-def parse_file_ids(ids_string):
-    """Парсинг строки с ID файлов
-    Примеры:
-      "0,1,2" -> [0, 1, 2]
-      "5-10" -> [5, 6, 7, 8, 9, 10]
-      "0,3,5-8,12" -> [0, 3, 5, 6, 7, 8, 12]
-    """
-    result = []
-    parts = ids_string.split(',')
-
-    for part in parts:
-        part = part.strip()
-        if '-' in part:
-            # Диапазон
-            start, end = part.split('-')
-            result.extend(range(int(start), int(end) + 1))
-        else:
-            # Одиночный ID
-            result.append(int(part))
-
-    return sorted(list(set(result)))  # Убираем дубликаты и сортируем
-
-def get_session():
-    """Создание авторизованной сессии"""
-    creds = load_credentials()
-    base_url = f"http://{creds['host']}:{creds['port']}"
-
-    session = requests.Session()
-
-    # Авторизация
-    login_url = f"{base_url}/api/v2/auth/login"
-    login_data = {
-        'username': creds['username'],
-        'password': creds['password']
-    }
 
-    login_response = session.post(login_url, data=login_data)
-    if login_response.text != "Ok.":
-        print(f"❌ Ошибка авторизации: {login_response.text}")
-        return None, None
+from toolsd_client import forward_to_daemon
+forward_to_daemon(__file__)
 
-    return session, base_url
+from media_clients import get_qbt_session, parse_file_ids
+from script_output import init_output, is_human, emit, print_error, file_record, FILE_FIELDS
 
 def get_torrent_files(session, base_url, hash_id):
     """Получить список файлов торрента"""
@@ -90,7 +45,7 @@ def set_file_priority(session, base_url, hash_id, file_ids, priority):
 
 def skip_files(hash_id, ids_string):
     """Исключить файлы из загрузки"""
-    session, base_url = get_session()
+    session, base_url = get_qbt_session()
     if not session:
         return False
 
@@ -98,27 +53,35 @@ def skip_files(hash_id, ids_string):
     try:
         file_ids = parse_file_ids(ids_string)
     except Exception as e:
-        print(f"❌ Ошибка при парсинге ID: {e}")
-        print("Используйте формат: 0,1,2 или 5-10 или 0,3,5-8,12")
+        print_error(f"Ошибка при парсинге ID: {e}")
+        if is_human():
+            print("Используйте формат: 0,1,2 или 5-10 или 0,3,5-8,12")
         return False
 
     # Получаем список файлов
     files = get_torrent_files(session, base_url, hash_id)
     if files is None:
-        print(f"❌ Не удалось получить список файлов для торрента {hash_id}")
+        print_error(f"Не удалось получить список файлов для торрента {hash_id}")
         return False
 
     # Проверяем что все ID существуют
     max_index = len(files) - 1
     invalid_ids = [fid for fid in file_ids if fid > max_index or fid < 0]
     if invalid_ids:
-        print(f"❌ Неверные ID файлов: {invalid_ids}")
-        print(f"   Доступные ID: 0-{max_index}")
+        print_error(f"Неверные ID файлов: {invalid_ids}, доступные ID: 0-{max_index}")
         return False
 
     # Устанавливаем priority=0 для файлов
     success = set_file_priority(session, base_url, hash_id, file_ids, priority=0)
 
+    if success and not is_human():
+        emit({
+            'hash': hash_id,
+            'priority': 0,
+            'files': [dict(file_record(files[fid], fid), priority=0) for fid in file_ids],
+        }, 'files', FILE_FIELDS)
+        return True
+
     if success:
         print(f"✅ Файлы исключены из загрузки")
         print(f"\n📝 Исключённые файлы:")
@@ -134,7 +97,7 @@ def skip_files(hash_id, ids_string):
         print(f"\n💾 Сэкономлено места: {format_size(total_skipped)}")
         return True
     else:
-        print(f"❌ Ошибка при установке приоритета файлов")
+        print_error(f"Ошибка при установке приоритета файлов")
         return False
 
 def format_size(bytes_size):
@@ -146,7 +109,12 @@ def format_size(bytes_size):
     return f"{bytes_size:.2f} PB"
 
 def main():
+    init_output()
+
     if len(sys.argv) != 3:
+        if not is_human():
+            print_error("Использование: qbt-skip-files.py <hash> <ID файлов>")
+            sys.exit(1)
         print("Использование: python qbt-skip-files.py <hash> <ID файлов>")
         print("\nПримеры:")
         print("  python qbt-skip-files.py <hash> 0,1,2       - исключить файлы 0, 1, 2")
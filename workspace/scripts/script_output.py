@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Режимы вывода скриптов из scripts/
+
+  (по умолчанию)  текст для человека: эмодзи, рамки, подсказки
+  --compact       TSV: строка с именами полей, дальше по строке на запись
+  --json          один компактный JSON-документ {"ok": true, ...}
+
+Поля записей одинаковы в --compact и --json и совпадают с ответами
+MCP сервера system/mcp_media.py. Ошибки выводятся как {"ok": false, "error": "..."}
+в --json и строкой "ERROR<TAB>текст" в --compact.
+"""
+
+import json
+import sys
+
+HUMAN = 'human'
+COMPACT = 'compact'
+JSON = 'json'
+
+# Значение ETA в qBittorrent, означающее "бесконечность"
+ETA_INFINITY = 8640000
+
+TORRENT_FIELDS = ['hash', 'name', 'state', 'progress', 'size', 'downloaded', 'dlspeed', 'eta', 'category', 'added_on']
+FILE_FIELDS = ['i', 'name', 'size', 'priority', 'progress']
+ITEM_FIELDS = ['id', 'name', 'year', 'type', 'size', 'path']
+
+# Текущий режим вывода, выставляется init_output()
+mode = HUMAN
+
+def init_output():
+    """Убрать --json/--compact из sys.argv и запомнить режим вывода"""
+    global mode
+
+    for flag, flag_mode in (('--compact', COMPACT), ('--json', JSON)):
+        if flag in sys.argv:
+            mode = flag_mode
+            while flag in sys.argv:
+                sys.argv.remove(flag)
+
+    return mode
+
+def is_human():
+    """Вывод для человека (без --json/--compact)"""
+    return mode == HUMAN
+
+def dumps(data):
+    """Компактный JSON без экранирования кириллицы"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def tsv_cell(value):
+    """Значение для ячейки TSV"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    return str(value).replace('\t', ' ').replace('\n', ' ')
+
+def print_error(message):
+    """Вывести ошибку в текущем режиме"""
+    if mode == JSON:
+        print(dumps({'ok': False, 'error': message}))
+    elif mode == COMPACT:
+        print(f"ERROR\t{tsv_cell(message)}")
+    else:
+        print(f"❌ {message}")
+
+def emit(data, records_key=None, fields=None):
+    """
+    Вывести успешный результат в машинном режиме.
+    В --compact выводятся записи из data[records_key] (или сам data как одна запись).
+    """
+    if mode == JSON:
+        print(dumps({'ok': True, **data}))
+        return
+
+    records = data[records_key] if records_key else [data]
+    if fields is None:
+        fields = list(records[0].keys()) if records else []
+
+    print('\t'.join(fields))
+    for record in records:
+        print('\t'.join(tsv_cell(record.get(field)) for field in fields))
+
+def torrent_record(torrent):
+    """Запись торрента qBittorrent"""
+    eta = torrent.get('eta', 0)
+    return {
+        'hash': torrent.get('hash'),
+        'name': torrent.get('name'),
+        'state': torrent.get('state'),
+        'progress': round(torrent.get('progress', 0) * 100, 1),
+        'size': torrent.get('size', 0),
+        'downloaded': torrent.get('downloaded', 0),
+        'dlspeed': torrent.get('dlspeed', 0),
+        'eta': None if eta >= ETA_INFINITY else eta,
+        'category': torrent.get('category') or None,
+        'added_on': torrent.get('added_on') or None,
+    }
+
+def file_record(file_info, index=None):
+    """Запись файла торрента"""
+    return {
+        'i': file_info.get('index', index),
+        'name': file_info['name'],
+        'size': file_info['size'],
+        'priority': file_info['priority'],
+        'progress': round(file_info.get('progress', 0) * 100, 1),
+    }
+
+def item_record(item):
+    """Запись фильма/сериала Jellyfin"""
+    sources = item.get('MediaSources') or []
+    return {
+        'id': item.get('Id'),
+        'name': item.get('Name'),
+        'year': item.get('ProductionYear'),
+        'type': item.get('Type'),
+        'size': sum(ms.get('Size', 0) or 0 for ms in sources) or None,
+        'path': item.get('Path'),
+    }
+
+def item_details_record(item):
+    """Подробная запись Jellyfin: описание, качество, дорожки, субтитры"""
+    record = item_record(item)
+    record['overview'] = (item.get('Overview') or '')[:200]
+
+    sources = []
+    for ms in item.get('MediaSources') or []:
+        streams = ms.get('MediaStreams', [])
+        sources.append({
+            'size': ms.get('Size'),
+            'container': ms.get('Container'),
+            'minutes': round(ms['RunTimeTicks'] / 600000000) if ms.get('RunTimeTicks') else None,
+            'bitrate': ms.get('Bitrate'),
+            'video': [
+                {'codec': s.get('Codec'), 'width': s.get('Width'), 'height': s.get('Height')}
+                for s in streams if s.get('Type') == 'Video'
+            ],
+            'audio': [
+                {'codec': s.get('Codec'), 'lang': s.get('Language'), 'channels': s.get('Channels')}
+                for s in streams if s.get('Type') == 'Audio'
+            ],
+            'subtitles': [
+                s.get('Language') or s.get('DisplayTitle')
+                for s in streams if s.get('Type') == 'Subtitle'
+            ],
+        })
+    record['sources'] = sources
+
+    return record
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Клиент демона toolsd (system/toolsd.py)
+
+Скрипт вызывает forward_to_daemon(__file__) до тяжёлых импортов: если демон
+запущен, скрипт выполняется в его уже прогретом процессе, а вывод и код
+возврата передаются сюда. Если демона нет - скрипт работает как обычно.
+Только стандартная библиотека, чтобы пересылка ничего не стоила.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+
+# Путь по умолчанию должен совпадать с TOOLSD_SOCKET в system/config.py
+SOCKET_PATH = os.environ.get("TOOLSD_SOCKET") or f"/tmp/tg2claude-toolsd-{os.getuid()}.sock"
+
+# Ответ демона - кадры: тип (1 байт), длина (4 байта), данные.
+# stdout и stderr скрипта идут отдельными кадрами, последний кадр - код возврата
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+FRAME_HEADER = struct.Struct(">cI")
+
+# Переменные окружения, которые демон выставляет скрипту так же, как у вызывающего
+FORWARDED_ENV = ('TG2CLAUDE_CHAT',)
+
+# Выставляется демоном, чтобы внутри него скрипты не пересылали сами себя
+IN_DAEMON = False
+
+def frame(kind, data):
+    """Кадр ответа демона"""
+    return FRAME_HEADER.pack(kind, len(data)) + data
+
+def read_frames(sock):
+    """Кадры ответа демона (тип, данные) по мере поступления"""
+    buffer = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        while len(buffer) >= FRAME_HEADER.size:
+            kind, length = FRAME_HEADER.unpack_from(buffer)
+            end = FRAME_HEADER.size + length
+            if len(buffer) < end:
+                break
+            yield kind, buffer[FRAME_HEADER.size:end]
+            buffer = buffer[end:]
+
+def forward_to_daemon(script_file):
+    """Выполнить текущий скрипт через демон и завершить процесс с его кодом возврата"""
+    if IN_DAEMON or os.environ.get("TOOLSD_DISABLE"):
+        return
+
+    # Модуль импортирован, а не запущен - пересылать нечего
+    if os.path.abspath(sys.argv[0]) != os.path.abspath(script_file):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        sock.close()
+        return
+
+    request = {
+        'script': os.path.basename(script_file),
+        'argv': sys.argv[1:],
+        'cwd': os.getcwd(),
+        'env': {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ},
+    }
+    sock.sendall(json.dumps(request).encode('utf-8') + b"\n")
+
+    streams = {STDOUT: sys.stdout.buffer, STDERR: sys.stderr.buffer}
+    code = None
+
+    for kind, data in read_frames(sock):
+        if kind == EXIT:
+            code = data
+            break
+        stream = streams.get(kind)
+        if stream:
+            stream.write(data)
+            stream.flush()
+
+    sock.close()
+
+    if code is None:
+        print("❌ Демон toolsd прервал выполнение скрипта", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        sys.exit(int(code.strip() or 0))
+    except ValueError:
+        sys.exit(1)